@@ -0,0 +1,279 @@
+"""Cartridge mappers for the Colecovision
+
+A mapper places a cartridge ROM image in the cartridge slot of the memory
+system.  Bank switching cartridges are implemented by re-mapping the page
+table entries of the switched pages onto a different offset of the ROM, the
+ROM contents are never copied.
+"""
+
+import abc
+import logging
+
+from colecovision.header import CARTRIDGE_ADDRESS, CARTRIDGE_SLOT_SIZE
+from colecovision.header import CARTRIDGE_MAGIC
+from colecovision.memory import MemoryHookInterface
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+# MegaCart: the last 16 KB bank of the ROM is fixed at 0x8000-0xBFFF and
+# reading 0xFFC0-0xFFFF selects the bank seen at 0xC000-0xFFFF
+MEGACART_BANK_SIZE     = 0x4000
+MEGACART_FIXED_ADDRESS = 0x8000
+MEGACART_BANK_ADDRESS  = 0xC000
+MEGACART_TRIGGER       = 0xFFC0
+
+#-----------------------------------------------------------------------------
+# Interfaces
+#-----------------------------------------------------------------------------
+
+
+class MapperInterface(object):
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def insert(self, memory_system):
+        """Map the cartridge into the memory system"""
+        pass
+
+    @abc.abstractmethod
+    def remove(self):
+        """Remove the cartridge from the memory system"""
+        pass
+
+    @abc.abstractmethod
+    def clone(self, memory_system):
+        """Mapper of the same cartridge inserted in a clone of the memory
+        system this one is inserted in (see MemorySystem.clone())"""
+        pass
+
+    def reset(self):
+        """Return the cartridge to its power-on state"""
+        pass
+
+    def select_bank(self, bank):
+        """Select a bank, cartridges without banks ignore it"""
+        pass
+
+    @property
+    def image(self):
+        """ROM image (colecovision.romstore.ROMImage) of the cartridge"""
+        return self._image
+
+    @property
+    def bank(self):
+        """Currently selected bank"""
+        return 0
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class MapperType(object):
+    """Cartridge mapper types"""
+
+    STANDARD = 0    # up to 32 KB, no bank switching
+    MEGACART = 1    # 16 KB banks selected by reading 0xFFC0-0xFFFF
+
+
+class StandardMapper(MapperInterface):
+    """Cartridge of up to 32 KB mapped at the start of the cartridge slot,
+       smaller cartridges are mirrored across the slot"""
+
+    def __init__(self, image):
+        """Initialization"""
+
+        self._image = image
+        self._region = image.region()
+        self._memsys = None
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'StandardMapper({0!r})'.format(self._image)
+
+    def insert(self, memory_system):
+        """Map the cartridge into the memory system"""
+
+        self._memsys = memory_system
+
+        # carts smaller than the slot are mirrored across it
+        if self._region.length:
+            memory_system.map_region(self._region, CARTRIDGE_ADDRESS,
+                                     CARTRIDGE_SLOT_SIZE)
+
+    def remove(self):
+        """Remove the cartridge from the memory system"""
+
+        if self._memsys is not None:
+
+            self._memsys.unmap_region(self._region)
+
+            self._memsys = None
+
+    def clone(self, memory_system):
+        """Mapper of the same cartridge inserted in a clone of the memory
+        system this one is inserted in"""
+
+        mapper = StandardMapper(self._image)
+
+        # the clone maps the region of this mapper
+        mapper._region = self._region
+        mapper._memsys = memory_system
+
+        return mapper
+
+
+class MegaCartMapper(MapperInterface, MemoryHookInterface):
+    """MegaCart bank switching cartridge.
+
+    Bank selection is detected with a hook on the single page containing
+    the trigger addresses, the rest of the slot is accessed directly.  A
+    bank switch only updates the page table entries of the switchable
+    window.
+    """
+
+    def __init__(self, image):
+        """Initialization"""
+
+        self._image = image
+        self._region = image.region()
+        self._memsys = None
+
+        self._bank_count = max(1, self._region.length // MEGACART_BANK_SIZE)
+        self._bank = 0
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'MegaCartMapper({0!r})'.format(self._image)
+
+    def insert(self, memory_system):
+        """Map the cartridge into the memory system"""
+
+        self._memsys = memory_system
+
+        memory_system.map_region(self._region, MEGACART_FIXED_ADDRESS,
+                                 MEGACART_BANK_SIZE,
+                                 (self._bank_count - 1) * MEGACART_BANK_SIZE)
+
+        memory_system.map_region(self._region, MEGACART_BANK_ADDRESS,
+                                 MEGACART_BANK_SIZE,
+                                 self._bank * MEGACART_BANK_SIZE)
+
+        memory_system.add_page_hook(memory_system.page(MEGACART_TRIGGER), self)
+
+    def remove(self):
+        """Remove the cartridge from the memory system"""
+
+        if self._memsys is not None:
+
+            self._memsys.remove_page_hook(self._memsys.page(MEGACART_TRIGGER), self)
+
+            self._memsys.unmap_region(self._region)
+
+            self._memsys = None
+
+    def clone(self, memory_system):
+        """Mapper of the same cartridge inserted in a clone of the memory
+        system this one is inserted in, with the same bank selected"""
+
+        mapper = MegaCartMapper(self._image)
+
+        # the clone maps the region of this mapper
+        mapper._region = self._region
+        mapper._memsys = memory_system
+        mapper._bank = self._bank
+
+        memory_system.add_page_hook(memory_system.page(MEGACART_TRIGGER), mapper)
+
+        return mapper
+
+    def reset(self):
+        """Return the cartridge to its power-on state"""
+        self.select_bank(0)
+
+    def select_bank(self, bank):
+        """Select the bank seen at 0xC000-0xFFFF"""
+
+        bank %= self._bank_count
+
+        if bank == self._bank:
+            return
+
+        self._bank = bank
+
+        if self._memsys is not None:
+            self._memsys.remap_region(MEGACART_BANK_ADDRESS, bank * MEGACART_BANK_SIZE)
+
+    @property
+    def bank(self):
+        """Currently selected bank"""
+        return self._bank
+
+    @property
+    def bank_count(self):
+        """Number of 16 KB banks in the ROM"""
+        return self._bank_count
+
+    def fetch_hook(self, address, value):
+        """Op code fetches from the trigger addresses also select a bank"""
+
+        if address >= MEGACART_TRIGGER:
+            self.select_bank(address - MEGACART_TRIGGER)
+
+    def read_hook(self, address, value):
+        """Reads from the trigger addresses select a bank"""
+
+        if address >= MEGACART_TRIGGER:
+            self.select_bank(address - MEGACART_TRIGGER)
+
+    def write_hook(self, address, value):
+        """Writes have no effect on the mapper"""
+        pass
+
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def detect(image):
+    """Determine the mapper type of a ROM image (ROMImage).
+
+    Images larger than the cartridge slot are MegaCarts, which keep their
+    header at the start of the last bank rather than the start of the ROM.
+    """
+
+    if image.size > CARTRIDGE_SLOT_SIZE:
+
+        data = image.data
+
+        header = image.size - MEGACART_BANK_SIZE
+
+        magic = (data[header] << 8) | data[header + 1]
+
+        if magic not in CARTRIDGE_MAGIC:
+            _logger.warning("MegaCart image without a header in its last bank")
+
+        return MapperType.MEGACART
+
+    return MapperType.STANDARD
+
+
+def create(image, mapper_type=None):
+    """Creates the mapper for a ROM image, detecting its type if needed"""
+
+    if mapper_type is None:
+        mapper_type = detect(image)
+
+    if mapper_type == MapperType.MEGACART:
+        return MegaCartMapper(image)
+
+    return StandardMapper(image)
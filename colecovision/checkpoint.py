@@ -0,0 +1,216 @@
+"""Frame hash checkpoints for the Colecovision
+
+A checkpoint log holds, for every frame, a CRC-32 of the rendered frame and
+of the RAM at the vertical blank: 12 bytes a frame instead of an image.
+Two runs of the same ROM with the same input (see colecovision.movie)
+produce identical logs, so comparing the logs of a run with those of a
+reference run finds the first frame where the output diverged.
+
+Compare two logs from the command line with:
+
+    python -m colecovision.checkpoint reference.chk run.chk
+"""
+
+import argparse
+import logging
+import struct
+import sys
+import zlib
+
+from colecovision.framesink import FrameSinkInterface
+from colecovision.machine import RAM_SIZE
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+CHECKPOINT_MAGIC   = b'CVCK'
+CHECKPOINT_VERSION = 1
+
+# frame number, frame CRC and RAM CRC
+_RECORD = struct.Struct('<III')
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class CheckpointError(Exception):
+    """Invalid checkpoint log"""
+    pass
+
+
+class Checkpoint(object):
+    """Hashes of a frame"""
+
+    __slots__ = ('frame', 'frame_hash', 'ram_hash')
+
+    def __init__(self, frame, frame_hash, ram_hash):
+        """Initialization"""
+
+        self.frame = frame
+        self.frame_hash = frame_hash
+        self.ram_hash = ram_hash
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'Checkpoint({0}, 0x{1:08X}, 0x{2:08X})'.format(
+            self.frame, self.frame_hash, self.ram_hash)
+
+    def __eq__(self, other):
+        return ((self.frame, self.frame_hash, self.ram_hash) ==
+                (other.frame, other.frame_hash, other.ram_hash))
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class CheckpointRecorder(FrameSinkInterface):
+    """Writes the frame hashes of a machine to a checkpoint log.
+
+    The recorder is a frame sink of the VDP, so the frame hashed is the
+    frame rendered at the vertical blank, shared with any other sink.  The
+    frame number and the RAM are captured at that vertical blank, the frame
+    may be received later when rendered by a RenderProcess.
+    """
+
+    def __init__(self, machine, file_name):
+        """Initialization, recording starts with the next frame"""
+
+        self._machine = machine
+
+        self._file = open(file_name, 'wb')
+
+        self._file.write(CHECKPOINT_MAGIC)
+        self._file.write(struct.pack('<H', CHECKPOINT_VERSION))
+
+        self.frames = 0
+
+        machine.vdp.add_sink(self)
+
+    def capture(self):
+        """Frame number and RAM CRC at the vertical blank"""
+
+        ram = self._machine.ram.read_block(0, RAM_SIZE)
+
+        return self._machine.frame, zlib.crc32(ram) & 0xFFFFFFFF
+
+    def submit(self, framebuffer, captured=None):
+        """Write the hashes of a frame"""
+
+        frame, ram_hash = captured or self.capture()
+
+        self._file.write(_RECORD.pack(frame,
+                                      zlib.crc32(framebuffer) & 0xFFFFFFFF,
+                                      ram_hash))
+
+        self.frames += 1
+
+    def close(self):
+        """Stop recording"""
+
+        if self._file is not None:
+
+            self._machine.vdp.remove_sink(self)
+
+            self._file.close()
+
+            self._file = None
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def read_log(file_name):
+    """Read the checkpoints of a checkpoint log"""
+
+    with open(file_name, 'rb') as f:
+        data = f.read()
+
+    header_size = len(CHECKPOINT_MAGIC) + 2
+
+    if (len(data) < header_size) or (data[:len(CHECKPOINT_MAGIC)] != CHECKPOINT_MAGIC):
+        raise CheckpointError('Not a checkpoint log: {0}'.format(file_name))
+
+    version, = struct.unpack_from('<H', data, len(CHECKPOINT_MAGIC))
+
+    if version != CHECKPOINT_VERSION:
+        raise CheckpointError('Unsupported checkpoint log version {0}'.format(version))
+
+    if (len(data) - header_size) % _RECORD.size:
+        raise CheckpointError('Truncated checkpoint log: {0}'.format(file_name))
+
+    return [Checkpoint(*_RECORD.unpack_from(data, position))
+            for position in range(header_size, len(data), _RECORD.size)]
+
+
+def first_divergence(reference, run):
+    """First checkpoint where two lists of checkpoints differ.
+
+    Returns (reference checkpoint, run checkpoint), either of which is None
+    if that list ended first, or None when the lists are identical.
+    """
+
+    for expected, actual in zip(reference, run):
+        if expected != actual:
+            return expected, actual
+
+    if len(reference) > len(run):
+        return reference[len(run)], None
+
+    if len(run) > len(reference):
+        return None, run[len(reference)]
+
+    return None
+
+
+def main(args=None):
+    """Compare two checkpoint logs, the exit status is 1 if they differ"""
+
+    parser = argparse.ArgumentParser(
+        description='Find the first frame where two checkpoint logs differ')
+
+    parser.add_argument('reference', help='checkpoint log of the reference run')
+    parser.add_argument('run', help='checkpoint log to compare with it')
+
+    args = parser.parse_args(args)
+
+    divergence = first_divergence(read_log(args.reference), read_log(args.run))
+
+    if divergence is None:
+
+        print('Identical')
+
+        return 0
+
+    expected, actual = divergence
+
+    if actual is None:
+        print('Run ends before frame {0}'.format(expected.frame))
+    elif expected is None:
+        print('Reference ends before frame {0}'.format(actual.frame))
+    else:
+
+        differences = []
+
+        if expected.frame != actual.frame:
+            differences.append('frame number')
+        if expected.frame_hash != actual.frame_hash:
+            differences.append('display')
+        if expected.ram_hash != actual.ram_hash:
+            differences.append('RAM')
+
+        print('Frame {0} differs: {1}'.format(expected.frame,
+                                              ', '.join(differences)))
+
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Hand controllers for the Colecovision"""
+
+import logging
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+# Controller state bits.  The state of a controller is a 16-bit value made
+# of the joystick and fire button bits and, in bits 8-11, the keypad code
+# of the key pressed (KEY_NONE when no key is pressed).
+UP          = 0x0001
+RIGHT       = 0x0002
+DOWN        = 0x0004
+LEFT        = 0x0008
+FIRE_LEFT   = 0x0010
+FIRE_RIGHT  = 0x0020
+
+KEYPAD_SHIFT = 8
+KEYPAD_MASK  = 0x0F << KEYPAD_SHIFT
+
+# Keypad codes, as read (active low) from the controller port
+KEY_NONE = 0x0F
+KEYPAD = {'0' : 0x0A, '1' : 0x0D, '2' : 0x07, '3' : 0x0C,
+          '4' : 0x02, '5' : 0x03, '6' : 0x0E, '7' : 0x05,
+          '8' : 0x01, '9' : 0x0B, '*' : 0x09, '#' : 0x06}
+
+RELEASED = KEY_NONE << KEYPAD_SHIFT
+
+# bit driven by the fire buttons when the controller is read
+_PORT_FIRE = 0x40
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class ControllerMode(object):
+    """Half of the controller connected to the port"""
+
+    KEYPAD   = 0    # keypad and right fire button
+    JOYSTICK = 1    # joystick and left fire button
+
+
+class Controller(object):
+    """Colecovision hand controller"""
+
+    def __init__(self):
+        """Initialization"""
+
+        self.state = RELEASED
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'Controller()'
+
+    def press(self, buttons):
+        """Press joystick directions and/or fire buttons"""
+        self.state |= buttons
+
+    def release(self, buttons):
+        """Release joystick directions and/or fire buttons"""
+        self.state &= ~buttons
+
+    def press_key(self, key):
+        """Press a key ('0'-'9', '*', '#') of the keypad"""
+        self.state = (self.state & ~KEYPAD_MASK) | (KEYPAD[key] << KEYPAD_SHIFT)
+
+    def release_key(self):
+        """Release the keypad"""
+        self.state |= KEYPAD_MASK
+
+    def read(self, mode):
+        """Value read from the controller port in the given mode"""
+
+        state = self.state
+
+        if mode == ControllerMode.JOYSTICK:
+
+            value = 0x7F & ~(state & (UP | RIGHT | DOWN | LEFT))
+
+            if state & FIRE_LEFT:
+                value &= ~_PORT_FIRE
+
+        else:
+
+            value = 0x70 | ((state & KEYPAD_MASK) >> KEYPAD_SHIFT)
+
+            if state & FIRE_RIGHT:
+                value &= ~_PORT_FIRE
+
+        return value
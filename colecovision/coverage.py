@@ -0,0 +1,296 @@
+"""Code and data coverage of the Colecovision address space
+
+Coverage records, in three bitmaps of the 64K address space, the address
+of every instruction executed and every address read or written as data
+by the instructions.  A bitmap is a bytearray holding 1 at the covered
+addresses, so recording is a single indexed store: the CPU sets the
+executed bitmap once per instruction and the data accesses go through a
+thin recording layer over the memory system.  Op code and operand fetches
+are not counted as data reads.
+
+Coverage of several runs is merged by OR-ing the bitmaps, and is saved to
+and loaded from coverage files.  The executed addresses are entry points
+for the recursive disassembler, so a ROM can be listed with the code that
+actually ran annotated:
+
+    python -m colecovision.coverage run1.cov run2.cov --rom game.rom \\
+        --origin 0x8000
+"""
+
+import argparse
+import logging
+import struct
+import sys
+import zlib
+
+from colecovision.cpu import disasm
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+ADDRESS_SPACE = 0x10000
+
+COVERAGE_MAGIC   = b'CVCO'
+COVERAGE_VERSION = 1
+
+_HEADER = struct.Struct('<4sH')
+
+# annotation flags of a listing line
+_EXECUTED = 'X'
+_READ     = 'R'
+_WRITTEN  = 'W'
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class CoverageError(Exception):
+    """Invalid coverage file"""
+    pass
+
+
+class _RecordingMemory(object):
+    """Data accesses of the instructions, recorded in the read and written
+    bitmaps before they reach the memory system"""
+
+    def __init__(self, memory_system, read, written):
+        """Initialization"""
+
+        self._memsys = memory_system
+        self._read = read
+        self._written = written
+
+    def read(self, address):
+        """Read a value from memory"""
+
+        value = self._memsys.read(address)
+
+        self._read[address & 0xFFFF] = 1
+
+        return value
+
+    def write(self, address, value):
+        """Write a value to memory"""
+
+        self._memsys.write(address, value)
+
+        self._written[address & 0xFFFF] = 1
+
+
+class Coverage(object):
+    """Executed, read and written address bitmaps"""
+
+    def __init__(self):
+        """Initialization"""
+
+        self.executed = bytearray(ADDRESS_SPACE)
+        self.read = bytearray(ADDRESS_SPACE)
+        self.written = bytearray(ADDRESS_SPACE)
+
+        self._cpu = None
+
+    def attach(self, cpu):
+        """Start recording the execution of a CPU (colecovision.cpu.z80)"""
+
+        self.detach()
+
+        cpu.executed_bitmap = self.executed
+        cpu.data_memory = _RecordingMemory(cpu.memsys, self.read, self.written)
+
+        self._cpu = cpu
+
+    def detach(self):
+        """Stop recording"""
+
+        if self._cpu is not None:
+
+            self._cpu.executed_bitmap = None
+            self._cpu.data_memory = self._cpu.memsys
+
+            self._cpu = None
+
+    def clear(self):
+        """Forget the coverage recorded so far"""
+
+        # in place, an attached CPU keeps recording into the same bitmaps
+        self.executed[:] = bytes(ADDRESS_SPACE)
+        self.read[:] = bytes(ADDRESS_SPACE)
+        self.written[:] = bytes(ADDRESS_SPACE)
+
+    def merge(self, other):
+        """Add the coverage of another Coverage"""
+
+        for mine, theirs in ((self.executed, other.executed),
+                             (self.read, other.read),
+                             (self.written, other.written)):
+            mine[:] = _union(mine, theirs)
+
+    def summary(self, start=0, end=ADDRESS_SPACE):
+        """Number of executed, read and written addresses in a range"""
+
+        return {'executed' : self.executed.count(1, start, end),
+                'read'     : self.read.count(1, start, end),
+                'written'  : self.written.count(1, start, end)}
+
+    def executed_addresses(self, start=0, end=ADDRESS_SPACE):
+        """Addresses of the instructions executed in a range, in address
+        order (entry points for disasm.disassemble())"""
+
+        addresses = []
+
+        address = self.executed.find(1, start, end)
+
+        while address >= 0:
+
+            addresses.append(address)
+
+            address = self.executed.find(1, address + 1, end)
+
+        return addresses
+
+    def annotate(self, lines):
+        """Generate the lines of a listing (disasm.Line) prefixed with their
+        coverage: X executed, R read, W written, '.' not covered"""
+
+        for line in lines:
+
+            start = line.address
+            end = min(start + len(line.data), ADDRESS_SPACE)
+
+            flags = (_EXECUTED if self.executed[start] else '.',
+                     _READ if self.read.find(1, start, end) >= 0 else '.',
+                     _WRITTEN if self.written.find(1, start, end) >= 0 else '.')
+
+            yield '{0}  {1}'.format(''.join(flags), line)
+
+    def save(self, file_name):
+        """Write the coverage to a file"""
+
+        with open(file_name, 'wb') as f:
+            f.write(_HEADER.pack(COVERAGE_MAGIC, COVERAGE_VERSION))
+            f.write(zlib.compress(bytes(self.executed + self.read + self.written)))
+
+    @classmethod
+    def load(cls, file_name):
+        """Read a coverage file written by save()"""
+
+        with open(file_name, 'rb') as f:
+            data = f.read()
+
+        if len(data) < _HEADER.size:
+            raise CoverageError('Truncated coverage file {0}'.format(file_name))
+
+        magic, version = _HEADER.unpack_from(data)
+
+        if magic != COVERAGE_MAGIC:
+            raise CoverageError('Not a coverage file: {0}'.format(file_name))
+
+        if version != COVERAGE_VERSION:
+            raise CoverageError('Unsupported coverage version {0}'.format(version))
+
+        try:
+            bitmaps = zlib.decompress(data[_HEADER.size:])
+        except zlib.error as e:
+            raise CoverageError('Corrupt coverage file {0}: {1}'.format(file_name, e))
+
+        if len(bitmaps) != 3 * ADDRESS_SPACE:
+            raise CoverageError('Corrupt coverage file {0}'.format(file_name))
+
+        coverage = cls()
+
+        coverage.executed[:] = bitmaps[:ADDRESS_SPACE]
+        coverage.read[:] = bitmaps[ADDRESS_SPACE:2 * ADDRESS_SPACE]
+        coverage.written[:] = bitmaps[2 * ADDRESS_SPACE:]
+
+        return coverage
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def _union(first, second):
+    """Byte-wise OR of two bitmaps of the same length"""
+
+    value = int.from_bytes(first, 'little') | int.from_bytes(second, 'little')
+
+    return value.to_bytes(len(first), 'little')
+
+
+def merge_files(file_names):
+    """Coverage merged from several coverage files"""
+
+    merged = Coverage()
+
+    for file_name in file_names:
+        merged.merge(Coverage.load(file_name))
+
+    return merged
+
+
+def listing(coverage, data, origin):
+    """Annotated listing of a ROM image: the code reachable from its entry
+    points and from every instruction executed is disassembled"""
+
+    end = origin + len(data)
+
+    entry = (disasm.entry_points(data, origin) +
+             coverage.executed_addresses(origin, min(end, ADDRESS_SPACE)))
+
+    return coverage.annotate(disasm.disassemble(data, origin, recursive=True,
+                                                entry=sorted(set(entry))))
+
+
+def main(args=None):
+    """Merge coverage files, report them and list a ROM annotated with
+    them"""
+
+    parser = argparse.ArgumentParser(description='Report code coverage')
+
+    parser.add_argument('coverage', nargs='+', help='coverage files')
+    parser.add_argument('--merge', help='write the merged coverage to this file')
+    parser.add_argument('--rom', help='ROM image to list')
+    parser.add_argument('--origin', type=lambda value: int(value, 0), default=0,
+                        help='address of the ROM image')
+
+    args = parser.parse_args(args)
+
+    coverage = merge_files(args.coverage)
+
+    if args.merge:
+        coverage.save(args.merge)
+
+    start = args.origin
+    end = ADDRESS_SPACE
+
+    data = None
+
+    if args.rom:
+
+        with open(args.rom, 'rb') as f:
+            data = f.read()
+
+        end = min(start + len(data), ADDRESS_SPACE)
+
+    counts = coverage.summary(start, end)
+
+    print('0x{0:04X}-0x{1:04X}: {2} instructions executed, {3} addresses read, '
+          '{4} written'.format(start, end - 1, counts['executed'], counts['read'],
+                               counts['written']))
+
+    if data is not None:
+        for line in listing(coverage, data, start):
+            print(line)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
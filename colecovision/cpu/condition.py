@@ -7,3 +7,20 @@ PARITY_OVERFLOW = 0x04
 SUBTRACT        = 0x02
 CARY            = 0x01
 
+# flag tested by each condition code and the flag value meeting it
+CONDITION_FLAG = {'NZ' : (ZERO, False),
+                  'Z'  : (ZERO, True),
+                  'NC' : (CARY, False),
+                  'C'  : (CARY, True),
+                  'PO' : (PARITY_OVERFLOW, False),
+                  'PE' : (PARITY_OVERFLOW, True),
+                  'P'  : (SIGN, False),
+                  'M'  : (SIGN, True)}
+
+
+def met(flags, condition):
+    """Flag used to indicate that the flags meet a condition code"""
+
+    flag, value = CONDITION_FLAG[condition]
+
+    return bool(flags & flag) == value
@@ -0,0 +1,633 @@
+"""Z80 disassembler
+
+Disassembly is table driven: every op code (including the CB, ED, DD, FD,
+DDCB and FDCB prefixed op codes) is expanded once, at import time, into a
+template built from the decoder tables of colecovision.cpu.instruction.
+Disassembling an instruction is then a table lookup plus the formatting of
+its operands.
+"""
+
+import collections
+import hashlib
+import logging
+
+from colecovision.cpu.instruction import REGISTER_8B, REGISTER_16B
+from colecovision.cpu.instruction import REGISTER_16B_STACK, CONDITION
+from colecovision.header import CARTRIDGE_ADDRESS, CARTRIDGE_JUMP_TABLE
+from colecovision.header import CARTRIDGE_MAGIC, CARTRIDGE_START_GAME
+
+
+#-----------------------------------------------------------------------------
+# Module Data
+#-----------------------------------------------------------------------------
+
+# module logger
+_logger = logging.getLogger(__name__)
+
+# cache of disassembled lines, keyed by the ROM hash and disassembly
+# options, least recently used first
+_cache = collections.OrderedDict()
+
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+# Z80 restart (RST) and non-maskable interrupt vectors
+RESET_VECTOR = 0x0000
+RST_VECTORS  = (0x0008, 0x0010, 0x0018, 0x0020, 0x0028, 0x0030, 0x0038)
+NMI_VECTOR   = 0x0066
+
+# Disassemblies (image and options) kept in the cache
+CACHE_SIZE = 16
+
+# maximum number of bytes in a single DB line
+_DATA_BYTES_PER_LINE = 4
+
+_ALU    = ('ADD A,', 'ADC A,', 'SUB ', 'SBC A,', 'AND ', 'XOR ', 'OR ', 'CP ')
+_ROTATE = ('RLC', 'RRC', 'RL', 'RR', 'SLA', 'SRA', 'SLL', 'SRL')
+_ACCUMULATOR_OP = ('RLCA', 'RRCA', 'RLA', 'RRA', 'DAA', 'CPL', 'SCF', 'CCF')
+_INTERRUPT_MODE = ('0', '0/1', '1', '2', '0', '0/1', '1', '2')
+_ED_SPECIAL = ('LD I,A', 'LD R,A', 'LD A,I', 'LD A,R', 'RRD', 'RLD',
+               'NOP', 'NOP')
+_BLOCK_OP = (('LDI', 'CPI', 'INI', 'OUTI'),
+             ('LDD', 'CPD', 'IND', 'OUTD'),
+             ('LDIR', 'CPIR', 'INIR', 'OTIR'),
+             ('LDDR', 'CPDR', 'INDR', 'OTDR'))
+
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+class Flow(object):
+    """How execution continues after an instruction"""
+
+    NEXT   = 0  # continues with the next instruction
+    BRANCH = 1  # continues with the next instruction or the target
+    JUMP   = 2  # continues with the target only
+    STOP   = 3  # continues somewhere that cannot be determined statically
+
+
+class Line(collections.namedtuple('Line', 'address data text')):
+    """A disassembled line: address, bytes (bytes) and assembly text"""
+
+    __slots__ = ()
+
+    def __str__(self):
+        """User friendly string representation of the line"""
+
+        data = ' '.join('{0:02X}'.format(b) for b in bytearray(self.data))
+
+        return '{0:04X}  {1:<11}  {2}'.format(self.address, data, self.text)
+
+
+class _Template(object):
+    """Disassembly template for a single op code"""
+
+    __slots__ = ('text', 'operands', 'flow', 'target')
+
+    def __init__(self, text, operands=(), flow=Flow.NEXT, target=None):
+        """Initialization
+
+        text is a format string with {n}, {nn}, {e} and {d} fields for the
+        operands, which are listed in operands in the order of their bytes.
+        """
+
+        self.text = text
+        self.operands = operands
+        self.flow = flow
+        self.target = target
+
+    def __eq__(self, other):
+        return ((self.text, self.operands, self.flow, self.target) ==
+                (other.text, other.operands, other.flow, other.target))
+
+    def __ne__(self, other):
+        return not (self == other)
+
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def _main_template(op_code, hl='HL', h='H', l='L', memory='(HL)'):
+    """Template for an un-prefixed op code.
+
+    The HL based operands are replaced by the given names to build the
+    templates of the DD (IX) and FD (IY) prefixed op codes.
+    """
+
+    x, y, z = op_code >> 6, (op_code >> 3) & 0x07, op_code & 0x07
+    p, q = y >> 1, y & 0x01
+
+    mem_operands = ('d',) if '{d}' in memory else ()
+
+    register = [r for r in REGISTER_8B]
+    register[4], register[5], register[6] = h, l, memory
+
+    plain = [r for r in REGISTER_8B]
+    plain[6] = memory
+
+    pair = [hl if r == 'HL' else r for r in REGISTER_16B]
+    stack_pair = [hl if r == 'HL' else r for r in REGISTER_16B_STACK]
+
+    def operands(*indices):
+        return mem_operands if 6 in indices else ()
+
+    if x == 0:
+
+        if z == 0:
+            if y == 0:
+                return _Template('NOP')
+            if y == 1:
+                return _Template("EX AF,AF'")
+            if y == 2:
+                return _Template('DJNZ {e}', ('e',), Flow.BRANCH)
+            if y == 3:
+                return _Template('JR {e}', ('e',), Flow.JUMP)
+            return _Template('JR ' + CONDITION[y - 4] + ',{e}', ('e',),
+                             Flow.BRANCH)
+
+        if z == 1:
+            if q == 0:
+                return _Template('LD ' + pair[p] + ',{nn}', ('nn',))
+            return _Template('ADD ' + hl + ',' + pair[p])
+
+        if z == 2:
+            text = (('LD (BC),A', 'LD (DE),A', 'LD ({nn}),' + hl, 'LD ({nn}),A'),
+                    ('LD A,(BC)', 'LD A,(DE)', 'LD ' + hl + ',({nn})', 'LD A,({nn})'))
+            return _Template(text[q][p], ('nn',) if p >= 2 else ())
+
+        if z == 3:
+            return _Template(('INC ', 'DEC ')[q] + pair[p])
+
+        if z == 4:
+            return _Template('INC ' + register[y], operands(y))
+
+        if z == 5:
+            return _Template('DEC ' + register[y], operands(y))
+
+        if z == 6:
+            return _Template('LD ' + register[y] + ',{n}', operands(y) + ('n',))
+
+        return _Template(_ACCUMULATOR_OP[y])
+
+    if x == 1:
+
+        if (y == 6) and (z == 6):
+            return _Template('HALT')
+
+        # when one operand is the memory operand, H and L are not replaced
+        if (y == 6) or (z == 6):
+            return _Template('LD ' + plain[y] + ',' + plain[z], operands(y, z))
+
+        return _Template('LD ' + register[y] + ',' + register[z])
+
+    if x == 2:
+        return _Template(_ALU[y] + register[z], operands(z))
+
+    if z == 0:
+        return _Template('RET ' + CONDITION[y], (), Flow.BRANCH)
+
+    if z == 1:
+        if q == 0:
+            return _Template('POP ' + stack_pair[p])
+        if p == 0:
+            return _Template('RET', (), Flow.STOP)
+        if p == 1:
+            return _Template('EXX')
+        if p == 2:
+            return _Template('JP (' + hl + ')', (), Flow.STOP)
+        return _Template('LD SP,' + hl)
+
+    if z == 2:
+        return _Template('JP ' + CONDITION[y] + ',{nn}', ('nn',), Flow.BRANCH)
+
+    if z == 3:
+        if y == 0:
+            return _Template('JP {nn}', ('nn',), Flow.JUMP)
+        if y == 1:
+            return None     # CB prefix
+        if y == 2:
+            return _Template('OUT ({n}),A', ('n',))
+        if y == 3:
+            return _Template('IN A,({n})', ('n',))
+        if y == 4:
+            return _Template('EX (SP),' + hl)
+        if y == 5:
+            return _Template('EX DE,HL')
+        if y == 6:
+            return _Template('DI')
+        return _Template('EI')
+
+    if z == 4:
+        return _Template('CALL ' + CONDITION[y] + ',{nn}', ('nn',), Flow.BRANCH)
+
+    if z == 5:
+        if q == 0:
+            return _Template('PUSH ' + stack_pair[p])
+        if p == 0:
+            return _Template('CALL {nn}', ('nn',), Flow.BRANCH)
+        return None         # DD, ED and FD prefixes
+
+    if z == 6:
+        return _Template(_ALU[y] + '{n}', ('n',))
+
+    return _Template('RST ${0:02X}'.format(y * 8), (), Flow.BRANCH, y * 8)
+
+
+def _bit_template(op_code, memory='(HL)'):
+    """Template for a CB prefixed op code"""
+
+    x, y, z = op_code >> 6, (op_code >> 3) & 0x07, op_code & 0x07
+
+    register = [r for r in REGISTER_8B]
+    register[6] = memory
+
+    if x == 0:
+        return _Template(_ROTATE[y] + ' ' + register[z])
+
+    return _Template(('', 'BIT ', 'RES ', 'SET ')[x] + str(y) + ',' + register[z])
+
+
+def _indexed_bit_template(op_code, index):
+    """Template for a DDCB or FDCB prefixed op code"""
+
+    x, y, z = op_code >> 6, (op_code >> 3) & 0x07, op_code & 0x07
+
+    memory = '(' + index + '{d})'
+
+    if x == 0:
+        text = _ROTATE[y] + ' ' + memory
+    else:
+        text = ('', 'BIT ', 'RES ', 'SET ')[x] + str(y) + ',' + memory
+
+    # un-documented forms that also copy the result to a register
+    if (x != 1) and (z != 6):
+        text += ',' + REGISTER_8B[z]
+
+    return _Template(text, ('d',))
+
+
+def _extended_template(op_code):
+    """Template for an ED prefixed op code"""
+
+    x, y, z = op_code >> 6, (op_code >> 3) & 0x07, op_code & 0x07
+    p, q = y >> 1, y & 0x01
+
+    if x == 1:
+
+        if z == 0:
+            if y == 6:
+                return _Template('IN (C)')
+            return _Template('IN ' + REGISTER_8B[y] + ',(C)')
+
+        if z == 1:
+            if y == 6:
+                return _Template('OUT (C),0')
+            return _Template('OUT (C),' + REGISTER_8B[y])
+
+        if z == 2:
+            return _Template(('SBC HL,', 'ADC HL,')[q] + REGISTER_16B[p])
+
+        if z == 3:
+            if q == 0:
+                return _Template('LD ({nn}),' + REGISTER_16B[p], ('nn',))
+            return _Template('LD ' + REGISTER_16B[p] + ',({nn})', ('nn',))
+
+        if z == 4:
+            return _Template('NEG')
+
+        if z == 5:
+            return _Template(('RETN', 'RETI')[y == 1], (), Flow.STOP)
+
+        if z == 6:
+            return _Template('IM ' + _INTERRUPT_MODE[y])
+
+        return _Template(_ED_SPECIAL[y])
+
+    if (x == 2) and (z <= 3) and (y >= 4):
+        return _Template(_BLOCK_OP[y - 4][z])
+
+    # invalid op codes execute as a two byte NOP
+    return _Template('DB $ED,${0:02X}'.format(op_code))
+
+
+def _build_tables():
+    """Build the disassembly templates for every op code"""
+
+    main = [_main_template(op_code) for op_code in range(256)]
+    bit = [_bit_template(op_code) for op_code in range(256)]
+    extended = [_extended_template(op_code) for op_code in range(256)]
+
+    index = {}
+
+    for prefix, name in ((0xDD, 'IX'), (0xFD, 'IY')):
+
+        table = []
+
+        for op_code in range(256):
+
+            template = _main_template(op_code, name, name + 'H', name + 'L',
+                                      '(' + name + '{d})')
+
+            # the prefix has no effect on op codes that do not use HL
+            if (template is not None) and (template == main[op_code]):
+                template = None
+
+            table.append(template)
+
+        index[prefix] = (table, [_indexed_bit_template(op_code, name)
+                                 for op_code in range(256)])
+
+    return main, bit, extended, index
+
+
+_MAIN, _BIT, _EXTENDED, _INDEX = _build_tables()
+
+
+def _signed(value):
+    """Convert a byte to a signed value"""
+    return value - 0x100 if value & 0x80 else value
+
+
+def decode(data, offset, address):
+    """Disassemble the instruction at the given offset of data.
+
+    address is the Z80 address of data[offset].  Returns a tuple of the
+    instruction length, text, flow (Flow) and branch target (None when the
+    instruction does not branch to a known address), or None if data ends
+    before the instruction does.
+    """
+
+    end = len(data)
+
+    op_code = data[offset]
+    position = offset + 1
+
+    if op_code == 0xCB:
+
+        if position >= end:
+            return None
+
+        template = _BIT[data[position]]
+        position += 1
+
+    elif op_code == 0xED:
+
+        if position >= end:
+            return None
+
+        template = _EXTENDED[data[position]]
+        position += 1
+
+    elif (op_code == 0xDD) or (op_code == 0xFD):
+
+        if position >= end:
+            return None
+
+        table, bit_table = _INDEX[op_code]
+
+        if data[position] == 0xCB:
+
+            # DDCB d op: the displacement comes before the op code
+            if position + 2 >= end:
+                return None
+
+            template = bit_table[data[position + 2]]
+
+            text = template.text.format(d=_format_displacement(data[position + 1]))
+
+            return (4, text, Flow.NEXT, None)
+
+        template = table[data[position]]
+
+        if template is None:
+            # lone prefix, treated as a NOP by the CPU
+            return (1, 'DB ${0:02X}'.format(op_code), Flow.NEXT, None)
+
+        position += 1
+
+    else:
+
+        template = _MAIN[op_code]
+
+    values = {}
+    target = template.target
+
+    for operand in template.operands:
+
+        if operand == 'nn':
+
+            if position + 1 >= end:
+                return None
+
+            value = data[position] | (data[position + 1] << 8)
+            values['nn'] = '${0:04X}'.format(value)
+            position += 2
+
+            if template.flow != Flow.NEXT:
+                target = value
+
+        else:
+
+            if position >= end:
+                return None
+
+            value = data[position]
+            position += 1
+
+            if operand == 'n':
+                values['n'] = '${0:02X}'.format(value)
+            elif operand == 'd':
+                values['d'] = _format_displacement(value)
+            else:
+                target = (address + (position - offset) + _signed(value)) & 0xFFFF
+                values['e'] = '${0:04X}'.format(target)
+
+    text = template.text.format(**values) if values else template.text
+
+    return (position - offset, text, template.flow, target)
+
+
+def _format_displacement(value):
+    """Format an index register displacement"""
+
+    value = _signed(value)
+
+    if value < 0:
+        return '-${0:02X}'.format(-value)
+
+    return '+${0:02X}'.format(value)
+
+
+def _data_lines(data, start, stop, origin):
+    """Generate DB lines for the bytes between start and stop"""
+
+    for offset in range(start, stop, _DATA_BYTES_PER_LINE):
+
+        chunk = bytes(data[offset:min(offset + _DATA_BYTES_PER_LINE, stop)])
+
+        text = 'DB ' + ','.join('${0:02X}'.format(b) for b in bytearray(chunk))
+
+        yield Line(origin + offset, chunk, text)
+
+
+def _linear(data, origin):
+    """Generate lines by disassembling data from start to end"""
+
+    offset = 0
+    end = len(data)
+
+    while offset < end:
+
+        decoded = decode(data, offset, origin + offset)
+
+        if decoded is None:
+            # instruction truncated by the end of the data
+            for line in _data_lines(data, offset, end, origin):
+                yield line
+            return
+
+        length = decoded[0]
+
+        yield Line(origin + offset, bytes(data[offset:offset + length]), decoded[1])
+
+        offset += length
+
+
+def _recursive(data, origin, entry_points):
+    """Generate lines by following the flow of execution from the entry
+       points, bytes that are never reached are generated as data"""
+
+    end = len(data)
+
+    # offset -> (length, text) of every instruction reached
+    code = {}
+
+    pending = [address - origin for address in entry_points
+               if 0 <= address - origin < end]
+
+    while pending:
+
+        offset = pending.pop()
+
+        while (0 <= offset < end) and (offset not in code):
+
+            decoded = decode(data, offset, origin + offset)
+
+            if decoded is None:
+                break
+
+            length, text, flow, target = decoded
+
+            code[offset] = (length, text)
+
+            if target is not None:
+                pending.append(target - origin)
+
+            if (flow == Flow.JUMP) or (flow == Flow.STOP):
+                break
+
+            offset += length
+
+    offset = 0
+
+    for code_offset in sorted(code):
+
+        # skip instructions that overlap the previous instruction
+        if code_offset < offset:
+            continue
+
+        for line in _data_lines(data, offset, code_offset, origin):
+            yield line
+
+        length, text = code[code_offset]
+
+        yield Line(origin + code_offset, bytes(data[code_offset:code_offset + length]), text)
+
+        offset = code_offset + length
+
+    for line in _data_lines(data, offset, end, origin):
+        yield line
+
+
+def entry_points(data, origin):
+    """Addresses at which execution starts for the given ROM image.
+
+    For the BIOS (origin 0) these are the reset, restart and NMI vectors,
+    for a cartridge with a valid header they are the start of the game and
+    the entries of the cartridge jump table.
+    """
+
+    data = memoryview(data)
+
+    if origin == RESET_VECTOR:
+        return [RESET_VECTOR] + list(RST_VECTORS) + [NMI_VECTOR]
+
+    if (origin == CARTRIDGE_ADDRESS) and (len(data) >= CARTRIDGE_JUMP_TABLE[-1] + 3 - origin):
+
+        magic = (data[0] << 8) | data[1]
+
+        if magic in CARTRIDGE_MAGIC:
+
+            start = CARTRIDGE_START_GAME - origin
+
+            return ([data[start] | (data[start + 1] << 8)] +
+                    list(CARTRIDGE_JUMP_TABLE))
+
+    return [origin]
+
+
+def disassemble(data, origin=0, recursive=False, entry=None):
+    """Generate the disassembled lines (Line) of a ROM image.
+
+    data is any object supporting the buffer protocol (bytes, bytearray,
+    memoryview, ...), origin is the Z80 address of its first byte.  In
+    recursive mode only the code reachable from the entry addresses
+    (entry_points() by default) is disassembled and every other byte is
+    generated as data.  Results are cached per ROM hash so disassembling
+    the same image again only replays the cached lines, the CACHE_SIZE
+    most recently used disassemblies are kept.
+    """
+
+    data = memoryview(data)
+
+    if recursive and (entry is None):
+        entry = entry_points(data, origin)
+
+    key = (hashlib.sha1(data).hexdigest(), origin, recursive,
+           tuple(entry) if recursive else None)
+
+    cached = _cache.get(key)
+
+    if cached is not None:
+
+        _cache.move_to_end(key)
+
+        for line in cached:
+            yield line
+
+        return
+
+    if recursive:
+        generator = _recursive(data, origin, entry)
+    else:
+        generator = _linear(data, origin)
+
+    lines = []
+
+    for line in generator:
+        lines.append(line)
+        yield line
+
+    _cache[key] = lines
+
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def clear_cache():
+    """Discard all of the cached disassembly"""
+    _cache.clear()
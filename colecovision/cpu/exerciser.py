@@ -0,0 +1,313 @@
+"""Z80 instruction exerciser harness
+
+Runs CP/M instruction exerciser programs (ZEXDOC, ZEXALL and programs
+written the same way, supplied locally as .COM files) on the Z80 core and
+reports the result of each of their tests.
+
+The programs run in 64K of RAM under a minimal CP/M shim: the program is
+loaded at 0x0100, BDOS calls (CALL 0x0005) support console output of a
+character (C = 2, character in E) and of a '$' terminated string (C = 9,
+string at DE), and a jump to 0x0000 (warm boot) ends the program.  The
+shim traps execution of 0x0005 and 0x0000 with debugger breakpoints, so
+no Z80 code is needed for it.
+
+The exercisers print a line for each test, ending in "OK" or in the
+expected and found CRC of the test.  Run a program from the command line
+with:
+
+    python -m colecovision.cpu.exerciser zexdoc.com
+"""
+
+import argparse
+import logging
+import re
+import sys
+import time
+
+from colecovision.cpu.instruction import UnknownInstructionError
+from colecovision.cpu.z80 import Z80
+from colecovision.debugger import Debugger
+from colecovision.memory import MemorySystem, RAM_MemoryRegion
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+CPM_WARM_BOOT = 0x0000
+CPM_BDOS      = 0x0005
+CPM_TPA       = 0x0100      # programs are loaded and start here
+
+# the word at 0x0006 is the address of the BDOS, which is also the top of
+# the memory available to programs (they set their stack there)
+CPM_BDOS_ADDRESS = 0x0006
+CPM_MEMORY_TOP   = 0xFE00
+
+BDOS_CONSOLE_OUTPUT = 2
+BDOS_PRINT_STRING   = 9
+
+MEMORY_SIZE = 0x10000
+
+# cycles run between checks for the end of the program
+SLICE_CYCLES = 100000
+
+# test lines of the exerciser output
+_TEST_OK    = re.compile(r'^(?P<name>.*?)\.*\s*OK\s*$')
+_TEST_ERROR = re.compile(r'^(?P<name>.*?)\.*\s*ERROR\s*\**\s*crc expected:\s*'
+                         r'(?P<expected>[0-9a-fA-F]{8})\s*found:\s*(?P<found>[0-9a-fA-F]{8})')
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class TestResult(object):
+    """Result of one test of an exerciser"""
+
+    def __init__(self, name, passed, expected=None, found=None):
+        """Initialization, the CRC are given for failed tests"""
+
+        self.name = name
+        self.passed = passed
+        self.expected = expected
+        self.found = found
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'TestResult({0!r}, {1!r}, {2!r}, {3!r})'.format(
+            self.name, self.passed, self.expected, self.found)
+
+
+class ExerciserResult(object):
+    """Result of an exerciser run"""
+
+    def __init__(self, output, instructions, cycles, elapsed, error=None):
+        """Initialization"""
+
+        # console output of the program
+        self.output = output
+
+        self.instructions = instructions
+        self.cycles = cycles
+        self.elapsed = elapsed
+
+        # why the program did not run to its end, None if it did
+        self.error = error
+
+        self.tests = parse_output(output)
+
+    @property
+    def passed(self):
+        """Flag used to indicate that the program ran to its end and every
+        test passed"""
+        return (self.error is None) and all(test.passed for test in self.tests)
+
+    @property
+    def instructions_per_second(self):
+        """Speed of the run"""
+        return self.instructions / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def cycles_per_second(self):
+        """Speed of the run, in Z80 cycles per second"""
+        return self.cycles / self.elapsed if self.elapsed else 0.0
+
+
+class Exerciser(object):
+    """CP/M environment running an exerciser program"""
+
+    def __init__(self, program):
+        """Initialization, program is the contents of the .COM file"""
+
+        self.memsys = MemorySystem()
+
+        self.ram = RAM_MemoryRegion(MEMORY_SIZE)
+
+        self.memsys.map_region(self.ram, 0)
+
+        self.ram.write_block(CPM_TPA, program)
+
+        self.ram.write(CPM_BDOS_ADDRESS, CPM_MEMORY_TOP & 0xFF)
+        self.ram.write(CPM_BDOS_ADDRESS + 1, CPM_MEMORY_TOP >> 8)
+
+        self.cpu = Z80(self.memsys)
+
+        self.cpu.register["PC"].value = CPM_TPA
+
+        # a return from the program goes to the warm boot
+        self.cpu.register["SP"].value = CPM_MEMORY_TOP - 2
+
+        self.ram.write_block(CPM_MEMORY_TOP - 2, bytearray([CPM_WARM_BOOT & 0xFF,
+                                                            CPM_WARM_BOOT >> 8]))
+
+        self._debugger = Debugger(self.memsys)
+
+        self._debugger.set_breakpoint(CPM_WARM_BOOT, self._warm_boot)
+        self._debugger.set_breakpoint(CPM_BDOS, self._bdos)
+
+        self._output = []
+
+        self._done = False
+
+    def run(self, max_instructions=None):
+        """Run the program until it ends, returns an ExerciserResult"""
+
+        cpu = self.cpu
+
+        start_instructions = cpu.instructions
+        start_cycles = cpu.cycles
+
+        error = None
+
+        start = time.perf_counter()
+
+        try:
+
+            while not self._done:
+
+                if ((max_instructions is not None) and
+                    (cpu.instructions - start_instructions >= max_instructions)):
+
+                    error = 'Instruction limit reached'
+
+                    break
+
+                cpu.run(SLICE_CYCLES)
+
+        except UnknownInstructionError as e:
+
+            error = str(e)
+
+        elapsed = time.perf_counter() - start
+
+        return ExerciserResult(''.join(self._output),
+                               cpu.instructions - start_instructions,
+                               cpu.cycles - start_cycles,
+                               elapsed, error)
+
+    def _warm_boot(self, access, address, value):
+        """End of the program"""
+
+        self.cpu.abort()
+
+        self._done = True
+
+    def _bdos(self, access, address, value):
+        """BDOS call: perform the function, then return to the caller"""
+
+        register = self.cpu.register
+
+        function = register["C"].value
+
+        if function == BDOS_CONSOLE_OUTPUT:
+
+            self._output.append(chr(register["E"].value))
+
+        elif function == BDOS_PRINT_STRING:
+
+            address = register["DE"].value
+
+            characters = []
+
+            while len(characters) < MEMORY_SIZE:
+
+                character = self.ram.read(address)
+
+                if character == ord('$'):
+                    break
+
+                characters.append(chr(character))
+
+                address = (address + 1) & (MEMORY_SIZE - 1)
+
+            self._output.append(''.join(characters))
+
+        else:
+
+            _logger.warning("Unsupported BDOS function %d", function)
+
+        # return: pop PC, instead of executing the instruction at 0x0005
+        self.cpu.abort()
+
+        sp = register["SP"].value
+
+        register["PC"].value = self.ram.read(sp) | (self.ram.read((sp + 1) & 0xFFFF) << 8)
+        register["SP"].value = sp + 2
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def parse_output(output):
+    """Results of the tests printed by an exerciser"""
+
+    tests = []
+
+    for line in output.replace('\r', '\n').split('\n'):
+
+        match = _TEST_ERROR.match(line)
+
+        if match:
+
+            tests.append(TestResult(match.group('name').strip(), False,
+                                    int(match.group('expected'), 16),
+                                    int(match.group('found'), 16)))
+
+            continue
+
+        match = _TEST_OK.match(line)
+
+        if match and match.group('name').strip():
+            tests.append(TestResult(match.group('name').strip(), True))
+
+    return tests
+
+
+def run_file(file_name, max_instructions=None):
+    """Run an exerciser .COM file, returns an ExerciserResult"""
+
+    with open(file_name, 'rb') as f:
+        program = f.read()
+
+    return Exerciser(program).run(max_instructions)
+
+
+def main(args=None):
+    """Run an exerciser and report its results, the exit status is 1 if a
+    test failed or the program did not run to its end"""
+
+    parser = argparse.ArgumentParser(
+        description='Run a CP/M Z80 instruction exerciser')
+
+    parser.add_argument('program', help='exerciser .COM file')
+    parser.add_argument('--max-instructions', type=int, default=None,
+                        help='stop after this many instructions')
+
+    args = parser.parse_args(args)
+
+    result = run_file(args.program, args.max_instructions)
+
+    for test in result.tests:
+
+        if test.passed:
+            print('PASS  {0}'.format(test.name))
+        else:
+            print('FAIL  {0}  crc expected {1:08x} found {2:08x}'.format(
+                test.name, test.expected, test.found))
+
+    if result.error:
+        print('Stopped: {0}'.format(result.error))
+
+    print('{0} instructions in {1:.2f} s: {2:.0f} instructions/s'.format(
+        result.instructions, result.elapsed, result.instructions_per_second))
+
+    return 0 if result.passed else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
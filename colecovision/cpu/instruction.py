@@ -17,6 +17,45 @@ _logger = logging.getLogger(__name__)
 #-----------------------------------------------------------------------------
 
 LOAD_8B_REGISTER_TO_REGISTER = 0x40
+LOAD_8B_MASK                 = 0xC0
+
+HALT            = 0x76
+DISABLE_INT     = 0xF3
+ENABLE_INT      = 0xFB
+EXTENDED_PREFIX = 0xED
+
+JUMP                 = 0xC3
+JUMP_CONDITIONAL     = 0xC2     # condition in bits 3-5
+JUMP_RELATIVE        = 0x18
+JUMP_RELATIVE_COND   = 0x20     # NZ, Z, NC, C in bits 3-4
+JUMP_RELATIVE_MASK   = 0xE7
+JUMP_CONDITION_MASK  = 0xC7
+
+LOAD_A_MEMORY        = 0x3A     # LD A,(nn)
+INPUT_A_PORT         = 0xDB     # IN A,(n)
+
+LOGIC_8B_REGISTER    = 0xA0     # AND, XOR, OR, CP r
+LOGIC_8B_MASK        = 0xE0
+LOGIC_8B_IMMEDIATE   = 0xE6     # AND, XOR, OR, CP n
+LOGIC_8B_IMM_MASK    = 0xE7
+
+# operations of the logic instructions, in op code order
+LOGIC_OPERATION = ('AND', 'XOR', 'OR', 'CP')
+
+# second bytes of the ED prefixed interrupt instructions
+RETURN_NMI       = 0x45
+RETURN_INT       = 0x4D
+INT_MODE_0       = 0x46
+INT_MODE_1       = 0x56
+INT_MODE_2       = 0x5E
+
+# Decoder tables for the register and condition fields of an op code.
+# Register ID 6 of REGISTER_8B selects the memory operand (HL) rather than
+# a register.
+REGISTER_8B        = ('B', 'C', 'D', 'E', 'H', 'L', None, 'A')
+REGISTER_16B       = ('BC', 'DE', 'HL', 'SP')
+REGISTER_16B_STACK = ('BC', 'DE', 'HL', 'AF')
+CONDITION          = ('NZ', 'Z', 'NC', 'C', 'PO', 'PE', 'P', 'M')
 
 
 #-----------------------------------------------------------------------------
@@ -41,6 +80,13 @@ class InstructionInterface(object):
         """Number of cycles remaining to finish execution"""
         return self._cycles
 
+    @property
+    def side_effects(self):
+        """Flag used to indicate that the instruction may change anything
+        other than the registers (memory, I/O devices, CPU state), so
+        repeating it is not harmless"""
+        return True
+
 
     
 #-----------------------------------------------------------------------------
@@ -80,6 +126,23 @@ class UnknownRegisterError(InstructionError):
         
         return msg
         
+class UnknownInstructionError(InstructionError):
+    """Unknown (not implemented) instruction error"""
+
+    def __init__(self, address, op_code):
+        """Initialization"""
+
+        self.address = address
+        self.op_code = op_code
+
+    def __str__(self):
+        """User-friendly string representation"""
+
+        msg = "Unknown instruction 0x{0:02X} at 0x{1:04X}".format(self.op_code,
+                                                                 self.address)
+
+        return msg
+
 class AddressMode(object):
     """Instruction Addressing Modes"""
 
@@ -121,15 +184,20 @@ class Load_8b(InstructionInterface):
         self._dst             = dst
         self._cycles          = Load_8b.cycle_map[addressing_mode]
 
-        if kwargs.has_key('src_idx'):
+        if 'src_idx' in kwargs:
             self._src_idx = kwargs['src_idx']
 
-        if kwargs.has_key('dst_idx'):
+        if 'dst_idx' in kwargs:
             self._dst_idx = kwargs['dst_idx']
 
-        if kwargs.has_key('iff2'):
+        if 'iff2' in kwargs:
             self._iff2 = kwargs['iff2']
 
+    @property
+    def side_effects(self):
+        """Loads to a register only change the register"""
+        return self._addressing_mode[0] != AddressMode.REGISTER
+
     def execute(self):
         """Execute the load instruction"""
 
@@ -211,6 +279,247 @@ class Load_8b(InstructionInterface):
                 else:
                     raise LoadError('Unknown addressing mode')
 
+class Jump(InstructionInterface):
+    """JP and JR, conditional or not"""
+
+    def __init__(self, register_set, target, condition=None, relative=False):
+        """Initialization, the condition is tested when the instruction is
+        created, as it sets the cycle count"""
+
+        self._register = register_set
+        self._target = target
+
+        self._taken = (condition is None) or colecovision.cpu.condition.met(
+            register_set['F'].value, condition)
+
+        if relative:
+            self._cycles = 12 if self._taken else 7
+        else:
+            self._cycles = 10
+
+    @property
+    def side_effects(self):
+        return False
+
+    def execute(self):
+        """Execute the jump"""
+
+        if self._cycles > 0:
+
+            self._cycles -= 1
+
+            if (self._cycles == 0) and self._taken:
+                self._register['PC'].value = self._target
+
+
+class Input(InstructionInterface):
+    """IN A,(n)"""
+
+    def __init__(self, register_set, io, port):
+        """Initialization"""
+
+        self._register = register_set
+        self._io = io
+        self._port = port
+        self._cycles = 11
+
+    @property
+    def side_effects(self):
+        """Reads of some ports change the device read"""
+        return not self._io.idempotent_read(self._port)
+
+    def execute(self):
+        """Execute the input instruction"""
+
+        if self._cycles > 0:
+
+            self._cycles -= 1
+
+            if self._cycles == 0:
+                self._register['A'].value = self._io.read(self._port)
+
+
+class Logic_8b(InstructionInterface):
+    """8-bit AND, XOR, OR and CP (a subtraction keeping only the flags) of
+    the accumulator with a register, (HL) or an immediate value"""
+
+    cycle_map = { AddressMode.REGISTER          : 4,
+                  AddressMode.REGISTER_INDIRECT : 7,
+                  AddressMode.IMMEDIATE         : 7 }
+
+    def __init__(self, register_set, ext_mem, operation, addressing_mode, src):
+        """Initialization"""
+
+        self._register        = register_set
+        self._ext_mem         = ext_mem
+        self._operation       = operation
+        self._addressing_mode = addressing_mode
+        self._src             = src
+        self._cycles          = Logic_8b.cycle_map[addressing_mode]
+
+    @property
+    def side_effects(self):
+        return False
+
+    def execute(self):
+        """Execute the logic instruction"""
+
+        if self._cycles > 0:
+
+            self._cycles -= 1
+
+            if self._cycles == 0:
+
+                if self._addressing_mode == AddressMode.REGISTER:
+                    operand = self._src.value
+                elif self._addressing_mode == AddressMode.REGISTER_INDIRECT:
+                    operand = self._ext_mem.read(self._src.value)
+                else:
+                    operand = self._src
+
+                accumulator = self._register['A'].value
+
+                flag = colecovision.cpu.condition
+
+                if self._operation == 'CP':
+
+                    result = accumulator - operand
+
+                    flags = flag.SUBTRACT
+
+                    if result < 0:
+                        flags |= flag.CARY
+
+                    if (accumulator & 0x0F) < (operand & 0x0F):
+                        flags |= flag.HALF_CARY
+
+                    if (accumulator ^ operand) & (accumulator ^ result) & 0x80:
+                        flags |= flag.PARITY_OVERFLOW
+
+                    result &= 0xFF
+
+                else:
+
+                    if self._operation == 'AND':
+                        result = accumulator & operand
+                        flags = flag.HALF_CARY
+                    elif self._operation == 'XOR':
+                        result = accumulator ^ operand
+                        flags = 0
+                    else:
+                        result = accumulator | operand
+                        flags = 0
+
+                    # even parity
+                    if not bin(result).count('1') & 0x01:
+                        flags |= flag.PARITY_OVERFLOW
+
+                    self._register['A'].value = result
+
+                if result & 0x80:
+                    flags |= flag.SIGN
+
+                if result == 0:
+                    flags |= flag.ZERO
+
+                self._register['F'].value = flags
+
+
+class _ControlInstruction(InstructionInterface):
+    """Instruction that acts on the CPU once its cycles are complete"""
+
+    def __init__(self, cycles):
+        """Initialization"""
+
+        self._cycles = cycles
+
+    def execute(self):
+        """Execute the instruction"""
+
+        if self._cycles > 0:
+
+            self._cycles -= 1
+
+            if self._cycles == 0:
+                self._complete()
+
+    @abc.abstractmethod
+    def _complete(self):
+        """Perform the operation of the instruction"""
+        pass
+
+
+class Halt(_ControlInstruction):
+    """HALT: suspend execution until an interrupt"""
+
+    def __init__(self, cpu):
+        """Initialization"""
+
+        _ControlInstruction.__init__(self, 4)
+
+        self._cpu = cpu
+
+    def _complete(self):
+        self._cpu.halt()
+
+
+class InterruptEnable(_ControlInstruction):
+    """EI and DI: enable or disable the maskable interrupt"""
+
+    def __init__(self, cpu, enable):
+        """Initialization"""
+
+        _ControlInstruction.__init__(self, 4)
+
+        self._cpu = cpu
+        self._enable = enable
+
+    def _complete(self):
+
+        if self._enable:
+            self._cpu.enable_interrupts()
+        else:
+            self._cpu.disable_interrupts()
+
+
+class InterruptMode(_ControlInstruction):
+    """IM 0, IM 1 and IM 2: select the maskable interrupt mode"""
+
+    def __init__(self, cpu, mode):
+        """Initialization"""
+
+        _ControlInstruction.__init__(self, 8)
+
+        self._cpu = cpu
+        self._mode = mode
+
+    def _complete(self):
+        self._cpu.interrupt_mode = self._mode
+
+
+class ReturnInterrupt(_ControlInstruction):
+    """RETN and RETI: return from an interrupt, restoring IFF1 from IFF2"""
+
+    def __init__(self, register_set, ext_mem, cpu):
+        """Initialization"""
+
+        _ControlInstruction.__init__(self, 14)
+
+        self._register = register_set
+        self._ext_mem = ext_mem
+        self._cpu = cpu
+
+    def _complete(self):
+
+        sp = self._register['SP'].value
+
+        self._register['PC'].value = (self._ext_mem.read(sp) |
+                                      (self._ext_mem.read((sp + 1) & 0xFFFF) << 8))
+
+        self._register['SP'].value = sp + 2
+
+        self._cpu.return_from_interrupt()
+
 #-----------------------------------------------------------------------------
 # Functions
 #-----------------------------------------------------------------------------
@@ -220,43 +529,32 @@ def _get_load_instruction_register(register_id):
     load instuction.
     """
     
-    # load instruction register IDs
-    REGISTER_ID_A = 7
-    REGISTER_ID_B = 0
-    REGISTER_ID_C = 1
-    REGISTER_ID_D = 2
-    REGISTER_ID_E = 3
-    REGISTER_ID_H = 4
-    REGISTER_ID_L = 5
-
     instruction_register = None
-    
-    if register_id == REGISTER_ID_A:
-        instruction_register = 'A'
-    elif register_id == REGISTER_ID_B:
-        instruction_register = 'B'
-    elif register_id == REGISTER_ID_C:
-        instruction_register = 'C'
-    elif register_id == REGISTER_ID_D:
-        instruction_register = 'D'
-    elif register_id == REGISTER_ID_E:
-        instruction_register = 'E'
-    elif register_id == REGISTER_ID_H:
-        instruction_register = 'H'
-    elif register_id == REGISTER_ID_L:
-        instruction_register = 'L'
-    else:
+
+    if 0 <= register_id < len(REGISTER_8B):
+        instruction_register = REGISTER_8B[register_id]
+
+    if instruction_register is None:
         raise UnknownRegisterError(register_id)
     
     return instruction_register
 
-def create(register, memory):
+def _peek_word(memory, address):
+    """Little endian operand word at address, read without side effects"""
+    return memory.peek(address) | (memory.peek(address + 1) << 8)
+
+def create(register, memory, cpu=None, data_memory=None):
     
     """Decodes memory at the given PC address and creates an instruction.
     
     Returns a tuple that contains the number of bytes read and the
-    instruction.
+    instruction.  The CPU is needed by the instructions that act on the
+    interrupt state.  The instruction accesses its data through
+    data_memory, the memory it is decoded from by default.
     """
+
+    if data_memory is None:
+        data_memory = memory
     
     # no instruction
     created_instruction = None
@@ -264,14 +562,116 @@ def create(register, memory):
     # no bytes read
     instruction_bytes_read = 0
 
-    # create possible one, two, three, and four byte instructions
-    one_byte_instruction   = memory.read(register['PC'].value)
-    two_byte_instruction   = (memory.read(register['PC'].value + 1) << 8) | one_byte_instruction
-    three_byte_instruction = (memory.read(register['PC'].value + 2) << 16) | two_byte_instruction
-    four_byte_instruction  = (memory.read(register['PC'].value + 3) << 16) | three_byte_instruction
-                                                   
-    
-    if (one_byte_instruction & LOAD_8B_REGISTER_TO_REGISTER):
+    pc = register['PC'].value
+
+    # the op code is fetched, the operand bytes are peeked as they are
+    # decoded: hooks (watchpoints) only see the op code fetch, and no byte
+    # beyond the instruction is read
+    one_byte_instruction = memory.fetch(pc)
+
+    if one_byte_instruction == HALT:
+
+        created_instruction = Halt(cpu)
+
+        instruction_bytes_read = 1
+
+    elif one_byte_instruction in (DISABLE_INT, ENABLE_INT):
+
+        created_instruction = InterruptEnable(cpu, one_byte_instruction == ENABLE_INT)
+
+        instruction_bytes_read = 1
+
+    elif one_byte_instruction == EXTENDED_PREFIX:
+
+        second_byte = memory.peek(pc + 1)
+
+        if second_byte in (RETURN_NMI, RETURN_INT):
+
+            created_instruction = ReturnInterrupt(register, data_memory, cpu)
+
+            instruction_bytes_read = 2
+
+        elif second_byte in (INT_MODE_0, INT_MODE_1, INT_MODE_2):
+
+            mode = (INT_MODE_0, INT_MODE_1, INT_MODE_2).index(second_byte)
+
+            created_instruction = InterruptMode(cpu, mode)
+
+            instruction_bytes_read = 2
+
+    elif one_byte_instruction == JUMP:
+
+        created_instruction = Jump(register, _peek_word(memory, pc + 1))
+
+        instruction_bytes_read = 3
+
+    elif (one_byte_instruction & JUMP_CONDITION_MASK) == JUMP_CONDITIONAL:
+
+        condition = CONDITION[(one_byte_instruction >> 3) & 0x07]
+
+        created_instruction = Jump(register, _peek_word(memory, pc + 1), condition)
+
+        instruction_bytes_read = 3
+
+    elif ((one_byte_instruction == JUMP_RELATIVE) or
+          ((one_byte_instruction & JUMP_RELATIVE_MASK) == JUMP_RELATIVE_COND)):
+
+        condition = None
+
+        if one_byte_instruction != JUMP_RELATIVE:
+            condition = CONDITION[(one_byte_instruction >> 3) & 0x03]
+
+        # signed displacement from the next instruction
+        displacement = memory.peek(pc + 1)
+
+        if displacement & 0x80:
+            displacement -= 0x100
+
+        target = (pc + 2 + displacement) & 0xFFFF
+
+        created_instruction = Jump(register, target, condition, relative=True)
+
+        instruction_bytes_read = 2
+
+    elif one_byte_instruction == LOAD_A_MEMORY:
+
+        created_instruction = Load_8b(register, data_memory,
+                                      (AddressMode.REGISTER, AddressMode.MEMORY_IMMEDIATE),
+                                      _peek_word(memory, pc + 1), register['A'])
+
+        instruction_bytes_read = 3
+
+    elif (one_byte_instruction == INPUT_A_PORT) and (cpu is not None) and (cpu.io is not None):
+
+        created_instruction = Input(register, cpu.io, memory.peek(pc + 1))
+
+        instruction_bytes_read = 2
+
+    elif (one_byte_instruction & LOGIC_8B_MASK) == LOGIC_8B_REGISTER:
+
+        operation = LOGIC_OPERATION[(one_byte_instruction >> 3) & 0x03]
+
+        register_id = one_byte_instruction & 0x07
+
+        if REGISTER_8B[register_id] is None:
+            created_instruction = Logic_8b(register, data_memory, operation,
+                                           AddressMode.REGISTER_INDIRECT, register['HL'])
+        else:
+            created_instruction = Logic_8b(register, data_memory, operation, AddressMode.REGISTER,
+                                           register[REGISTER_8B[register_id]])
+
+        instruction_bytes_read = 1
+
+    elif (one_byte_instruction & LOGIC_8B_IMM_MASK) == LOGIC_8B_IMMEDIATE:
+
+        operation = LOGIC_OPERATION[(one_byte_instruction >> 3) & 0x03]
+
+        created_instruction = Logic_8b(register, data_memory, operation, AddressMode.IMMEDIATE,
+                                       memory.peek(pc + 1))
+
+        instruction_bytes_read = 2
+
+    elif (one_byte_instruction & LOAD_8B_MASK) == LOAD_8B_REGISTER_TO_REGISTER:
         
         src_reg = _get_load_instruction_register(one_byte_instruction & 0x07)
         dst_reg = _get_load_instruction_register((one_byte_instruction >> 3) & 0x07)
@@ -2,9 +2,8 @@
 
 import logging
 
-from colecovision.emulate.cpu.register import Register, CompositeRegister
-from colecovision.emulate.cpu.instruction import Load_8b
-from colecovision.emulate.cpu.instruction import AddressMode
+from colecovision.cpu.register import Register, CompositeRegister
+from colecovision.cpu import instruction
 
 
 #-----------------------------------------------------------------------------
@@ -15,6 +14,43 @@ from colecovision.emulate.cpu.instruction import AddressMode
 _logger = logging.getLogger(__name__)
 
 
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+# Registers saved in the CPU state, the composite registers (BC, DE, ...)
+# are made of these
+STATE_REGISTERS = ("PC", "SP", "IX", "IY", "I", "R",
+                   "A", "F", "B", "C", "D", "E", "H", "L",
+                   "A'", "F'", "B'", "C'", "D'", "E'", "H'", "L'")
+
+# Interrupts
+NMI_ADDRESS      = 0x0066
+IM1_ADDRESS      = 0x0038
+NMI_CYCLES       = 11
+IM0_CYCLES       = 13
+IM1_CYCLES       = 13
+IM2_CYCLES       = 19
+HALT_CYCLES      = 4        # cycles of each NOP executed while halted
+DEFAULT_VECTOR   = 0xFF     # data bus value when no device drives it (RST 38H)
+
+# Idle loops: longest backward jump considered a loop, in bytes
+IDLE_LOOP_MAX_LENGTH = 32
+
+# Register set template: the registers and their lengths, and the
+# composite registers made of a high and a low register
+_REGISTER_SET = (("PC", 16), ("SP", 16), ("IX", 16), ("IY", 16),
+                 ("I", 8), ("R", 8),
+                 ("A", 8), ("A'", 8), ("F", 8), ("F'", 8),
+                 ("B", 8), ("B'", 8), ("C", 8), ("C'", 8),
+                 ("D", 8), ("D'", 8), ("E", 8), ("E'", 8),
+                 ("H", 8), ("H'", 8), ("L", 8), ("L'", 8))
+
+_COMPOSITE_REGISTER_SET = (("BC", "B", "C"), ("BC'", "B'", "C'"),
+                           ("DE", "D", "E"), ("DE'", "D'", "E'"),
+                           ("HL", "H", "L"), ("HL'", "H'", "L'"))
+
+
 #-----------------------------------------------------------------------------
 # Classes
 #-----------------------------------------------------------------------------
@@ -34,77 +70,435 @@ class Z80(object):
     # current instruction (independent of interrupt enable), forces
     # CPU restart @ 0x0066. Pushes PC onto stack
 
-    # need member for interrupt_status (mode 0, etc.) and interrupt enable
+    # Interrupts are checked at instruction boundaries through a single
+    # flag, _interrupt_pending, which is recomputed only when the NMI,
+    # the INT line, IFF1 or the EI delay change.  A halted CPU with no
+    # interrupt pending skips straight to the end of run(), which is the
+    # next scheduled event of the machine, rather than executing NOPs.
 
-    # on reset, reset interrupt enable, clear PC, I and R, set interrupt status
-    # to Mode 0...takes 3 cycles
+    # With idle_detection set, run() looks for idle loops: a backward jump
+    # closing an iteration made only of instructions without side effects
+    # (register loads, logic, jumps and repeatable port reads) that leaves
+    # every register as it was at the start of the iteration.  Memory and
+    # ports only change through events outside of run(), so every later
+    # iteration would be identical: run() skips as many whole iterations
+    # as fit before the end of its budget, accounting their cycles and
+    # instructions exactly, and executes the rest.  Memory hooks (debugger,
+    # coverage) do not see the reads of skipped iterations.
 
-    def __init__(self, memory_system):
+    def __init__(self, memory_system, io_system=None):
         """Initialization"""
 
 
-        # Create the CPU registers
-        self.register        = {}
-        self.register["PC"]  = Register(length=16, init_value=0)
-        self.register["SP"]  = Register(length=16, init_value=0)
-        self.register["IX"]  = Register(length=16, init_value=0)
-        self.register["IY"]  = Register(length=16, init_value=0)
-        self.register["I"]   = Register(length=8,  init_value=0)
-        self.register["R"]   = Register(length=8,  init_value=0)
-        self.register["A"]   = Register(length=8,  init_value=0)
-        self.register["A'"]  = Register(length=8,  init_value=0)
-        self.register["F"]   = Register(length=8,  init_value=0)
-        self.register["F'"]  = Register(length=8,  init_value=0)
-        self.register["B"]   = Register(length=8,  init_value=0)
-        self.register["B'"]  = Register(length=8,  init_value=0)
-        self.register["C"]   = Register(length=8,  init_value=0)
-        self.register["C'"]  = Register(length=8,  init_value=0)
-        self.register["D"]   = Register(length=8,  init_value=0)
-        self.register["D'"]  = Register(length=8,  init_value=0)
-        self.register["E"]   = Register(length=8,  init_value=0)
-        self.register["E'"]  = Register(length=8,  init_value=0)
-        self.register["H"]   = Register(length=8,  init_value=0)
-        self.register["H'"]  = Register(length=8,  init_value=0)
-        self.register["L"]   = Register(length=8,  init_value=0)
-        self.register["L'"]  = Register(length=8,  init_value=0)
-        self.register["BC"]  = CompositeRegister(self.register['B'], self.register['C'])
-        self.register["BC'"] = CompositeRegister(self.register["B'"], self.register["C'"])
-        self.register["DE"]  = CompositeRegister(self.register["D"], self.register["E"])
-        self.register["DE'"] = CompositeRegister(self.register["D'"], self.register["E'"])
-        self.register["HL"]  = CompositeRegister(self.register["H"], self.register["L"])
-        self.register["HL'"] = CompositeRegister(self.register["H'"], self.register["L'"])
+        # Create the CPU registers from the register set template
+        self.register = {}
+
+        for name, length in _REGISTER_SET:
+            self.register[name] = Register(length=length, init_value=0)
+
+        for name, high, low in _COMPOSITE_REGISTER_SET:
+            self.register[name] = CompositeRegister(self.register[high], self.register[low])
 
         # Get a reference to the memory system (RAM, ROM)
         self.memsys = memory_system
 
+        # Get a reference to the I/O system (I/O ports), if any
+        self.io = io_system
+
+        # Memory the instructions access their data (and the stack)
+        # through, colecovision.coverage replaces it to record the accesses
+        self.data_memory = memory_system
+
+        # Bitmap (a bytearray of the address space) in which the address
+        # of every instruction executed is set to 1, None when disabled
+        self.executed_bitmap = None
+
+        # Total number of cycles and instructions executed
+        self.cycles = 0
+        self.instructions = 0
+
+        # Set by stop() to end run() at the next instruction boundary
+        self._stop = False
+
+        # Set when the last run() ended early because of stop() or abort()
+        self.stopped = False
+
+        # Set by abort() to cancel the instruction being fetched
+        self._abort = False
+
+        # Interrupt state: flip-flops, mode, HALT, the NMI edge latch, the
+        # INT line and the vector on the data bus during its acknowledge,
+        # and the EI delay (no interrupt before the end of the instruction
+        # after EI)
+        self.iff1 = False
+        self.iff2 = False
+        self.interrupt_mode = 0
+        self.halted = False
+
+        self._nmi_pending = False
+        self._int_line = False
+        self._int_vector = DEFAULT_VECTOR
+        self._ei_delay = False
+
+        self._interrupt_pending = False
 
-        # Mapping of opcodes to instructions
-
-                               # op code   class     arguments                                                                 bytes to read
-        self._instruction_map = {0x57ed : (Load_8b, (4,  self.a, AddressMode.REGISTER,  self.i,      AddressMode.REGISTER),          0),
-                                 0x5fed : (Load_8b, (4,  self.a, AddressMode.REGISTER,  self.r,      AddressMode.REGISTER),          0),
-                                 0x007f : (Load_8b, (4,  self.a, AddressMode.REGISTER,  self.a,      AddressMode.REGISTER),          0),
-                                 0x0078 : (Load_8b, (4,  self.a, AddressMode.REGISTER,  self.b,      AddressMode.REGISTER),          0),
-                                 0x0079 : (Load_8b, (4,  self.a, AddressMode.REGISTER,  self.c,      AddressMode.REGISTER),          0),
-                                 0x007a : (Load_8b, (4,  self.a, AddressMode.REGISTER,  self.d,      AddressMode.REGISTER),          0),
-                                 0X007b : (Load_8b, (4,  self.a, AddressMode.REGISTER,  self.e,      AddressMode.REGISTER),          0),
-                                 0x007c : (Load_8b, (4,  self.a, AddressMode.REGISTER,  self.f,      AddressMode.REGISTER),          0),
-                                 0x007d : (Load_8b, (4,  self.a, AddressMode.REGISTER,  self.l,      AddressMode.REGISTER),          0),
-                                 0x007e : (Load_8b, (7,  self.a, AddressMode.REGISTER,  self.hl,     AddressMode.REGISTER_INDIRECT), 0),
-                                 0x000a : (Load_8b, (7,  self.a, AddressMode.REGISTER,  self.bc,     AddressMode.REGISTER_INDIRECT), 0),
-                                 0x001a : (Load_8b, (7,  self.a, AddressMode.REGISTER,  self.de,     AddressMode.REGISTER_INDIRECT), 0),
-                                 0x7efd : (Load_8b, (19, self.a, AddressMode.REGISTER,  self.ix,     AddressMode.INDEXED),           1),
-                                 0X7edd : (Load_8b, (19, self.a, AddressMode.REGISTER,  self.iy,     AddressMode.INDEXED),           1),
-                                 0x3afd : (Load_8b, (13, self.a, AddressMode.REGISTER,  self.memsys, AddressMode.EXT_ADDRESS),       2),
-                                 0x2efd : (Load_8b, (7,  self.a, AddressMode.REGISTER,  None,        AddressMode.IMMEDIATE),         1)}
-                                 
+        # Cycles skipped while halted
+        self.halt_cycles = 0
+
+        # Idle loop detection, and the cycles skipped by it
+        self.idle_detection = False
+        self.idle_cycles = 0
+
+        # Last instruction executed by step(), None after an interrupt
+        # acknowledge, a HALT cycle or an aborted instruction
+        self._last_instruction = None
+
+        self._clear_idle_loop()
 
     def reset(self):
         """Resets the CPU"""
-        pass
+
+        self.register["PC"].value = 0
+        self.register["I"].value = 0
+        self.register["R"].value = 0
+
+        self.iff1 = False
+        self.iff2 = False
+        self.interrupt_mode = 0
+        self.halted = False
+
+        self._nmi_pending = False
+        self._ei_delay = False
+
+        self._update_pending()
+
+    def step(self):
+        """Execute a single instruction.
+
+        Returns the number of cycles taken by the instruction, 0 if the
+        instruction was aborted.
+        """
+
+        self._last_instruction = None
+
+        if self._interrupt_pending:
+            return self._acknowledge()
+
+        if self.halted:
+
+            self.cycles += HALT_CYCLES
+            self.halt_cycles += HALT_CYCLES
+
+            return HALT_CYCLES
+
+        # interrupts are accepted again after the instruction following EI
+        ei_delay = self._ei_delay
+
+        self._ei_delay = False
+
+        bytes_read, created_instruction = instruction.create(self.register, self.memsys,
+                                                             self, self.data_memory)
+
+        if self._abort:
+
+            self._abort = False
+            self._ei_delay = ei_delay
+
+            return 0
+
+        if created_instruction is None:
+
+            address = self.register["PC"].value
+
+            raise instruction.UnknownInstructionError(address, self.memsys.read(address))
+
+        if self.executed_bitmap is not None:
+            self.executed_bitmap[self.register["PC"].value] = 1
+
+        self.register["PC"].value += bytes_read
+
+        cycles = created_instruction.cycles
+
+        while not created_instruction.complete:
+            created_instruction.execute()
+
+        self.cycles += cycles
+        self.instructions += 1
+
+        if ei_delay:
+            self._update_pending()
+
+        self._last_instruction = created_instruction
+
+        return cycles
+
+    def run(self, cycles):
+        """Execute instructions for (at least) the given number of cycles.
+
+        Execution ends early, at an instruction boundary, if stop() is
+        called, which sets stopped.  Returns the number of cycles executed.
+        """
+
+        executed = 0
+
+        self.stopped = False
+
+        # memory and ports may have changed since the last run
+        self._clear_idle_loop()
+
+        while executed < cycles:
+
+            if self._stop:
+
+                self._stop = False
+                self.stopped = True
+
+                break
+
+            if self.halted and not self._interrupt_pending:
+
+                # nothing happens until an interrupt, which only arrives
+                # from outside of run()
+                skipped = ((cycles - executed + HALT_CYCLES - 1) // HALT_CYCLES) * HALT_CYCLES
+
+                self.cycles += skipped
+                self.halt_cycles += skipped
+
+                executed += skipped
+
+                break
+
+            if not self.idle_detection:
+
+                executed += self.step()
+
+                continue
+
+            pc = self.register["PC"].value
+
+            taken = self.step()
+
+            executed += taken
+
+            last_instruction = self._last_instruction
+
+            if (last_instruction is None) or last_instruction.side_effects:
+
+                self._clear_idle_loop()
+
+                continue
+
+            self._iteration_cycles += taken
+            self._iteration_instructions += 1
+
+            target = self.register["PC"].value
+
+            if (target > pc) or (pc - target >= IDLE_LOOP_MAX_LENGTH):
+                continue
+
+            # backward jump: an iteration of a loop starting at target ended
+            signature = tuple(self.register[name].value for name in STATE_REGISTERS)
+
+            if signature == self._iteration_signature:
+
+                iterations = (cycles - executed) // self._iteration_cycles
+
+                skipped = iterations * self._iteration_cycles
+
+                self.cycles += skipped
+                self.instructions += iterations * self._iteration_instructions
+                self.idle_cycles += skipped
+
+                executed += skipped
+
+            self._iteration_signature = signature
+            self._iteration_cycles = 0
+            self._iteration_instructions = 0
+
+        return executed
+
+    def _clear_idle_loop(self):
+        """Forget the loop iteration in progress"""
+
+        # registers at the start of the iteration, and its length
+        self._iteration_signature = None
+        self._iteration_cycles = 0
+        self._iteration_instructions = 0
+
+    def stop(self):
+        """End run() at the next instruction boundary"""
+        self._stop = True
+
+    def nmi(self):
+        """Non-maskable interrupt request (falling edge of the NMI input)"""
+
+        self._nmi_pending = True
+        self._interrupt_pending = True
+
+    def set_interrupt_line(self, asserted, vector=DEFAULT_VECTOR):
+        """Set the level of the maskable interrupt (INT) input, and the
+        value the interrupting device puts on the data bus"""
+
+        self._int_line = asserted
+        self._int_vector = vector
+
+        self._update_pending()
+
+    def halt(self):
+        """HALT: suspend execution until an interrupt"""
+        self.halted = True
+
+    def enable_interrupts(self):
+        """EI: enable the maskable interrupt after the next instruction"""
+
+        self.iff1 = True
+        self.iff2 = True
+
+        self._ei_delay = True
+
+        self._update_pending()
+
+    def disable_interrupts(self):
+        """DI: disable the maskable interrupt"""
+
+        self.iff1 = False
+        self.iff2 = False
+
+        self._update_pending()
+
+    def return_from_interrupt(self):
+        """RETN and RETI: restore IFF1 from IFF2"""
+
+        self.iff1 = self.iff2
+
+        self._update_pending()
+
+    def _update_pending(self):
+        """Recompute the interrupt pending flag"""
+
+        self._interrupt_pending = (self._nmi_pending or
+                                   (self._int_line and self.iff1 and
+                                    not self._ei_delay))
+
+    def _push_pc(self):
+        """Push PC onto the stack"""
+
+        sp = (self.register["SP"].value - 2) & 0xFFFF
+        pc = self.register["PC"].value
+
+        self.data_memory.write(sp, pc & 0xFF)
+        self.data_memory.write((sp + 1) & 0xFFFF, pc >> 8)
+
+        self.register["SP"].value = sp
+
+    def _acknowledge(self):
+        """Accept the pending interrupt, returns the cycles taken"""
+
+        self.halted = False
+
+        self._push_pc()
+
+        if self._nmi_pending:
+
+            self._nmi_pending = False
+
+            self.iff2 = self.iff1
+            self.iff1 = False
+
+            self.register["PC"].value = NMI_ADDRESS
+
+            cycles = NMI_CYCLES
+
+        else:
+
+            self.iff1 = False
+            self.iff2 = False
+
+            if self.interrupt_mode == 2:
+
+                address = (self.register["I"].value << 8) | (self._int_vector & 0xFE)
+
+                self.register["PC"].value = (self.data_memory.read(address) |
+                                             (self.data_memory.read((address + 1) & 0xFFFF) << 8))
+
+                cycles = IM2_CYCLES
+
+            elif self.interrupt_mode == 1:
+
+                self.register["PC"].value = IM1_ADDRESS
+
+                cycles = IM1_CYCLES
+
+            else:
+
+                # the instruction on the data bus, only RST is supported
+                if (self._int_vector & 0xC7) != 0xC7:
+                    _logger.warning("Unsupported IM 0 instruction 0x%02X", self._int_vector)
+
+                self.register["PC"].value = self._int_vector & 0x38
+
+                cycles = IM0_CYCLES
+
+        self._update_pending()
+
+        self.cycles += cycles
+
+        return cycles
+
+    def clear_stop(self):
+        """Cancel a stop() that run() has not acted upon yet"""
+        self._stop = False
+
+    def abort(self):
+        """Cancel the instruction being fetched and end run() before it
+        executes, PC is left on the instruction.  Call from a fetch hook
+        (see colecovision.debugger)."""
+
+        self._abort = True
+        self._stop = True
+
+    def save_state(self):
+        """CPU state, as a dictionary"""
+
+        state = dict((name, self.register[name].value) for name in STATE_REGISTERS)
+
+        state["cycles"] = self.cycles
+        state["instructions"] = self.instructions
+
+        state["interrupt"] = {"iff1"        : int(self.iff1),
+                              "iff2"        : int(self.iff2),
+                              "mode"        : self.interrupt_mode,
+                              "halted"      : int(self.halted),
+                              "nmi_pending" : int(self._nmi_pending),
+                              "int_line"    : int(self._int_line),
+                              "int_vector"  : self._int_vector,
+                              "ei_delay"    : int(self._ei_delay)}
+
+        return state
+
+    def load_state(self, state):
+        """Restore a CPU state saved by save_state()"""
+
+        for name in STATE_REGISTERS:
+            self.register[name].value = state[name]
+
+        self.cycles = state["cycles"]
+        self.instructions = state["instructions"]
+
+        interrupt = state["interrupt"]
+
+        self.iff1 = bool(interrupt["iff1"])
+        self.iff2 = bool(interrupt["iff2"])
+        self.interrupt_mode = interrupt["mode"]
+        self.halted = bool(interrupt["halted"])
+
+        self._nmi_pending = bool(interrupt["nmi_pending"])
+        self._int_line = bool(interrupt["int_line"])
+        self._int_vector = interrupt["int_vector"]
+        self._ei_delay = bool(interrupt["ei_delay"])
+
+        self._update_pending()
 
     def tick(self):
         """Clock Tick"""
         pass
-
-
@@ -0,0 +1,192 @@
+"""Breakpoints and watchpoints for the Colecovision"""
+
+import logging
+
+from colecovision.memory import MemoryHookInterface
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class WatchAccess(object):
+    """Kinds of memory access that trigger a watch"""
+
+    FETCH = 0   # op code fetch (breakpoint)
+    READ  = 1
+    WRITE = 2
+
+
+class _PageWatch(MemoryHookInterface):
+    """Watches set on a single page of the memory system"""
+
+    def __init__(self):
+        """Initialization"""
+
+        # address -> callback, one dictionary per kind of access
+        self.watches = {WatchAccess.FETCH : {},
+                        WatchAccess.READ  : {},
+                        WatchAccess.WRITE : {}}
+
+        self._fetch = self.watches[WatchAccess.FETCH]
+        self._read  = self.watches[WatchAccess.READ]
+        self._write = self.watches[WatchAccess.WRITE]
+
+    def fetch_hook(self, address, value):
+        """Called after an op code is fetched from the given address"""
+
+        callback = self._fetch.get(address)
+
+        if callback:
+            callback(WatchAccess.FETCH, address, value)
+
+    def read_hook(self, address, value):
+        """Called after a value is read from the given address"""
+
+        callback = self._read.get(address)
+
+        if callback:
+            callback(WatchAccess.READ, address, value)
+
+    def write_hook(self, address, value):
+        """Called after a value is written to the given address"""
+
+        callback = self._write.get(address)
+
+        if callback:
+            callback(WatchAccess.WRITE, address, value)
+
+    @property
+    def empty(self):
+        """Flag used to indicate that no watches remain on the page"""
+        return not (self._fetch or self._read or self._write)
+
+
+class Debugger(object):
+    """Breakpoints and watchpoints on a memory system.
+
+    Watches are implemented by hooking only the pages of the memory
+    system that contain a watched address, accesses to every other page
+    take the normal (un-instrumented) path.  Callbacks are called with
+    the kind of access (WatchAccess), the address and the value.
+    """
+
+    def __init__(self, memory_system):
+        """Initialization"""
+
+        self._memsys = memory_system
+
+        # page -> _PageWatch, for the pages that have watches set
+        self._page_watch = {}
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'Debugger({0!r})'.format(self._memsys)
+
+    def set_breakpoint(self, address, callback):
+        """Call callback when an op code is fetched from address"""
+
+        self._set_watch(WatchAccess.FETCH, address, callback)
+
+    def clear_breakpoint(self, address):
+        """Remove the breakpoint on address"""
+
+        self._clear_watch(WatchAccess.FETCH, address)
+
+    def set_watchpoint(self, address, callback, read=True, write=True):
+        """Call callback when address is read and/or written"""
+
+        if read:
+            self._set_watch(WatchAccess.READ, address, callback)
+
+        if write:
+            self._set_watch(WatchAccess.WRITE, address, callback)
+
+    def clear_watchpoint(self, address):
+        """Remove the read and write watches on address"""
+
+        self._clear_watch(WatchAccess.READ, address)
+        self._clear_watch(WatchAccess.WRITE, address)
+
+    def peek(self, address):
+        """Value at address, read without triggering any watch or device
+        side effect"""
+        return self._memsys.peek(address)
+
+    def read_block(self, address, length):
+        """length values starting at address, read without triggering any
+        watch or device side effect"""
+        return self._memsys.peek_block(address, length)
+
+    def clear_all(self):
+        """Remove all breakpoints and watchpoints"""
+
+        for page, page_watch in list(self._page_watch.items()):
+            self._memsys.remove_page_hook(page, page_watch)
+
+        self._page_watch.clear()
+
+    @property
+    def breakpoints(self):
+        """Addresses that have a breakpoint set"""
+        return self._addresses(WatchAccess.FETCH)
+
+    @property
+    def watchpoints(self):
+        """Addresses that have a read or write watch set"""
+        return sorted(set(self._addresses(WatchAccess.READ)) |
+                      set(self._addresses(WatchAccess.WRITE)))
+
+    def _addresses(self, access):
+        """Sorted list of the addresses watched for the given access"""
+
+        addresses = []
+
+        for page_watch in self._page_watch.values():
+            addresses.extend(page_watch.watches[access])
+
+        return sorted(addresses)
+
+    def _set_watch(self, access, address, callback):
+        """Add a watch, hooking the page containing address if needed"""
+
+        page = self._memsys.page(address)
+
+        page_watch = self._page_watch.get(page)
+
+        if page_watch is None:
+
+            page_watch = _PageWatch()
+
+            self._page_watch[page] = page_watch
+
+            self._memsys.add_page_hook(page, page_watch)
+
+        _logger.debug("Watching address 0x%04X", address)
+
+        page_watch.watches[access][address] = callback
+
+    def _clear_watch(self, access, address):
+        """Remove a watch, un-hooking its page once it has no watches"""
+
+        page = self._memsys.page(address)
+
+        page_watch = self._page_watch.get(page)
+
+        if page_watch is None:
+            return
+
+        page_watch.watches[access].pop(address, None)
+
+        if page_watch.empty:
+
+            self._memsys.remove_page_hook(page, page_watch)
+
+            del self._page_watch[page]
@@ -0,0 +1,389 @@
+"""Remote debug and telemetry server for the Colecovision
+
+The server lets a client inspect and control a running machine over a
+local TCP or Unix socket.  The network side runs an asyncio event loop in
+its own thread; commands received are queued and executed by the
+emulation thread between slices (frames) of emulation, so emulation never
+waits on the network and the machine is only touched by its own thread.
+
+The protocol is line based: each request is a JSON object on a line and
+each response is a JSON object on a line.  A request names its command:
+
+    {"command": "registers"}
+    {"command": "read", "address": 24576, "length": 1024}
+    {"command": "write", "address": 24576, "data": "00ff"}
+    {"command": "counters"}
+    {"command": "stats"}
+    {"command": "status"}
+    {"command": "pause"}
+    {"command": "step", "count": 1}
+    {"command": "resume"}
+
+Responses hold "ok" (true or false), the results of the command or, on
+failure, an "error" message.  Memory data is hex encoded.
+"""
+
+import asyncio
+import binascii
+import concurrent.futures
+import json
+import logging
+import queue
+import threading
+import time
+
+from colecovision.cpu.z80 import STATE_REGISTERS
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+DEFAULT_HOST = '127.0.0.1'
+
+# largest memory block returned by a read
+MAX_READ_LENGTH = 0x10000
+
+# time the emulation thread waits for a command while paused, before
+# checking whether the server was closed
+PAUSED_POLL_INTERVAL = 0.1
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class CommandError(Exception):
+    """Invalid command"""
+    pass
+
+
+class DebugServer(object):
+    """Debug and telemetry server of a machine.
+
+    Listens on a Unix socket when path is given, on TCP otherwise (port 0
+    picks a free port, see the address property).  Commands are executed
+    by poll() or, when the server drives the machine, by run().
+    """
+
+    def __init__(self, machine, host=DEFAULT_HOST, port=0, path=None):
+        """Initialization, the server starts listening immediately"""
+
+        self._machine = machine
+
+        self.paused = False
+
+        # (request, future) pairs waiting for the emulation thread
+        self._commands = queue.Queue()
+
+        # counter providers: name -> function returning a dictionary
+        self._counters = {}
+
+        self.add_counters('machine', self._machine_counters)
+
+        self.reset_statistics()
+
+        self._closed = False
+
+        self._loop = asyncio.new_event_loop()
+
+        self._server = self._loop.run_until_complete(
+            self._start_server(host, port, path))
+
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name='DebugServer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def address(self):
+        """Address the server listens on: (host, port) or the socket path"""
+        return self._server.sockets[0].getsockname()
+
+    def add_counters(self, name, function):
+        """Report the dictionary returned by function() under name in the
+        counters command"""
+        self._counters[name] = function
+
+    def remove_counters(self, name):
+        """Stop reporting counters"""
+        del self._counters[name]
+
+    def reset_statistics(self):
+        """Start measuring the speed from now"""
+
+        self._start_time = time.perf_counter()
+        self._start_cycles = self._machine.cpu.cycles
+        self._start_instructions = self._machine.cpu.instructions
+        self._start_frame = self._machine.frame
+
+    def close(self):
+        """Stop the server"""
+
+        if self._closed:
+            return
+
+        self._closed = True
+
+        self._loop.call_soon_threadsafe(self._shutdown)
+
+        self._thread.join()
+
+        self._loop.close()
+
+        # fail the commands no longer executed
+        while True:
+
+            try:
+                request, future = self._commands.get_nowait()
+            except queue.Empty:
+                break
+
+            if future.set_running_or_notify_cancel():
+                future.set_exception(CommandError('Server closed'))
+
+    def poll(self, timeout=None):
+        """Execute the queued commands, call from the emulation thread
+        between slices.
+
+        With a timeout, waits up to timeout seconds for a command when none
+        is queued.  Returns the number of commands executed.
+        """
+
+        executed = 0
+
+        while True:
+
+            try:
+
+                if executed or (timeout is None):
+                    request, future = self._commands.get_nowait()
+                else:
+                    request, future = self._commands.get(timeout=timeout)
+
+            except queue.Empty:
+                return executed
+
+            # the client went away
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                future.set_result(self._execute(request))
+            except Exception as e:
+                future.set_exception(e)
+
+            executed += 1
+
+    def run(self, frames=None):
+        """Run the machine a frame at a time, executing the commands between
+        frames, until the server is closed, the machine is stopped or the
+        given number of frames has run.  Returns the number of frames run.
+        """
+
+        completed = 0
+
+        while (not self._closed) and ((frames is None) or (completed < frames)):
+
+            if self.paused:
+
+                self.poll(PAUSED_POLL_INTERVAL)
+
+                continue
+
+            self.poll()
+
+            if self.paused:
+                continue
+
+            if not self._machine.run_frame():
+                break
+
+            completed += 1
+
+        return completed
+
+    def _execute(self, request):
+        """Execute a command, returns the results"""
+
+        command = request.get('command')
+
+        function = getattr(self, '_command_' + str(command), None)
+
+        if function is None:
+            raise CommandError('Unknown command {0!r}'.format(command))
+
+        return function(request)
+
+    def _command_status(self, request):
+        """Execution state and position"""
+
+        machine = self._machine
+
+        return {'paused'       : self.paused,
+                'frame'        : machine.frame,
+                'cycles'       : machine.cpu.cycles,
+                'instructions' : machine.cpu.instructions}
+
+    def _command_registers(self, request):
+        """Values of the CPU registers"""
+
+        register = self._machine.cpu.register
+
+        return {'registers' : dict((name, register[name].value)
+                                   for name in STATE_REGISTERS)}
+
+    def _command_read(self, request):
+        """Read a block of memory"""
+
+        address = int(request['address'])
+        length = int(request['length'])
+
+        if not (0 <= length <= MAX_READ_LENGTH):
+            raise CommandError('Invalid length {0}'.format(length))
+
+        # inspection must not trigger watches nor bank switches
+        data = self._machine.memsys.peek_block(address, length)
+
+        return {'address' : address,
+                'data'    : binascii.hexlify(bytes(data)).decode('ascii')}
+
+    def _command_write(self, request):
+        """Write a block of memory"""
+
+        address = int(request['address'])
+
+        data = binascii.unhexlify(request['data'])
+
+        self._machine.memsys.write_block(address, data)
+
+        return {'length' : len(data)}
+
+    def _command_counters(self, request):
+        """Values of every counter provider"""
+
+        return {'counters' : dict((name, function())
+                                  for name, function in self._counters.items())}
+
+    def _command_stats(self, request):
+        """Emulation speed since the statistics were reset"""
+
+        machine = self._machine
+
+        elapsed = max(time.perf_counter() - self._start_time, 1e-9)
+
+        return {'elapsed'                 : elapsed,
+                'cycles_per_second'       : (machine.cpu.cycles - self._start_cycles) / elapsed,
+                'instructions_per_second' : (machine.cpu.instructions - self._start_instructions) / elapsed,
+                'frames_per_second'       : (machine.frame - self._start_frame) / elapsed}
+
+    def _command_pause(self, request):
+        """Stop running frames"""
+
+        self.paused = True
+
+        return self._command_status(request)
+
+    def _command_resume(self, request):
+        """Run frames again"""
+
+        self.paused = False
+
+        return self._command_status(request)
+
+    def _command_step(self, request):
+        """Pause and execute instructions"""
+
+        count = int(request.get('count', 1))
+
+        self.paused = True
+
+        for i in range(count):
+            self._machine.step()
+
+        return self._command_registers(request)
+
+    def _machine_counters(self):
+        """Counters of the machine"""
+
+        machine = self._machine
+
+        return {'frame'          : machine.frame,
+                'cycles'         : machine.cpu.cycles,
+                'instructions'   : machine.cpu.instructions,
+                'skipped_cycles' : machine.skipped_cycles}
+
+    def _shutdown(self):
+        """Stop listening, disconnect the clients and stop the event loop,
+        called in the event loop"""
+
+        self._server.close()
+
+        for task in asyncio.all_tasks(self._loop):
+            task.cancel()
+
+        # runs after the cancelled tasks have finished
+        self._loop.call_soon(self._loop.stop)
+
+    async def _start_server(self, host, port, path):
+        """Start listening"""
+
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle_client, path)
+
+        return await asyncio.start_server(self._handle_client, host, port)
+
+    async def _handle_client(self, reader, writer):
+        """Serve the requests of a client"""
+
+        try:
+
+            while True:
+
+                line = await reader.readline()
+
+                if not line:
+                    break
+
+                response = await self._request(line)
+
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+
+                await writer.drain()
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        finally:
+            writer.close()
+
+    async def _request(self, line):
+        """Have a request executed by the emulation thread, returns the
+        response"""
+
+        try:
+            request = json.loads(line.decode('utf-8'))
+        except ValueError:
+            return {'ok' : False, 'error' : 'Invalid request'}
+
+        if not isinstance(request, dict):
+            return {'ok' : False, 'error' : 'Invalid request'}
+
+        future = concurrent.futures.Future()
+
+        self._commands.put((request, future))
+
+        try:
+            response = await asyncio.wrap_future(future)
+        except Exception as e:
+            return {'ok' : False, 'error' : str(e)}
+
+        response['ok'] = True
+
+        return response
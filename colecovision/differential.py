@@ -0,0 +1,407 @@
+"""Differential testing of Z80 engines
+
+The differential runner executes two machines, a reference and a
+candidate whose CPU may be a different Z80 engine, side by side on the
+same ROM images and input.  Every interval instructions it compares the
+registers, the memory pages written since the last comparison and the VDP
+state of the two machines.  When they differ, both machines are restored
+to the last matching comparison and single stepped to find the first
+instruction whose results differ.
+
+Compare the default engine with another one from the command line with:
+
+    python -m colecovision.differential coleco.rom game.rom \\
+        --engine mypackage.fastz80.FastZ80 --instructions 10000000
+"""
+
+import argparse
+import importlib
+import logging
+import random
+import sys
+
+from colecovision import controller
+from colecovision.cpu import disasm
+from colecovision.machine import Machine
+from colecovision.memory import MemoryHookInterface, PAGE_SHIFT, PAGE_SIZE
+from colecovision.memory import ROM_MemoryRegion
+from colecovision.movie import MovieReader
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+DEFAULT_INTERVAL = 10000
+
+# longest Z80 instruction
+_MAX_INSTRUCTION_LENGTH = 4
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class _DirtyPages(MemoryHookInterface):
+    """Records the pages of a memory system that are written.
+
+    Only the writable pages (RAM and devices) mapped at initialization are
+    hooked, the ROM and un-mapped pages keep the page table fast path.
+    """
+
+    def __init__(self, memory_system):
+        """Initialization, hooks the writable pages of the memory system"""
+
+        self._memsys = memory_system
+
+        self.pages = set()
+
+        self._hooked = [page for page in range(memory_system.page_count)
+                        if _writable(memory_system.page_region(page))]
+
+        for page in self._hooked:
+            memory_system.add_page_hook(page, self)
+
+    def close(self):
+        """Remove the hooks"""
+
+        for page in self._hooked:
+            self._memsys.remove_page_hook(page, self)
+
+    def fetch_hook(self, address, value):
+        pass
+
+    def read_hook(self, address, value):
+        pass
+
+    def write_hook(self, address, value):
+        self.pages.add(address >> PAGE_SHIFT)
+
+
+class Divergence(object):
+    """First instruction after which two machines differ"""
+
+    def __init__(self, instructions, pc, data, differences):
+        """Initialization"""
+
+        # instructions executed before the diverging one
+        self.instructions = instructions
+
+        # address and bytes of the diverging instruction
+        self.pc = pc
+        self.data = bytes(data)
+
+        # descriptions of the differences found after the instruction
+        self.differences = differences
+
+    def __str__(self):
+        """User friendly string representation of the object"""
+
+        decoded = disasm.decode(bytearray(self.data), 0, self.pc)
+
+        text = decoded[1] if decoded else 'DB ' + ','.join(
+            '{0:02X}H'.format(b) for b in bytearray(self.data[:1]))
+
+        return 'Divergence after {0} instructions at 0x{1:04X} {2}: {3}'.format(
+            self.instructions, self.pc, text, ', '.join(self.differences))
+
+
+class DifferentialRunner(object):
+    """Runs two machines side by side and compares them.
+
+    inputs, when given, is called with a frame number and returns the
+    controller states for that frame (see random_inputs() and
+    movie_inputs()); both machines get the same input.
+    """
+
+    def __init__(self, reference, candidate, interval=DEFAULT_INTERVAL,
+                 inputs=None):
+        """Initialization"""
+
+        self.reference = reference
+        self.candidate = candidate
+
+        self.interval = interval
+
+        self._inputs = inputs
+
+        if inputs is not None:
+            for machine in (reference, candidate):
+                self._apply_inputs(machine)
+                machine.add_frame_listener(self._apply_inputs)
+
+        self._dirty = (_DirtyPages(reference.memsys), _DirtyPages(candidate.memsys))
+
+        # instructions compared so far
+        self.instructions = 0
+
+    def close(self):
+        """Detach from the machines"""
+
+        for dirty in self._dirty:
+            dirty.close()
+
+        if self._inputs is not None:
+            for machine in (self.reference, self.candidate):
+                machine.remove_frame_listener(self._apply_inputs)
+
+    def run(self, instructions):
+        """Run both machines for the given number of instructions.
+
+        Returns the Divergence found, None if the machines did not diverge.
+        """
+
+        end = self.instructions + instructions
+
+        while self.instructions < end:
+
+            states = (self.reference.save_state(), self.candidate.save_state())
+
+            count = min(self.interval, end - self.instructions)
+
+            errors = (_run(self.reference, count), _run(self.candidate, count))
+
+            if self._compare(errors):
+                return self._locate(states, count)
+
+            if errors[0] is not None:
+
+                # both machines stopped the same way
+                _logger.warning("Both machines stopped: %s", errors[0])
+
+                return None
+
+            self.instructions += count
+
+        return None
+
+    def _compare(self, errors):
+        """Differences between the machines, clears the dirty pages"""
+
+        differences = []
+
+        if errors[0] != errors[1]:
+            differences.append('error {0!r} != {1!r}'.format(*errors))
+
+        reference_cpu = _flatten(self.reference.cpu.save_state())
+        candidate_cpu = _flatten(self.candidate.cpu.save_state())
+
+        for name in sorted(reference_cpu):
+            if reference_cpu[name] != candidate_cpu.get(name):
+                differences.append('{0} 0x{1:X} != 0x{2:X}'.format(
+                    name, reference_cpu[name], candidate_cpu.get(name, 0)))
+
+        pages = self._dirty[0].pages | self._dirty[1].pages
+
+        for page in sorted(pages):
+
+            address = page << PAGE_SHIFT
+
+            # peeked, reads could switch banks (MegaCart) of one machine
+            if (self.reference.memsys.peek_block(address, PAGE_SIZE) !=
+                self.candidate.memsys.peek_block(address, PAGE_SIZE)):
+                differences.append('memory page 0x{0:04X}'.format(address))
+
+        for dirty in self._dirty:
+            dirty.pages.clear()
+
+        if self.reference.vdp.save_state() != self.candidate.vdp.save_state():
+            differences.append('VDP')
+
+        return differences
+
+    def _locate(self, states, count):
+        """Single step from the states of the last matching comparison to
+        the first diverging instruction"""
+
+        self.reference.load_state(states[0])
+        self.candidate.load_state(states[1])
+
+        for dirty in self._dirty:
+            dirty.pages.clear()
+
+        differences = []
+
+        for i in range(count):
+
+            pc = self.reference.cpu.register["PC"].value
+
+            try:
+                data = self.reference.memsys.peek_block(pc, _MAX_INSTRUCTION_LENGTH)
+            except RuntimeError:
+                data = b''
+
+            errors = (_run(self.reference, 1), _run(self.candidate, 1))
+
+            differences = self._compare(errors)
+
+            if differences:
+                return Divergence(self.instructions + i, pc, data, differences)
+
+        # not reproduced when single stepping
+        return Divergence(self.instructions + count, pc, data,
+                          differences or ['not reproducible by single stepping'])
+
+    def _apply_inputs(self, machine):
+        """Set the controllers to the input of the next frame"""
+
+        states = self._inputs(machine.frame)
+
+        for port, state in zip(machine.controllers, states):
+            port.state = state
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def _writable(region):
+    """Flag used to indicate that a memory region (None when un-mapped) can
+    be written"""
+    return (region is not None) and not isinstance(region, ROM_MemoryRegion)
+
+
+def _flatten(state, prefix=''):
+    """Flatten the nested dictionaries of a state, the keys of nested
+    values are joined with a '.'"""
+
+    values = {}
+
+    for name, value in state.items():
+
+        if isinstance(value, dict):
+            values.update(_flatten(value, prefix + name + '.'))
+        else:
+            values[prefix + name] = value
+
+    return values
+
+
+def _run(machine, count):
+    """Execute count instructions, returns the error that stopped the
+    machine or None"""
+
+    try:
+        for i in range(count):
+            machine.step()
+    except Exception as e:
+        return '{0}: {1}'.format(type(e).__name__, e)
+
+    return None
+
+
+def random_inputs(seed, controllers=2):
+    """Input function of random (but repeatable) controller states"""
+
+    directions = (0, controller.UP, controller.RIGHT, controller.DOWN,
+                  controller.LEFT, controller.UP | controller.RIGHT,
+                  controller.DOWN | controller.LEFT)
+
+    keys = [None] + sorted(controller.KEYPAD)
+
+    def inputs(frame):
+
+        generator = random.Random((seed << 32) | frame)
+
+        states = []
+
+        for i in range(controllers):
+
+            pad = controller.Controller()
+
+            pad.press(generator.choice(directions))
+
+            if generator.random() < 0.3:
+                pad.press(controller.FIRE_LEFT)
+            if generator.random() < 0.3:
+                pad.press(controller.FIRE_RIGHT)
+
+            key = generator.choice(keys)
+
+            if key is not None:
+                pad.press_key(key)
+
+            states.append(pad.state)
+
+        return tuple(states)
+
+    return inputs
+
+
+def movie_inputs(file_name):
+    """Input function replaying a movie, the controllers are released
+    after its last frame"""
+
+    frames = list(MovieReader(file_name))
+
+    released = (controller.RELEASED, controller.RELEASED)
+
+    def inputs(frame):
+        return frames[frame] if frame < len(frames) else released
+
+    return inputs
+
+
+def _load_engine(name):
+    """Z80 engine class from its dotted name"""
+
+    module_name, class_name = name.rsplit('.', 1)
+
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def main(args=None):
+    """Compare two Z80 engines, the exit status is 1 if they diverge"""
+
+    parser = argparse.ArgumentParser(description='Compare two Z80 engines')
+
+    parser.add_argument('bios', help='BIOS ROM image')
+    parser.add_argument('cartridge', nargs='?', help='cartridge ROM image')
+    parser.add_argument('--engine', default='colecovision.cpu.z80.Z80',
+                        help='dotted name of the candidate Z80 class')
+    parser.add_argument('--reference', default='colecovision.cpu.z80.Z80',
+                        help='dotted name of the reference Z80 class')
+    parser.add_argument('--instructions', type=int, default=1000000)
+    parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL)
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random input')
+    parser.add_argument('--movie', help='input movie, instead of random input')
+
+    args = parser.parse_args(args)
+
+    machines = []
+
+    for engine in (args.reference, args.engine):
+
+        machine = Machine(args.bios, args.cartridge)
+
+        machine.cpu = _load_engine(engine)(machine.memsys, machine.io)
+
+        machines.append(machine)
+
+    if args.movie:
+        inputs = movie_inputs(args.movie)
+    else:
+        inputs = random_inputs(args.seed)
+
+    runner = DifferentialRunner(machines[0], machines[1], args.interval, inputs)
+
+    divergence = runner.run(args.instructions)
+
+    if divergence is None:
+
+        print('No divergence in {0} instructions'.format(runner.instructions))
+
+        return 0
+
+    print(divergence)
+
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
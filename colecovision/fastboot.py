@@ -0,0 +1,125 @@
+"""Fast boot: skip the BIOS title screen using a cached post-boot state
+
+The first boot of a (BIOS, cartridge) pair runs the BIOS until the game
+starts and saves the machine state in a cache directory, keyed by the
+SHA-1 of both ROM images.  Later boots of the same pair restore the cached
+state into the machine instead of running the BIOS again.
+"""
+
+import hashlib
+import logging
+import os
+
+from colecovision import state
+from colecovision.debugger import Debugger
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+# Longest time (in frames) the BIOS is run for, the title screen is shown
+# for about ten seconds
+MAX_BOOT_FRAMES = 30 * 60
+
+STATE_SUFFIX = '.state'
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def cache_key(machine):
+    """Cache key of the post-boot state of a machine"""
+
+    key = hashlib.sha1()
+
+    key.update(machine.bios.sha1.encode('ascii'))
+
+    if machine.cartridge is not None:
+        key.update(machine.cartridge.image.sha1.encode('ascii'))
+
+    key.update(str(state.STATE_VERSION).encode('ascii'))
+
+    return key.hexdigest()
+
+
+def run_bios(machine, max_frames=MAX_BOOT_FRAMES):
+    """Run the BIOS from reset until the game starts.
+
+    The game is considered started when the CPU fetches the first
+    instruction at the cartridge entry point, the machine is stopped before
+    it executes; without a cartridge header the BIOS is run for max_frames
+    frames.  Returns True if the game started.
+    """
+
+    machine.reset()
+
+    entry_point = None
+
+    if machine.cartridge is not None:
+        entry_point = machine.cartridge.image.entry_point
+
+    if entry_point is None:
+
+        machine.run_frames(max_frames)
+
+        return False
+
+    started = []
+
+    def game_started(access, address, value):
+        started.append(address)
+        machine.cpu.abort()
+        machine.stop()
+
+    debugger = Debugger(machine.memsys)
+
+    debugger.set_breakpoint(entry_point, game_started)
+
+    try:
+        machine.run_frames(max_frames)
+    finally:
+        debugger.clear_all()
+
+    return bool(started)
+
+
+def boot(machine, cache_dir, max_frames=MAX_BOOT_FRAMES):
+    """Boot a machine, restoring its post-boot state from the cache.
+
+    Returns True if the state was restored from the cache, False if the
+    BIOS was run (and its result cached if the game started).
+    """
+
+    file_name = os.path.join(cache_dir, cache_key(machine) + STATE_SUFFIX)
+
+    if os.path.exists(file_name):
+
+        try:
+
+            machine.load_state(state.load(file_name))
+
+            return True
+
+        except state.StateError as ex:
+
+            _logger.warning("Ignoring cached boot state %s: %s", file_name, ex)
+
+    if not run_bios(machine, max_frames):
+
+        _logger.warning("Game did not start within %d frames", max_frames)
+
+        return False
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    state.save(machine.save_state(), file_name)
+
+    return False
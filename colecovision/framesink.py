@@ -0,0 +1,331 @@
+"""Frame output for the Colecovision
+
+Frame sinks receive the frames rendered by the VDP (see VDP.add_sink()) and
+write them out as PNG snapshots or as a raw or YUV4MPEG2 video stream.
+Encoding and disk I/O happen in the emulation thread unless the sink is
+wrapped in an AsyncFrameSink, which hands the frames to a background
+thread through a bounded queue and drops frames rather than ever blocking
+the emulation.
+"""
+
+import abc
+import logging
+import os
+import queue
+import struct
+import threading
+import zlib
+
+from colecovision.machine import CPU_CLOCK_HZ, CYCLES_PER_FRAME
+from colecovision.video import PALETTE, SCREEN_WIDTH, SCREEN_HEIGHT
+from colecovision.video import submit_frame
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+DEFAULT_QUEUE_SIZE = 8
+
+# translation tables from colour indices to each RGB component
+_RED   = bytes(c[0] for c in PALETTE) + bytes(256 - len(PALETTE))
+_GREEN = bytes(c[1] for c in PALETTE) + bytes(256 - len(PALETTE))
+_BLUE  = bytes(c[2] for c in PALETTE) + bytes(256 - len(PALETTE))
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class DropPolicy(object):
+    """Frame dropped when the queue of an asynchronous sink is full"""
+
+    NEWEST = 0  # the frame submitted
+    OLDEST = 1  # the oldest frame in the queue
+
+
+class FrameSinkInterface(object):
+    """Receiver of the rendered frames"""
+
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def submit(self, framebuffer):
+        """Receive a frame, SCREEN_HEIGHT rows of SCREEN_WIDTH colour
+        indices"""
+        pass
+
+    def capture(self):
+        """Called at the vertical blank of each frame, before the frame is
+        rendered.  A frame may be received after the emulation has moved
+        on (see colecovision.renderprocess), so a sink recording the state
+        of the machine with the frame reads it here and returns it: unless
+        None, it is received as submit(framebuffer, captured)."""
+        return None
+
+    def close(self):
+        """Finish writing the frames"""
+        pass
+
+
+class PNGSink(FrameSinkInterface):
+    """Writes every frame to a numbered PNG file"""
+
+    def __init__(self, directory, prefix='frame'):
+        """Initialization"""
+
+        self.directory = directory
+        self.prefix = prefix
+
+        self.frames = 0
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'PNGSink({0!r}, {1!r})'.format(self.directory, self.prefix)
+
+    def file_name(self, frame):
+        """Name of the file of a frame"""
+        return os.path.join(self.directory,
+                            '{0}_{1:06d}.png'.format(self.prefix, frame))
+
+    def submit(self, framebuffer):
+        """Write a frame"""
+
+        with open(self.file_name(self.frames), 'wb') as f:
+            f.write(encode_png(framebuffer))
+
+        self.frames += 1
+
+
+class RawVideoSink(FrameSinkInterface):
+    """Writes the frames to a file as raw 24-bit RGB"""
+
+    def __init__(self, file_name):
+        """Initialization"""
+
+        self._file = open(file_name, 'wb')
+
+        self.frames = 0
+
+    def submit(self, framebuffer):
+        """Write a frame"""
+
+        self._file.write(to_rgb(framebuffer))
+
+        self.frames += 1
+
+    def close(self):
+        """Close the file"""
+        self._file.close()
+
+
+class Y4MSink(FrameSinkInterface):
+    """Writes the frames to a YUV4MPEG2 (4:2:0) video file"""
+
+    def __init__(self, file_name):
+        """Initialization"""
+
+        self._file = open(file_name, 'wb')
+
+        header = 'YUV4MPEG2 W{0} H{1} F{2}:{3} Ip A1:1 C420jpeg\n'.format(
+            SCREEN_WIDTH, SCREEN_HEIGHT, CPU_CLOCK_HZ, CYCLES_PER_FRAME)
+
+        self._file.write(header.encode('ascii'))
+
+        self.frames = 0
+
+    def submit(self, framebuffer):
+        """Write a frame"""
+
+        self._file.write(b'FRAME\n')
+        self._file.write(to_yuv420(framebuffer))
+
+        self.frames += 1
+
+    def close(self):
+        """Close the file"""
+        self._file.close()
+
+
+class AsyncFrameSink(FrameSinkInterface):
+    """Hands the frames to another sink in a background thread.
+
+    submit() never waits: when the queue is full a frame is dropped as
+    selected by the drop policy.
+    """
+
+    def __init__(self, sink, queue_size=DEFAULT_QUEUE_SIZE,
+                 policy=DropPolicy.NEWEST):
+        """Initialization"""
+
+        self.sink = sink
+        self.policy = policy
+
+        self._queue = queue.Queue(queue_size)
+
+        # frames submitted, written by the sink and dropped
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='AsyncFrameSink')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'AsyncFrameSink({0!r}, {1}, {2})'.format(
+            self.sink, self._queue.maxsize, self.policy)
+
+    def submit(self, framebuffer, captured=None):
+        """Queue a frame"""
+
+        self.submitted += 1
+
+        frame = (framebuffer, captured)
+
+        try:
+            self._queue.put_nowait(frame)
+            return
+        except queue.Full:
+            pass
+
+        self.dropped += 1
+
+        if self.policy == DropPolicy.OLDEST:
+
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            try:
+                self._queue.put_nowait(frame)
+            except queue.Full:
+                pass
+
+    def capture(self):
+        """State the sink records with the frame"""
+        return self.sink.capture()
+
+    def close(self):
+        """Write the queued frames and close the sink"""
+
+        if self._thread is not None:
+
+            self._queue.put(None)
+
+            self._thread.join()
+
+            self._thread = None
+
+            self.sink.close()
+
+    def _run(self):
+        """Write the queued frames until None is queued"""
+
+        while True:
+
+            frame = self._queue.get()
+
+            if frame is None:
+                return
+
+            try:
+                submit_frame(frame[0], ((self.sink, frame[1]),))
+                self.written += 1
+            except Exception:
+                _logger.exception("Frame sink %r failed", self.sink)
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def _png_chunk(chunk_type, data):
+    """PNG chunk: length, type, data and CRC"""
+
+    return (struct.pack('>I', len(data)) + chunk_type + data +
+            struct.pack('>I', zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+
+def encode_png(framebuffer, level=6):
+    """Encode a frame as an 8-bit indexed colour PNG image"""
+
+    palette = b''.join(struct.pack('BBB', *c) for c in PALETTE)
+
+    # each row starts with filter type 0 (none)
+    rows = bytearray()
+
+    for y in range(SCREEN_HEIGHT):
+        rows.append(0)
+        rows += framebuffer[y * SCREEN_WIDTH:(y + 1) * SCREEN_WIDTH]
+
+    header = struct.pack('>IIBBBBB', SCREEN_WIDTH, SCREEN_HEIGHT, 8, 3, 0, 0, 0)
+
+    return (PNG_SIGNATURE +
+            _png_chunk(b'IHDR', header) +
+            _png_chunk(b'PLTE', palette) +
+            _png_chunk(b'IDAT', zlib.compress(bytes(rows), level)) +
+            _png_chunk(b'IEND', b''))
+
+
+def to_rgb(framebuffer):
+    """Convert a frame to 24-bit RGB"""
+
+    framebuffer = bytes(framebuffer)
+
+    rgb = bytearray(len(framebuffer) * 3)
+
+    rgb[0::3] = framebuffer.translate(_RED)
+    rgb[1::3] = framebuffer.translate(_GREEN)
+    rgb[2::3] = framebuffer.translate(_BLUE)
+
+    return rgb
+
+
+def _yuv_tables():
+    """Translation tables from colour indices to Y, U and V (BT.601, full
+    range)"""
+
+    y_table = bytearray(256)
+    u_table = bytearray(256)
+    v_table = bytearray(256)
+
+    for i, (r, g, b) in enumerate(PALETTE):
+
+        y_table[i] = int(round((0.299 * r) + (0.587 * g) + (0.114 * b)))
+        u_table[i] = min(255, max(0, int(round(128 - (0.168736 * r) -
+                                               (0.331264 * g) + (0.5 * b)))))
+        v_table[i] = min(255, max(0, int(round(128 + (0.5 * r) -
+                                               (0.418688 * g) - (0.081312 * b)))))
+
+    return bytes(y_table), bytes(u_table), bytes(v_table)
+
+
+_Y, _U, _V = _yuv_tables()
+
+
+def to_yuv420(framebuffer):
+    """Convert a frame to planar YUV 4:2:0, the chroma of each 2x2 block is
+    that of its top left pixel"""
+
+    framebuffer = bytes(framebuffer)
+
+    # top left pixel of each 2x2 block
+    corners = bytearray()
+
+    for y in range(0, SCREEN_HEIGHT, 2):
+        corners += framebuffer[y * SCREEN_WIDTH:(y + 1) * SCREEN_WIDTH:2]
+
+    corners = bytes(corners)
+
+    return framebuffer.translate(_Y) + corners.translate(_U) + corners.translate(_V)
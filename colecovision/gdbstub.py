@@ -0,0 +1,504 @@
+"""GDB remote serial protocol stub for the Colecovision
+
+The stub lets gdb (built for the z80 target) debug a machine over a local
+TCP socket:
+
+    (gdb) target remote localhost:<port>
+
+Registers are transferred in the order of the gdb z80 target: AF, BC, DE,
+HL, SP, PC, IX, IY, AF', BC', DE', HL' and IR, each 16-bit little endian.
+Memory packets use the block transfers of the memory system.  Breakpoints
+and watchpoints are set with the debugger (colecovision.debugger), which
+only instruments the pages holding them, so a running target is not
+slowed down by checks on every instruction.
+
+The stub runs in the emulation thread: while the target runs, the socket
+is checked for an interrupt (Ctrl-C) between frames.
+"""
+
+import binascii
+import logging
+import select
+import socket
+
+from colecovision.cpu.instruction import UnknownInstructionError
+from colecovision.debugger import Debugger
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+DEFAULT_HOST = '127.0.0.1'
+
+# register pairs in gdb order: (high register, low register)
+GDB_REGISTERS = (("A", "F"), ("B", "C"), ("D", "E"), ("H", "L"),
+                 "SP", "PC", "IX", "IY",
+                 ("A'", "F'"), ("B'", "C'"), ("D'", "E'"), ("H'", "L'"),
+                 ("I", "R"))
+
+PACKET_SIZE = 0x1000
+
+# signals reported in stop replies
+SIGINT  = 2
+SIGILL  = 4
+SIGTRAP = 5
+
+# breakpoint and watchpoint types of the Z/z packets
+_BREAKPOINT_TYPES = ('0', '1')
+_WATCHPOINT_TYPES = {'2' : (False, True),  # write
+                     '3' : (True, False),  # read
+                     '4' : (True, True)}   # access
+
+# stop reply reasons of the watchpoint types
+_WATCHPOINT_REASONS = {'2' : 'watch',
+                       '3' : 'rwatch',
+                       '4' : 'awatch'}
+
+_INTERRUPT = b'\x03'
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class GDBStub(object):
+    """GDB remote serial protocol stub of a machine"""
+
+    def __init__(self, machine, host=DEFAULT_HOST, port=0):
+        """Initialization, the stub starts listening immediately"""
+
+        self._machine = machine
+
+        self._debugger = Debugger(machine.memsys)
+
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((host, port))
+        self._listener.listen(1)
+
+        self._connection = None
+        self._input = b''
+
+        self._acknowledge = True
+
+        # reason for the last stop, as a stop reply
+        self._stop_reply = 'S{0:02X}'.format(SIGTRAP)
+
+        # a breakpoint on this address is ignored by the next fetch, so the
+        # target can resume from a breakpoint
+        self._resume_address = None
+
+        # watchpoint type by watched address
+        self._watch_types = {}
+
+    @property
+    def address(self):
+        """(host, port) the stub listens on"""
+        return self._listener.getsockname()
+
+    def close(self):
+        """Stop listening and remove the breakpoints"""
+
+        self._debugger.clear_all()
+        self._watch_types.clear()
+
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+        self._listener.close()
+
+    def serve(self):
+        """Accept a connection from gdb and serve it until gdb detaches,
+        kills the target or disconnects"""
+
+        self._connection, address = self._listener.accept()
+
+        _logger.info("GDB connected from %s", address)
+
+        self._input = b''
+        self._acknowledge = True
+
+        try:
+
+            while True:
+
+                packet = self._receive()
+
+                if packet is None:
+                    break
+
+                try:
+                    response = self._execute(packet)
+                except ValueError:
+                    # malformed arguments
+                    response = 'E01'
+
+                if response is not None:
+                    self._send(response)
+
+                if packet == 'QStartNoAckMode':
+                    self._acknowledge = False
+
+                # detach or kill
+                if packet[:1] in ('D', 'k'):
+                    break
+
+        except ConnectionError:
+
+            _logger.info("GDB disconnected")
+
+        finally:
+
+            self._debugger.clear_all()
+            self._watch_types.clear()
+
+            self._connection.close()
+            self._connection = None
+
+    def _execute(self, packet):
+        """Execute a packet, returns the response or None when there is
+        none"""
+
+        command, arguments = packet[:1], packet[1:]
+
+        if command == '?':
+            return self._stop_reply
+
+        if command == 'g':
+            return self._read_registers()
+
+        if command == 'G':
+            return self._write_registers(arguments)
+
+        if command == 'p':
+            return self._read_register(int(arguments, 16))
+
+        if command == 'P':
+            number, value = arguments.split('=')
+            return self._write_register(int(number, 16), value)
+
+        if command == 'm':
+            address, length = arguments.split(',')
+            return self._read_memory(int(address, 16), int(length, 16))
+
+        if command == 'M':
+            location, data = arguments.split(':')
+            address, length = location.split(',')
+            return self._write_memory(int(address, 16), data)
+
+        if command in ('Z', 'z'):
+            kind, address, size = arguments.split(',')
+            return self._watch(command == 'Z', kind, int(address, 16), int(size, 16))
+
+        if command == 'c':
+            self._set_pc(arguments)
+            return self._continue()
+
+        if command == 's':
+            self._set_pc(arguments)
+            return self._step()
+
+        if command == 'D':
+            return 'OK'
+
+        if command == 'k':
+            return None
+
+        if command == 'H':
+            return 'OK'
+
+        if packet.startswith('qSupported'):
+            return 'PacketSize={0:X};QStartNoAckMode+'.format(PACKET_SIZE)
+
+        if packet == 'QStartNoAckMode':
+            return 'OK'
+
+        if packet == 'qAttached':
+            return '1'
+
+        # not supported
+        return ''
+
+    def _read_registers(self):
+        """Values of all of the registers"""
+        return ''.join(self._read_register(i) for i in range(len(GDB_REGISTERS)))
+
+    def _write_registers(self, data):
+        """Set all of the registers"""
+
+        for i in range(min(len(GDB_REGISTERS), len(data) // 4)):
+            self._write_register(i, data[i * 4:(i + 1) * 4])
+
+        return 'OK'
+
+    def _read_register(self, number):
+        """Value of a register, 16-bit little endian hex"""
+
+        if number >= len(GDB_REGISTERS):
+            return 'E01'
+
+        register = self._machine.cpu.register
+
+        name = GDB_REGISTERS[number]
+
+        if isinstance(name, tuple):
+            value = (register[name[0]].value << 8) | register[name[1]].value
+        else:
+            value = register[name].value
+
+        return '{0:02x}{1:02x}'.format(value & 0xFF, value >> 8)
+
+    def _write_register(self, number, data):
+        """Set a register from 16-bit little endian hex"""
+
+        if number >= len(GDB_REGISTERS):
+            return 'E01'
+
+        low, high = bytearray(binascii.unhexlify(data[:4]))
+
+        register = self._machine.cpu.register
+
+        name = GDB_REGISTERS[number]
+
+        if isinstance(name, tuple):
+            register[name[0]].value = high
+            register[name[1]].value = low
+        else:
+            register[name].value = (high << 8) | low
+
+        return 'OK'
+
+    def _read_memory(self, address, length):
+        """Read a block of memory"""
+
+        try:
+            data = self._debugger.read_block(address, length)
+        except RuntimeError:
+            return 'E01'
+
+        return binascii.hexlify(bytes(data)).decode('ascii')
+
+    def _write_memory(self, address, data):
+        """Write a block of memory"""
+
+        try:
+            self._machine.memsys.write_block(address, binascii.unhexlify(data))
+        except RuntimeError:
+            return 'E01'
+
+        return 'OK'
+
+    def _watch(self, insert, kind, address, size):
+        """Insert or remove a breakpoint or watchpoint"""
+
+        if kind in _BREAKPOINT_TYPES:
+
+            if insert:
+                self._debugger.set_breakpoint(address, self._breakpoint_hit)
+            else:
+                self._debugger.clear_breakpoint(address)
+
+            return 'OK'
+
+        if kind in _WATCHPOINT_TYPES:
+
+            read, write = _WATCHPOINT_TYPES[kind]
+
+            for watched in range(address, address + max(size, 1)):
+
+                if insert:
+                    self._debugger.set_watchpoint(watched, self._watchpoint_hit,
+                                                  read, write)
+                    self._watch_types[watched] = kind
+                else:
+                    self._debugger.clear_watchpoint(watched)
+                    self._watch_types.pop(watched, None)
+
+            return 'OK'
+
+        return ''
+
+    def _breakpoint_hit(self, access, address, value):
+        """Stop before the instruction at a breakpoint executes"""
+
+        if address == self._resume_address:
+
+            self._resume_address = None
+
+            return
+
+        self._machine.cpu.abort()
+        self._machine.stop()
+
+        self._stop_reply = 'S{0:02X}'.format(SIGTRAP)
+
+    def _watchpoint_hit(self, access, address, value):
+        """Stop after the instruction accessing a watched address"""
+
+        kind = _WATCHPOINT_REASONS[self._watch_types.get(address, '4')]
+
+        self._machine.stop()
+
+        self._stop_reply = 'T{0:02X}{1}:{2:04x};'.format(SIGTRAP, kind, address)
+
+    def _set_pc(self, arguments):
+        """Set PC from the address argument of c and s packets, if any"""
+
+        if arguments:
+            self._machine.cpu.register["PC"].value = int(arguments, 16)
+
+    def _resume(self):
+        """Ignore a breakpoint at the current PC, so execution can resume
+        from it"""
+
+        pc = self._machine.cpu.register["PC"].value
+
+        if pc in self._debugger.breakpoints:
+            self._resume_address = pc
+        else:
+            self._resume_address = None
+
+    def _continue(self):
+        """Run until a breakpoint or watchpoint is hit or gdb interrupts,
+        returns the stop reply"""
+
+        self._resume()
+
+        self._stop_reply = None
+
+        try:
+
+            while self._stop_reply is None:
+
+                if not self._machine.run_frame():
+
+                    # stopped by something other than the stub
+                    if self._stop_reply is None:
+                        self._stop_reply = 'S{0:02X}'.format(SIGTRAP)
+
+                    break
+
+                if self._interrupted():
+                    self._stop_reply = 'S{0:02X}'.format(SIGINT)
+
+        except UnknownInstructionError as e:
+
+            _logger.warning("%s", e)
+
+            self._stop_reply = 'S{0:02X}'.format(SIGILL)
+
+        return self._stop_reply
+
+    def _step(self):
+        """Execute a single instruction, returns the stop reply"""
+
+        self._resume()
+
+        self._stop_reply = 'S{0:02X}'.format(SIGTRAP)
+
+        try:
+            self._machine.step()
+        except UnknownInstructionError as e:
+            _logger.warning("%s", e)
+            self._stop_reply = 'S{0:02X}'.format(SIGILL)
+
+        self._resume_address = None
+
+        return self._stop_reply
+
+    def _interrupted(self):
+        """Check, without waiting, whether gdb sent an interrupt"""
+
+        readable, writable, errors = select.select([self._connection], [], [], 0)
+
+        if readable:
+
+            data = self._connection.recv(PACKET_SIZE)
+
+            # disconnected
+            if not data:
+                return True
+
+            self._input += data
+
+        if _INTERRUPT in self._input:
+
+            self._input = self._input.replace(_INTERRUPT, b'')
+
+            return True
+
+        return False
+
+    def _receive(self):
+        """Receive a packet, returns its data or None when gdb
+        disconnected"""
+
+        while True:
+
+            start = self._input.find(b'$')
+
+            if start >= 0:
+
+                end = self._input.find(b'#', start)
+
+                if (end >= 0) and (len(self._input) >= end + 3):
+
+                    data = self._input[start + 1:end]
+                    checksum = self._input[end + 1:end + 3]
+
+                    self._input = self._input[end + 3:]
+
+                    if not _valid_packet(data, checksum):
+
+                        if self._acknowledge:
+                            self._connection.sendall(b'-')
+
+                        continue
+
+                    if self._acknowledge:
+                        self._connection.sendall(b'+')
+
+                    return data.decode('ascii')
+
+            elif _INTERRUPT in self._input:
+
+                # interrupt while stopped
+                self._input = self._input.replace(_INTERRUPT, b'')
+
+            data = self._connection.recv(PACKET_SIZE)
+
+            if not data:
+                return None
+
+            self._input += data
+
+    def _send(self, data):
+        """Send a packet"""
+
+        data = data.encode('ascii')
+
+        checksum = sum(bytearray(data)) & 0xFF
+
+        self._connection.sendall(b'$' + data + '#{0:02x}'.format(checksum).encode('ascii'))
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def _valid_packet(data, checksum):
+    """Flag used to indicate that packet data is ASCII and matches its two
+    hex digit checksum"""
+
+    try:
+        data.decode('ascii')
+        return int(checksum, 16) == (sum(bytearray(data)) & 0xFF)
+    except ValueError:
+        return False
@@ -0,0 +1,25 @@
+"""Colecovision cartridge header
+
+The layout of the header at the start of a cartridge, shared by the ROM
+store, the cartridge mappers and the disassembler.  This module has no
+dependencies, so the CPU layer can use it without the memory system.
+"""
+
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+# Cartridge header: the first two bytes are 0xAA 0x55 (show the title
+# screen) or 0x55 0xAA (skip it) and the word at offset 0x0A is the address
+# at which the game starts
+CARTRIDGE_ADDRESS         = 0x8000
+CARTRIDGE_SLOT_SIZE       = 0x8000
+CARTRIDGE_MAGIC           = (0xAA55, 0x55AA)
+CARTRIDGE_MAGIC_TITLE     = 0xAA55
+CARTRIDGE_MAGIC_SKIP      = 0x55AA
+CARTRIDGE_START_GAME      = 0x800A
+
+# Cartridge header jump table (RST 08h - 38h and NMI)
+CARTRIDGE_JUMP_TABLE      = (0x800C, 0x800F, 0x8012, 0x8015,
+                             0x8018, 0x801B, 0x801E, 0x8021)
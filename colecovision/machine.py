@@ -0,0 +1,369 @@
+"""Colecovision machine: CPU, memory map, video and I/O"""
+
+import logging
+
+from colecovision import cartridge
+from colecovision import romstore
+from colecovision.controller import Controller, ControllerMode
+from colecovision.cpu.z80 import Z80
+from colecovision.memory import MemorySystem, RAM_MemoryRegion
+from colecovision.video import VDP
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+# NTSC timing
+CPU_CLOCK_HZ        = 3579545
+CYCLES_PER_SCANLINE = 228
+SCANLINES_PER_FRAME = 262
+CYCLES_PER_FRAME    = CYCLES_PER_SCANLINE * SCANLINES_PER_FRAME
+FRAME_RATE          = float(CPU_CLOCK_HZ) / CYCLES_PER_FRAME
+
+# Memory map
+BIOS_ADDRESS     = 0x0000
+BIOS_SIZE        = 0x2000
+RAM_ADDRESS      = 0x6000
+RAM_SIZE         = 0x0400
+RAM_WINDOW_SIZE  = 0x2000   # the RAM is mirrored across the window
+
+# I/O port groups (the upper three bits of the port number)
+PORT_GROUP_MASK     = 0xE0
+PORT_KEYPAD_MODE    = 0x80
+PORT_VDP            = 0xA0
+PORT_JOYSTICK_MODE  = 0xC0
+PORT_CONTROLLER     = 0xE0  # reads: controllers, writes: sound generator
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class IOSystem(object):
+    """Decodes the Z80 I/O ports onto the Colecovision devices"""
+
+    def __init__(self, vdp, controllers):
+        """Initialization"""
+
+        self._vdp = vdp
+
+        self._controllers = controllers
+
+        # half of the controllers selected by the last mode port write
+        self.controller_mode = ControllerMode.KEYPAD
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'IOSystem({0!r}, {1!r})'.format(self._vdp, self._controllers)
+
+    def read(self, port):
+        """Read a value from an I/O port"""
+
+        group = port & PORT_GROUP_MASK
+
+        if group == PORT_VDP:
+
+            if port & 0x01:
+                return self._vdp.read_status()
+
+            return self._vdp.read_data()
+
+        if group == PORT_CONTROLLER:
+
+            # 0xFC reads the first controller, 0xFF the second
+            controller = self._controllers[(port >> 1) & 0x01]
+
+            return controller.read(self.controller_mode)
+
+        # nothing drives the data bus
+        return 0xFF
+
+    def idempotent_read(self, port):
+        """Flag used to indicate that reading a port again, with nothing
+        else happening in between, returns the same value and leaves the
+        devices unchanged.  Data port reads advance the VDP address.
+
+        A VDP status read is not idempotent the first time: it clears the
+        frame flag and the control port latch.  Reading it again leaves
+        them cleared, which is what the idle loop detection relies on: it
+        only skips a loop after two consecutive iterations ended with the
+        same registers, the first one having done the clearing.
+        """
+        return not (((port & PORT_GROUP_MASK) == PORT_VDP) and not (port & 0x01))
+
+    def write(self, port, value):
+        """Write a value to an I/O port"""
+
+        group = port & PORT_GROUP_MASK
+
+        if group == PORT_VDP:
+
+            if port & 0x01:
+                self._vdp.write_control(value)
+            else:
+                self._vdp.write_data(value)
+
+        elif group == PORT_KEYPAD_MODE:
+
+            self.controller_mode = ControllerMode.KEYPAD
+
+        elif group == PORT_JOYSTICK_MODE:
+
+            self.controller_mode = ControllerMode.JOYSTICK
+
+
+class Machine(object):
+    """Colecovision machine.
+
+    The BIOS and cartridge ROM images are loaded through the ROM store, so
+    machines that use the same images share a single copy of them.
+    """
+
+    def __init__(self, bios_file, cartridge_file=None, store=None):
+        """Initialization"""
+
+        if store is None:
+            store = romstore.default_store()
+
+        memsys = MemorySystem()
+
+        # BIOS ROM, mirrored if smaller than its slot
+        bios = store.load(bios_file)
+
+        bios_region = bios.region(bios_file)
+
+        memsys.map_region(bios_region, BIOS_ADDRESS, BIOS_SIZE)
+
+        # RAM, mirrored across its window
+        ram = RAM_MemoryRegion(RAM_SIZE)
+
+        memsys.map_region(ram, RAM_ADDRESS, RAM_WINDOW_SIZE)
+
+        # cartridge
+        mapper = None
+
+        if cartridge_file is not None:
+
+            mapper = cartridge.create(store.load(cartridge_file))
+
+            mapper.insert(memsys)
+
+        self._build(memsys, bios, bios_region, ram, mapper)
+
+    def _build(self, memsys, bios, bios_region, ram, mapper):
+        """Create the devices of a machine around its memory system"""
+
+        self.memsys = memsys
+
+        self.bios = bios
+
+        self._bios_region = bios_region
+
+        self.ram = ram
+
+        self.cartridge = mapper
+
+        self.vdp = VDP()
+
+        self.controllers = (Controller(), Controller())
+
+        self.io = IOSystem(self.vdp, self.controllers)
+
+        self.cpu = Z80(self.memsys, self.io)
+
+        # the VDP interrupt output drives the CPU NMI input
+        self.vdp.interrupt_handler = self._vdp_interrupt
+
+        # number of frames completed and the number of cycles executed in
+        # the current frame
+        self.frame = 0
+        self._frame_cycles = 0
+
+        self._stop = False
+
+        # cycles the CPU skipped (idle loops and HALT) during the last
+        # completed frame
+        self.skipped_cycles = 0
+        self._skipped_start = 0
+
+        # called with the machine at the end of every frame
+        self._frame_listeners = []
+
+    def clone(self):
+        """New machine, in the power-on state, with the ROM images and the
+        memory map of this one.
+
+        The ROM images are shared and the page table is copied rather than
+        built again, so a machine constructed once can serve as a template
+        for the many short-lived machines of a batch job.  Debugger and
+        coverage hooks, frame listeners and the machine state are not
+        copied.
+        """
+
+        ram = RAM_MemoryRegion(RAM_SIZE)
+
+        memsys = self.memsys.clone({self.ram : ram})
+
+        mapper = None
+
+        if self.cartridge is not None:
+            mapper = self.cartridge.clone(memsys)
+
+        machine = Machine.__new__(Machine)
+
+        machine._build(memsys, self.bios, self._bios_region, ram, mapper)
+
+        if mapper is not None:
+            mapper.reset()
+
+        return machine
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+
+        cartridge_name = self.cartridge.image.name if self.cartridge else None
+
+        return 'Machine({0!r}, {1!r})'.format(self.bios.name, cartridge_name)
+
+    def reset(self):
+        """Resets the machine"""
+
+        self.cpu.reset()
+        self.vdp.reset()
+
+        if self.cartridge is not None:
+            self.cartridge.reset()
+
+        self.frame = 0
+        self._frame_cycles = 0
+
+    def run_frame(self):
+        """Run until the end of the current frame.
+
+        Returns False if the frame did not complete because stop() was
+        called, or the CPU was stopped or aborted (by a hook or a debugger).
+        """
+
+        while self._frame_cycles < CYCLES_PER_FRAME:
+
+            self._frame_cycles += self.cpu.run(CYCLES_PER_FRAME - self._frame_cycles)
+
+            # other Z80 engines may not report stops
+            if self._stop or getattr(self.cpu, 'stopped', False):
+
+                self._stop = False
+
+                return False
+
+        self._end_frame()
+
+        return True
+
+    def step(self):
+        """Execute a single instruction, completing the frame if it is the
+        last of the frame.  Returns the number of cycles taken."""
+
+        cycles = self.cpu.step()
+
+        # a stop requested during the instruction is satisfied by the step
+        self._stop = False
+        self.cpu.clear_stop()
+
+        self._frame_cycles += cycles
+
+        if self._frame_cycles >= CYCLES_PER_FRAME:
+            self._end_frame()
+
+        return cycles
+
+    def run_frames(self, count):
+        """Run the given number of frames, returns the number completed"""
+
+        for i in range(count):
+
+            if not self.run_frame():
+                return i
+
+        return count
+
+    def add_frame_listener(self, listener):
+        """Call listener(machine) at the end of every frame"""
+        self._frame_listeners.append(listener)
+
+    def remove_frame_listener(self, listener):
+        """Stop calling a frame listener"""
+        self._frame_listeners.remove(listener)
+
+    def stop(self):
+        """Stop running at the next instruction boundary"""
+
+        self._stop = True
+
+        self.cpu.stop()
+
+    def _vdp_interrupt(self):
+        """Rising edge of the VDP interrupt output"""
+        self.cpu.nmi()
+
+    def _end_frame(self):
+        """Start of the vertical blank: count the frame and call the frame
+        listeners"""
+
+        self._frame_cycles -= CYCLES_PER_FRAME
+
+        self.frame += 1
+
+        # other Z80 engines may not skip cycles
+        skipped = (getattr(self.cpu, 'idle_cycles', 0) +
+                   getattr(self.cpu, 'halt_cycles', 0))
+
+        self.skipped_cycles = skipped - self._skipped_start
+        self._skipped_start = skipped
+
+        self.vdp.vblank()
+
+        # listeners may remove themselves
+        for listener in tuple(self._frame_listeners):
+            listener(self)
+
+    def save_state(self):
+        """Machine state, as a dictionary (see colecovision.state)"""
+
+        return {"cpu"          : self.cpu.save_state(),
+                "vdp"          : self.vdp.save_state(),
+                "ram"          : bytes(self.ram.read_block(0, RAM_SIZE)),
+                "bank"         : self.cartridge.bank if self.cartridge else 0,
+                "controllers"  : {"mode"  : self.io.controller_mode,
+                                  "port1" : self.controllers[0].state,
+                                  "port2" : self.controllers[1].state},
+                "frame"        : self.frame,
+                "frame_cycles" : self._frame_cycles}
+
+    def load_state(self, state):
+        """Restore a machine state saved by save_state().
+
+        The state is loaded into the existing registers, memory regions
+        and mappings of the machine.
+        """
+
+        self.cpu.load_state(state["cpu"])
+        self.vdp.load_state(state["vdp"])
+
+        self.ram.write_block(0, state["ram"])
+
+        if self.cartridge is not None:
+            self.cartridge.select_bank(state["bank"])
+
+        self.io.controller_mode = state["controllers"]["mode"]
+        self.controllers[0].state = state["controllers"]["port1"]
+        self.controllers[1].state = state["controllers"]["port2"]
+
+        self.frame = state["frame"]
+        self._frame_cycles = state["frame_cycles"]
@@ -4,8 +4,6 @@
 import abc
 import array
 import logging
-import os
-import struct
 
 
 #-----------------------------------------------------------------------------
@@ -14,6 +12,16 @@ import struct
 
 _logger = logging.getLogger(__name__)
 
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+# The memory system address space is split into pages of PAGE_SIZE bytes,
+# each with its own entry in the memory system's page table
+PAGE_SHIFT = 10
+PAGE_SIZE  = 1 << PAGE_SHIFT
+PAGE_MASK  = PAGE_SIZE - 1
+
 #-----------------------------------------------------------------------------
 # Interfaces
 #-----------------------------------------------------------------------------
@@ -32,6 +40,29 @@ class MemoryRegionInterface(object):
         """Read a value from memory"""
         pass
 
+    def fetch(self, address):
+        """Read an instruction op code from memory"""
+        return self.read(address)
+
+    def read_block(self, address, length):
+        """Read length values from memory, starting at address"""
+        return bytearray(self.read(address + i) for i in range(length))
+
+    def peek(self, address):
+        """Read a value from memory without side effects"""
+        return self.read(address)
+
+    def peek_block(self, address, length):
+        """Read length values from memory without side effects, starting at
+        address"""
+        return bytearray(self.peek(address + i) for i in range(length))
+
+    def write_block(self, address, data):
+        """Write a sequence of values to memory, starting at address"""
+
+        for i, value in enumerate(bytearray(data)):
+            self.write(address + i, value)
+
     @property
     def length(self):
         """Length of the memory region"""
@@ -51,11 +82,62 @@ class MemorySystemInterface(object):
         """Read a value from memory"""
         pass
 
+    @abc.abstractmethod
+    def fetch(self, address):
+        """Read an instruction op code from memory"""
+        pass
+
+    @abc.abstractmethod
+    def read_block(self, address, length):
+        """Read length values from memory, starting at address"""
+        pass
+
+    @abc.abstractmethod
+    def write_block(self, address, data):
+        """Write a sequence of values to memory, starting at address"""
+        pass
+
+    @abc.abstractmethod
+    def peek(self, address):
+        """Read a value from memory without side effects: no hooks are
+        called and no device is accessed"""
+        pass
+
+    @abc.abstractmethod
+    def peek_block(self, address, length):
+        """Read length values from memory without side effects, starting at
+        address"""
+        pass
+
     @abc.abstractmethod
     def dump(self, start_address, end_address, file_name):
         """Dump the memory specified by the range to a file"""
         pass
 
+
+class MemoryHookInterface(object):
+    """Observer of the accesses made to a page of the memory system.
+
+    Hooks are only called for pages they have been added to, every other
+    page is accessed without any instrumentation.
+    """
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def fetch_hook(self, address, value):
+        """Called after an op code is fetched from the given address"""
+        pass
+
+    @abc.abstractmethod
+    def read_hook(self, address, value):
+        """Called after a value is read from the given address"""
+        pass
+
+    @abc.abstractmethod
+    def write_hook(self, address, value):
+        """Called after a value is written to the given address"""
+        pass
+
 #-----------------------------------------------------------------------------
 # Classes
 #-----------------------------------------------------------------------------
@@ -64,21 +146,26 @@ class MemorySystemInterface(object):
 class ROM_MemoryRegion(MemoryRegionInterface):
     """Read-only memory region"""
 
-    def __init__(self, file_name):
-        """Initialization"""
+    def __init__(self, file_name, data=None):
+        """Initialization
+
+        The contents of the ROM are read from the file unless they are
+        given in data, which lets several regions share a single copy of
+        a ROM image (see colecovision.romstore).
+        """
 
-        # open the file and save the file name
-        self._rom_file = open(file_name, 'rb')
         self._rom_file_name = file_name
 
-        # get the length (size) of the file
-        stat_info = os.stat(self._rom_file_name)
-        self._length = stat_info.st_size
+        if data is None:
+
+            with open(file_name, 'rb') as rom_file:
+                data = rom_file.read()
+
+        # the contents are kept as bytes so that they can never be modified
+        self._rom_data = bytes(data)
 
-    def __del__(self):
-        """Closes the ROM file"""
-        if self._rom_file:
-            self._rom_file.close()
+        # get the length (size) of the ROM
+        self._length = len(self._rom_data)
 
     def __repr__(self):
         """Returns a string to re-create the object"""
@@ -93,25 +180,34 @@ class ROM_MemoryRegion(MemoryRegionInterface):
     def read(self, address):
         """Read a value from memory"""
 
-        if (address < 0) or (address >= self.length):
+        if (address < 0) or (address >= self._length):
             raise IndexError('Address {0} is invalid'.format(address))
 
-        # move to the correct offset within in the file
-        self._rom_file.seek(address)
+        return self._rom_data[address]
+
+    def read_block(self, address, length):
+        """Read length values from memory, starting at address"""
 
-        # read a byte (returned as a string)
-        read_value = self._rom_file.read(1)
+        if (address < 0) or (address + length > self._length):
+            raise IndexError('Address {0} is invalid'.format(address))
 
-        # convert the read value from a string to an integer
-        result, = struct.unpack('B', read_value)
+        return bytearray(self._rom_data[address:address + length])
 
-        return result
+    def peek_block(self, address, length):
+        """Read length values from memory without side effects, starting at
+        address"""
+        return self.read_block(address, length)
 
     @property
     def file_name(self):
         """File name of the ROM file"""
         return self._rom_file_name
 
+    @property
+    def data(self):
+        """Read-only view of the contents of the ROM"""
+        return memoryview(self._rom_data)
+
 
 class RAM_MemoryRegion(MemoryRegionInterface):
     """Read/Write memory region"""
@@ -123,12 +219,9 @@ class RAM_MemoryRegion(MemoryRegionInterface):
 
         self._length = size_bytes
 
-        # create an array to represent the memory
-        self._memory = array.array('B')
-
-        # fill in the memory with default values
-        for i in range(size_bytes):
-            self._memory.append(0xff)
+        # create an array to represent the memory, filled with the default
+        # value
+        self._memory = array.array('B', b'\xff' * size_bytes)
 
     def __repr__(self):
         """Returns a string to re-create the object"""
@@ -151,71 +244,277 @@ class RAM_MemoryRegion(MemoryRegionInterface):
 
         return self._memory[address]
 
+    def read_block(self, address, length):
+        """Read length values from memory, starting at address"""
 
-class _MemoryRegionMapper(object):
-    """Given a dictionary of memory regions and a memory address,
-       presents the memory region that maps to the given address
-       along with the memory-region specific address to use"""
+        if (address < 0) or (address + length > self.length):
+            raise IndexError('Address {0} is invalid'.format(address))
 
-    def __init__(self, mem_regions, mem_address):
-        """Find the memory region that maps to the given address"""
+        return bytearray(self._memory[address:address + length])
 
-        self._region = None
-        self._region_address = 0
+    def peek_block(self, address, length):
+        """Read length values from memory without side effects, starting at
+        address"""
+        return self.read_block(address, length)
 
-        if (mem_regions) and (mem_address >= 0):
-        
-            last_base_address_found = 0
+    def write_block(self, address, data):
+        """Write a sequence of values to memory, starting at address"""
 
-            for base_address in mem_regions:
-            
-                if base_address <= mem_address:
-                
-                    if base_address > last_base_address_found:
-                    
-                        last_base_address_found = base_address
+        data = array.array('B', bytearray(data))
 
-            if last_base_address_found in mem_regions:
-            
-                self._region = mem_regions[last_base_address_found]
-                self._region_address = mem_address - last_base_address_found
+        if (address < 0) or (address + len(data) > self.length):
+            raise IndexError('Address {0} is invalid'.format(address))
 
-    @property
-    def address(self):
-        """Memory Region address to use"""
-        return self._region_address
+        self._memory[address:address + len(data)] = data
+
+
+class DeviceMemoryRegion(MemoryRegionInterface):
+    """Memory region serviced by a device.
+
+    Reads call read_callback(address) and return its value, writes call
+    write_callback(address, value), with addresses relative to the start
+    of the region.  Without a read callback the region reads as an
+    undriven bus (0xFF), without a write callback writes are ignored.
+
+    Only the pages the region is mapped on dispatch to the callbacks, the
+    other pages of the memory system keep their direct RAM and ROM paths.
+    Block accesses call the callbacks a value at a time, in address order.
+    Reads are expected to be repeatable (the Z80 idle loop detection may
+    skip repeated reads).
+
+    Peeks (debugger inspection, the operand bytes of instructions) must not
+    disturb the device: they call peek_callback(address) when given and
+    read as an undriven bus otherwise.
+    """
+
+    def __init__(self, size_bytes, read_callback=None, write_callback=None,
+                 peek_callback=None):
+        """Initialization"""
+
+        assert(size_bytes > 0)
+
+        self._length = size_bytes
+
+        self._read_callback = read_callback
+        self._write_callback = write_callback
+        self._peek_callback = peek_callback
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'DeviceMemoryRegion({0}, {1!r}, {2!r}, {3!r})'.format(self._length,
+                                                                     self._read_callback,
+                                                                     self._write_callback,
+                                                                     self._peek_callback)
+
+    def write(self, address, value):
+        """Write a value to the device"""
+
+        if (address < 0) or (address >= self._length):
+            raise IndexError('Address {0} is invalid'.format(address))
+
+        if self._write_callback is not None:
+            self._write_callback(address, value)
+
+    def read(self, address):
+        """Read a value from the device"""
+
+        if (address < 0) or (address >= self._length):
+            raise IndexError('Address {0} is invalid'.format(address))
+
+        if self._read_callback is None:
+            return 0xFF
+
+        return self._read_callback(address)
+
+    def peek(self, address):
+        """Read a value from the device without side effects"""
+
+        if (address < 0) or (address >= self._length):
+            raise IndexError('Address {0} is invalid'.format(address))
+
+        if self._peek_callback is None:
+            return 0xFF
+
+        return self._peek_callback(address)
+
+    def read_block(self, address, length):
+        """Read length values from the device, a value at a time"""
+
+        if (address < 0) or (address + length > self._length):
+            raise IndexError('Address {0} is invalid'.format(address))
+
+        return bytearray(self.read(address + i) for i in range(length))
+
+    def write_block(self, address, data):
+        """Write a sequence of values to the device, a value at a time"""
+
+        data = bytearray(data)
+
+        if (address < 0) or (address + len(data) > self._length):
+            raise IndexError('Address {0} is invalid'.format(address))
+
+        for i, value in enumerate(data):
+            self.write(address + i, value)
+
+
+class _HookedRegion(MemoryRegionInterface):
+    """Instrumented handler that stands in for a memory region on the
+       pages of the memory system that have hooks attached"""
+
+    def __init__(self, region, base_address, hooks):
+        """Initialization
+
+        base_address is the memory system address of region address 0
+        """
+
+        self._region = region
+        self._base_address = base_address
+        self._hooks = hooks
+        self._length = region.length
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return '_HookedRegion({0!r}, {1}, {2!r})'.format(self._region,
+                                                         self._base_address,
+                                                         self._hooks)
+
+    def write(self, address, value):
+        """Write a value to memory"""
+
+        self._region.write(address, value)
+
+        for hook in self._hooks:
+            hook.write_hook(self._base_address + address, value)
+
+    def read(self, address):
+        """Read a value from memory"""
+
+        value = self._region.read(address)
+
+        for hook in self._hooks:
+            hook.read_hook(self._base_address + address, value)
+
+        return value
+
+    def fetch(self, address):
+        """Read an instruction op code from memory"""
+
+        value = self._region.fetch(address)
+
+        for hook in self._hooks:
+            hook.fetch_hook(self._base_address + address, value)
+
+        return value
+
+    def peek(self, address):
+        """Read a value from memory, without calling the hooks"""
+        return self._region.peek(address)
+
+    def peek_block(self, address, length):
+        """Read length values from memory, without calling the hooks"""
+        return self._region.peek_block(address, length)
+
+
+class _OpenBusRegion(MemoryRegionInterface):
+    """Handler that stands in for a memory region on the pages of a mapping
+       that extend past the end of the region: those addresses read as an
+       undriven bus (0xFF) and ignore writes, like the unused addresses of
+       a cartridge slot"""
+
+    def __init__(self, region):
+        """Initialization"""
+
+        self._region = region
+        self._length = region.length
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return '_OpenBusRegion({0!r})'.format(self._region)
+
+    def write(self, address, value):
+        """Write a value to memory"""
+
+        if address < self._length:
+            self._region.write(address, value)
+
+    def read(self, address):
+        """Read a value from memory"""
+
+        if address < self._length:
+            return self._region.read(address)
+
+        return 0xFF
+
+    def fetch(self, address):
+        """Read an instruction op code from memory"""
+
+        if address < self._length:
+            return self._region.fetch(address)
+
+        return 0xFF
+
+    def peek(self, address):
+        """Read a value from memory without side effects"""
+
+        if address < self._length:
+            return self._region.peek(address)
+
+        return 0xFF
 
     @property
     def region(self):
-        """Memory Region to use"""
+        """Memory region the handler stands in for"""
         return self._region
 
+
 class MemorySystem(MemorySystemInterface):
     """Provides a single interface to several memory regions"""
 
-    def __init__(self, data_bus_width=8):
+    def __init__(self, data_bus_width=8, address_bus_width=16):
         """Initializes the memory system"""
 
         self._bus_width = data_bus_width
+        self._address_width = address_bus_width
+        self._address_mask = (2 ** address_bus_width) - 1
 
         self._region = {}
 
+        page_count = max(1, (2 ** address_bus_width) >> PAGE_SHIFT)
+
+        # Page table used to decode addresses.  Each entry is either None
+        # (un-mapped) or a tuple of the handler servicing the page, the
+        # offset of the page within the handler and the mask applied to the
+        # address within the page (smaller than the page for mirrors of
+        # regions that are smaller than a page).
+        self._page = [None] * page_count
+
+        # Memory region, offset and mask actually mapped to each page, the
+        # handler in the page table differs from it when the page is hooked
+        self._page_map = [None] * page_count
+
+        # Hooks attached to each page
+        self._page_hooks = [()] * page_count
+
     def __repr__(self):
         """Returns a string to re-create the object"""
-        return 'MemorySystem(data_bus_width={0})'.format(self._bus_width)
-
+        return 'MemorySystem(data_bus_width={0}, address_bus_width={1})'.format(
+            self._bus_width, self._address_width)
 
     def write(self, address, value):
         """Write a value to memory"""
 
         assert(value <= ((2 ** self._bus_width) - 1))
 
+        address &= self._address_mask
+
         # Map given address to a specific memory region
-        mem_map = _MemoryRegionMapper(self._region, address)
+        entry = self._page[address >> PAGE_SHIFT]
+
+        if entry:
 
-        if mem_map.region:
-            
-            mem_map.region.write(mem_map.address, value)
+            handler, offset, mask = entry
+
+            handler.write(offset + (address & mask), value)
 
         else:
 
@@ -223,18 +522,19 @@ class MemorySystem(MemorySystemInterface):
 
             raise RuntimeError(ex_msg.format(hex(value), hex(address)))
 
-
     def read(self, address):
         """Read a value from memory"""
-        
+
+        address &= self._address_mask
+
         # Map given address to a specific memory region
-        mem_map = _MemoryRegionMapper(self._region, address)
+        entry = self._page[address >> PAGE_SHIFT]
 
-        if mem_map.region:
+        if entry:
 
-            value_read = mem_map.region.read(mem_map.address)
+            handler, offset, mask = entry
 
-            return value_read
+            return handler.read(offset + (address & mask))
 
         else:
 
@@ -242,30 +542,354 @@ class MemorySystem(MemorySystemInterface):
 
             raise RuntimeError(ex_msg.format(hex(address)))
 
+    def fetch(self, address):
+        """Read an instruction op code from memory"""
+
+        address &= self._address_mask
+
+        # Map given address to a specific memory region
+        entry = self._page[address >> PAGE_SHIFT]
+
+        if entry:
+
+            handler, offset, mask = entry
+
+            return handler.fetch(offset + (address & mask))
+
+        else:
+
+            ex_msg = "Fetching from un-mapped address 0x{0}"
+
+            raise RuntimeError(ex_msg.format(hex(address)))
+
+    def read_block(self, address, length):
+        """Read length values from memory, starting at address.
+
+        Values are copied a page at a time, pages serviced by a handler
+        without block support (hooked or device pages) are read a value
+        at a time.
+        """
+
+        result = bytearray()
+
+        for handler, region_address, count, mask in self._block_entries(address, length):
+
+            if mask == PAGE_MASK:
+
+                result += handler.read_block(region_address, count)
+
+            else:
+
+                offset = region_address & ~mask
+
+                for i in range(count):
+                    result.append(handler.read(offset + ((region_address + i) & mask)))
+
+        return result
+
+    def peek(self, address):
+        """Read a value from memory without side effects: no hooks are
+        called and no device is accessed (see DeviceMemoryRegion)"""
+
+        address &= self._address_mask
+
+        entry = self._page[address >> PAGE_SHIFT]
+
+        if entry:
+
+            handler, offset, mask = entry
+
+            return handler.peek(offset + (address & mask))
+
+        else:
+
+            ex_msg = "Peeking un-mapped address 0x{0}"
+
+            raise RuntimeError(ex_msg.format(hex(address)))
+
+    def peek_block(self, address, length):
+        """Read length values from memory without side effects, starting at
+        address"""
+
+        result = bytearray()
+
+        for handler, region_address, count, mask in self._block_entries(address, length):
+
+            if mask == PAGE_MASK:
 
-    def map_region(self, mem_region, address):
-        """Map a memory region into memory"""
+                result += handler.peek_block(region_address, count)
+
+            else:
+
+                offset = region_address & ~mask
+
+                for i in range(count):
+                    result.append(handler.peek(offset + ((region_address + i) & mask)))
+
+        return result
+
+    def write_block(self, address, data):
+        """Write a sequence of values to memory, starting at address"""
+
+        data = bytearray(data)
+
+        position = 0
+
+        for handler, region_address, count, mask in self._block_entries(address, len(data)):
+
+            if mask == PAGE_MASK:
+
+                handler.write_block(region_address, data[position:position + count])
+
+            else:
+
+                offset = region_address & ~mask
+
+                for i in range(count):
+                    handler.write(offset + ((region_address + i) & mask), data[position + i])
+
+            position += count
+
+    def _block_entries(self, address, length):
+        """Generate the handler, handler address, count and address mask
+           of each page touched by a block access"""
+
+        while length > 0:
+
+            address &= self._address_mask
+
+            entry = self._page[address >> PAGE_SHIFT]
+
+            if not entry:
+
+                ex_msg = "Block access to un-mapped address 0x{0}"
+
+                raise RuntimeError(ex_msg.format(hex(address)))
+
+            handler, offset, mask = entry
+
+            page_address = address & PAGE_MASK
+
+            count = min(length, PAGE_SIZE - page_address)
+
+            yield (handler, offset + (page_address & mask), count, mask)
+
+            address += count
+            length -= count
+
+    def map_region(self, mem_region, address, length=None, offset=0):
+        """Map a memory region into memory
+
+        length bytes (all of the region by default), starting at the given
+        offset within the region, are mapped at address.  When length is
+        larger than the region, the region is mirrored: the address bits
+        above the region size (rounded up to a power of two) are ignored,
+        so a single region backs every mirror without being copied.
+        """
+
+        assert((address & PAGE_MASK) == 0)
+        assert((offset & PAGE_MASK) == 0)
+
+        if length is None:
+            length = mem_region.length - offset
+
+        if address in self._region:
 
-        if self._region.has_key(address):
-            
             _logger.warning("Mapping address that is already mapped")
 
-        _logger.info("Mapping address 0x{0}".format(hex(address)))
+        _logger.info("Mapping address 0x%04X", address)
+
+        self._region[address] = (mem_region, length, offset)
+
+        self._build_page_table()
+
+    def remap_region(self, address, offset):
+        """Change the offset within the region mapped at address.
+
+        Only the page table entries of the pages covered by the mapping
+        are updated, which makes this suitable for bank switching.
+        """
+
+        assert((offset & PAGE_MASK) == 0)
+
+        mem_region, length, old_offset = self._region[address]
 
-        self._region[address] = mem_region
+        self._region[address] = (mem_region, length, offset)
+
+        for page, mapping in self._mapping_pages(address):
+
+            current = self._page_map[page]
+
+            # leave pages that are covered by another region alone
+            if (current is not None) and (_mapped_region(current[0]) is not mem_region):
+                continue
+
+            self._page_map[page] = mapping
+
+            self._update_page(page)
 
     def unmap_region(self, mem_region):
-        """Remove a memory region's mapping in memory"""
-        
-        for k in self._region.keys():
-            
-            if self._region[k] == mem_region:
-                
-                _logger.info("Un-mapping address 0x{0}".format(hex(k)))
+        """Remove every mapping of a memory region in memory"""
+
+        for k in list(self._region.keys()):
+
+            if self._region[k][0] == mem_region:
+
+                _logger.info("Un-mapping address 0x%04X", k)
 
                 self._region.pop(k)
 
-                break
+        self._build_page_table()
+
+    def clone(self, regions=None):
+        """Memory system with the same mappings, built by copying the page
+        table rather than decoding the mappings again.
+
+        regions maps memory regions to the regions replacing them in the
+        clone (the RAM of a new machine, for instance), they must be the
+        same size.  Page hooks are not copied, their owners attach them to
+        the clone.
+        """
+
+        regions = regions or {}
+
+        memsys = MemorySystem.__new__(MemorySystem)
+
+        memsys._bus_width = self._bus_width
+        memsys._address_width = self._address_width
+        memsys._address_mask = self._address_mask
+
+        memsys._region = {}
+
+        for address, (mem_region, length, offset) in self._region.items():
+            memsys._region[address] = (regions.get(mem_region, mem_region), length, offset)
+
+        memsys._page_map = [None if mapping is None else
+                            (_replace_region(mapping[0], regions),) + mapping[1:]
+                            for mapping in self._page_map]
+
+        # without hooks, the page table is the page mapping
+        memsys._page = list(memsys._page_map)
+
+        memsys._page_hooks = [()] * len(self._page_hooks)
+
+        return memsys
+
+    def page(self, address):
+        """Page number of the page containing the given address"""
+        return (address & self._address_mask) >> PAGE_SHIFT
+
+    @property
+    def page_count(self):
+        """Number of pages in the address space"""
+        return len(self._page)
+
+    def page_region(self, page):
+        """Memory region mapped to a page, None when it is un-mapped"""
+
+        mapping = self._page_map[page]
+
+        return None if mapping is None else _mapped_region(mapping[0])
+
+    def add_page_hook(self, page, hook):
+        """Attach a hook (MemoryHookInterface) to a page.
+
+        Only the accesses made to hooked pages are instrumented.
+        """
+
+        self._page_hooks[page] = self._page_hooks[page] + (hook,)
+
+        self._update_page(page)
+
+    def remove_page_hook(self, page, hook):
+        """Detach a hook from a page"""
+
+        self._page_hooks[page] = tuple(h for h in self._page_hooks[page]
+                                       if h is not hook)
+
+        self._update_page(page)
+
+    def _build_page_table(self):
+        """Rebuild the page table from the mapped memory regions"""
+
+        for page in range(len(self._page_map)):
+            self._page_map[page] = None
+
+        # regions are applied in address order so that a region mapped at
+        # a higher address takes priority over the tail of a lower one
+        for base_address in sorted(self._region):
+
+            for page, mapping in self._mapping_pages(base_address):
+                self._page_map[page] = mapping
+
+        for page in range(len(self._page)):
+            self._update_page(page)
+
+    def _mapping_pages(self, address):
+        """Generate the page numbers and page mappings of the region
+           mapped at address"""
+
+        mem_region, length, offset = self._region[address]
+
+        available = mem_region.length - offset
+
+        # size of the block that mirrors of the region repeat on
+        mirror_size = 1
+
+        while mirror_size < available:
+            mirror_size <<= 1
+
+        if (length > available) and (mirror_size < PAGE_SIZE):
+            mask = mirror_size - 1
+        else:
+            mask = PAGE_MASK
+
+        first_page = address >> PAGE_SHIFT
+
+        page_count = (length + PAGE_MASK) >> PAGE_SHIFT
+
+        last_page = min(first_page + page_count, len(self._page_map))
+
+        # pages extending past the end of the region (the holes in the
+        # mirrors of a region whose size is not a power of two, and the
+        # last page of a region whose size is not a multiple of a page)
+        # read as an open bus
+        open_bus = _OpenBusRegion(mem_region)
+
+        for page in range(first_page, last_page):
+
+            region_address = (page - first_page) << PAGE_SHIFT
+
+            if region_address >= available:
+                region_address &= mirror_size - 1
+
+            if region_address + mask + 1 > available:
+                yield (page, (open_bus, offset + region_address, mask))
+            else:
+                yield (page, (mem_region, offset + region_address, mask))
+
+    def _update_page(self, page):
+        """Update the page table entry of a single page"""
+
+        mapping = self._page_map[page]
+
+        hooks = self._page_hooks[page]
+
+        if (mapping is None) or (not hooks):
+
+            self._page[page] = mapping
+
+        else:
+
+            mem_region, offset, mask = mapping
+
+            # mirrors of regions smaller than a page are reported at the
+            # address of the first mirror in the page
+            base_address = (page << PAGE_SHIFT) - offset
+
+            handler = _HookedRegion(mem_region, base_address, hooks)
+
+            self._page[page] = (handler, offset, mask)
 
     def dump(self, start_address, end_address, file_name):
         """Dump the memory specified by the range to a file"""
@@ -297,3 +921,29 @@ class MemorySystem(MemorySystemInterface):
                     f.write(value_string)
 
                 f.write("\n")
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def _mapped_region(handler):
+    """Memory region serviced by a page table handler"""
+
+    if isinstance(handler, _OpenBusRegion):
+        return handler.region
+
+    return handler
+
+
+def _replace_region(handler, regions):
+    """Page table handler with its memory region replaced as given by
+    regions (see MemorySystem.clone)"""
+
+    if isinstance(handler, _OpenBusRegion):
+
+        if handler.region in regions:
+            return _OpenBusRegion(regions[handler.region])
+
+        return handler
+
+    return regions.get(handler, handler)
@@ -0,0 +1,384 @@
+"""Performance metrics of a running machine
+
+Metrics gives visibility into how an emulator instance performs without
+attaching a debugger.  It samples the counters the machine keeps anyway
+(cycles, instructions, skipped idle and HALT cycles, the tile row cache
+statistics of the VDP) from a frame listener, once per frame, so it adds no
+work to the instructions or memory accesses.  It reports:
+
+    cycles and instructions per second
+    a histogram of the wall clock time of the frames
+    the hit rate of the VDP tile row (decoded pattern) cache
+    the cycles skipped by the idle loop detection and while halted
+    memory accesses per region type (rom, ram, device), optional
+
+Counting the memory accesses is the only per access cost and is off by
+default: the data accesses of the instructions then go through a counting
+layer that increments a per page counter, folded into the region type
+totals at the end of each frame.  Op code fetches are not counted.  When
+coverage (colecovision.coverage) is also recorded, attach it first.
+
+With a file name the metrics are written periodically, as Prometheus text
+or JSON, for a local scraper to read:
+
+    metrics = Metrics(machine, 'instance1.prom', interval=5.0)
+
+snapshot() returns them as a dictionary, suitable for the counters of the
+debug server (DebugServer.add_counters('metrics', metrics.snapshot)).
+"""
+
+import bisect
+import json
+import logging
+import os
+import tempfile
+import time
+
+from colecovision.memory import DeviceMemoryRegion, PAGE_SHIFT
+from colecovision.memory import RAM_MemoryRegion, ROM_MemoryRegion
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+# Export formats
+FORMAT_PROMETHEUS = 'prometheus'
+FORMAT_JSON       = 'json'
+
+# Seconds between the periodic exports
+DEFAULT_EXPORT_INTERVAL = 1.0
+
+# Upper bounds of the frame time histogram buckets, in seconds (a frame
+# runs in real time in 1/59.92 s), the last bucket is unbounded
+FRAME_TIME_BUCKETS = (0.002, 0.005, 0.010, 0.0167, 0.020, 0.033, 0.050, 0.100, 0.250)
+
+# Prefix of the Prometheus metric names
+METRIC_PREFIX = 'colecovision_'
+
+# Region types of the memory access counts, by memory region class (the
+# first class matching a region wins, RAM covers its subclasses)
+_REGION_TYPES = ((ROM_MemoryRegion, 'rom'),
+                 (DeviceMemoryRegion, 'device'),
+                 (RAM_MemoryRegion, 'ram'))
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class _CountingMemory(object):
+    """Data accesses of the instructions, counted per page before they
+    reach the memory system"""
+
+    def __init__(self, memory, reads, writes):
+        """Initialization"""
+
+        self.memory = memory
+        self._reads = reads
+        self._writes = writes
+
+    def read(self, address):
+        """Read a value from memory"""
+
+        self._reads[(address & 0xFFFF) >> PAGE_SHIFT] += 1
+
+        return self.memory.read(address)
+
+    def write(self, address, value):
+        """Write a value to memory"""
+
+        self._writes[(address & 0xFFFF) >> PAGE_SHIFT] += 1
+
+        self.memory.write(address, value)
+
+
+class Metrics(object):
+    """Performance metrics of a machine (colecovision.machine), sampled at
+    the end of every frame"""
+
+    def __init__(self, machine, file_name=None, export_format=FORMAT_PROMETHEUS,
+                 interval=DEFAULT_EXPORT_INTERVAL, memory_accesses=False,
+                 clock=time.perf_counter):
+        """Initialization, the metrics are written to file_name (when given)
+        every interval seconds"""
+
+        if export_format not in (FORMAT_PROMETHEUS, FORMAT_JSON):
+            raise ValueError('Unknown metrics format {0}'.format(export_format))
+
+        self._machine = machine
+
+        self.file_name = file_name
+        self.export_format = export_format
+        self.interval = interval
+
+        self._clock = clock
+
+        # per page data access counts, None when accesses are not counted
+        self._page_reads = None
+        self._page_writes = None
+
+        self._counting = None
+
+        if memory_accesses:
+
+            page_count = machine.memsys.page_count
+
+            self._page_reads = [0] * page_count
+            self._page_writes = [0] * page_count
+
+            self._counting = _CountingMemory(machine.cpu.data_memory,
+                                             self._page_reads, self._page_writes)
+
+            machine.cpu.data_memory = self._counting
+
+        self.reset()
+
+        machine.add_frame_listener(self._end_frame)
+
+    def reset(self):
+        """Start measuring from now"""
+
+        machine = self._machine
+        cpu = machine.cpu
+
+        now = self._clock()
+
+        self._start_time = now
+        self._frame_start = now
+        self._last_export = now
+
+        self._start_frame = machine.frame
+        self._start_cycles = cpu.cycles
+        self._start_instructions = cpu.instructions
+
+        # other Z80 engines may not skip cycles
+        self._start_idle = getattr(cpu, 'idle_cycles', 0)
+        self._start_halt = getattr(cpu, 'halt_cycles', 0)
+
+        self._start_lookups = machine.vdp.tile_lookups
+        self._start_misses = machine.vdp.tile_misses
+
+        # frame time histogram: frames per bucket (not cumulative), the
+        # last bucket counts the frames longer than every bound
+        self.frame_time_counts = [0] * (len(FRAME_TIME_BUCKETS) + 1)
+        self.frame_time_sum = 0.0
+
+        # memory accesses per region type
+        self.memory_reads = {}
+        self.memory_writes = {}
+
+        if self._counting is not None:
+
+            for page in range(len(self._page_reads)):
+                self._page_reads[page] = 0
+                self._page_writes[page] = 0
+
+    def close(self):
+        """Stop measuring, the last metrics are written to the file"""
+
+        self._machine.remove_frame_listener(self._end_frame)
+
+        cpu = self._machine.cpu
+
+        if (self._counting is not None) and (cpu.data_memory is self._counting):
+            cpu.data_memory = self._counting.memory
+
+        self._counting = None
+
+        if self.file_name is not None:
+            self.export()
+
+    def snapshot(self):
+        """Metrics as a dictionary"""
+
+        machine = self._machine
+        cpu = machine.cpu
+
+        elapsed = max(self._clock() - self._start_time, 1e-9)
+
+        cycles = cpu.cycles - self._start_cycles
+        instructions = cpu.instructions - self._start_instructions
+
+        lookups = machine.vdp.tile_lookups - self._start_lookups
+        misses = machine.vdp.tile_misses - self._start_misses
+
+        buckets = {}
+        count = 0
+
+        for bound, frames in zip(FRAME_TIME_BUCKETS + ('+Inf',), self.frame_time_counts):
+            count += frames
+            buckets[str(bound)] = count
+
+        return {'elapsed_seconds'         : elapsed,
+                'frames'                  : machine.frame - self._start_frame,
+                'cycles'                  : cycles,
+                'instructions'            : instructions,
+                'cycles_per_second'       : cycles / elapsed,
+                'instructions_per_second' : instructions / elapsed,
+                'skipped_cycles'          : {'idle' : getattr(cpu, 'idle_cycles', 0) - self._start_idle,
+                                             'halt' : getattr(cpu, 'halt_cycles', 0) - self._start_halt},
+                'frame_time_seconds'      : {'buckets' : buckets,
+                                             'sum'     : self.frame_time_sum,
+                                             'count'   : count},
+                'tile_cache'              : {'lookups'  : lookups,
+                                             'misses'   : misses,
+                                             'hit_rate' : (1.0 - (misses / lookups)) if lookups else 0.0},
+                'memory_accesses'         : {'read'  : dict(self.memory_reads),
+                                             'write' : dict(self.memory_writes)}}
+
+    def prometheus_text(self):
+        """Metrics in the Prometheus text exposition format"""
+
+        metrics = self.snapshot()
+
+        lines = []
+
+        def metric(name, metric_type, description, samples):
+            """Add a metric and its (labels, value) samples"""
+
+            name = METRIC_PREFIX + name
+
+            lines.append('# HELP {0} {1}'.format(name, description))
+            lines.append('# TYPE {0} {1}'.format(name, metric_type))
+
+            for labels, value in samples:
+                lines.append('{0}{1} {2!r}'.format(name, labels, value))
+
+        metric('frames_total', 'counter', 'Frames emulated.',
+               [('', metrics['frames'])])
+        metric('cycles_total', 'counter', 'CPU cycles emulated.',
+               [('', metrics['cycles'])])
+        metric('instructions_total', 'counter', 'CPU instructions emulated.',
+               [('', metrics['instructions'])])
+        metric('cycles_per_second', 'gauge', 'CPU cycles emulated per second.',
+               [('', metrics['cycles_per_second'])])
+        metric('instructions_per_second', 'gauge', 'CPU instructions emulated per second.',
+               [('', metrics['instructions_per_second'])])
+        metric('skipped_cycles_total', 'counter', 'CPU cycles skipped in idle loops and HALT.',
+               [('{{reason="{0}"}}'.format(reason), value)
+                for reason, value in sorted(metrics['skipped_cycles'].items())])
+
+        frame_time = metrics['frame_time_seconds']
+
+        metric('frame_time_seconds', 'histogram', 'Wall clock time of the frames.',
+               [('_bucket{{le="{0}"}}'.format(bound), frames)
+                for bound, frames in frame_time['buckets'].items()] +
+               [('_sum', frame_time['sum']), ('_count', frame_time['count'])])
+
+        tile_cache = metrics['tile_cache']
+
+        metric('tile_cache_lookups_total', 'counter', 'Tile row cache lookups.',
+               [('', tile_cache['lookups'])])
+        metric('tile_cache_misses_total', 'counter', 'Tile row cache misses.',
+               [('', tile_cache['misses'])])
+        metric('tile_cache_hit_rate', 'gauge', 'Tile row cache hit rate.',
+               [('', tile_cache['hit_rate'])])
+
+        accesses = metrics['memory_accesses']
+
+        metric('memory_accesses_total', 'counter', 'Data accesses of the instructions.',
+               [('{{type="{0}",access="{1}"}}'.format(region, access), count)
+                for access in ('read', 'write')
+                for region, count in sorted(accesses[access].items())])
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self, file_name=None, export_format=None):
+        """Write the metrics to a file (by default the file and format given
+        at initialization).
+
+        The metrics are written to a temporary file that is then renamed,
+        so a scraper never reads a partially written file.
+        """
+
+        file_name = file_name or self.file_name
+        export_format = export_format or self.export_format
+
+        if export_format == FORMAT_JSON:
+            text = json.dumps(self.snapshot(), sort_keys=True) + '\n'
+        else:
+            text = self.prometheus_text()
+
+        directory = os.path.dirname(os.path.abspath(file_name))
+
+        handle, temp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+        try:
+
+            with os.fdopen(handle, 'w') as f:
+                f.write(text)
+
+            os.replace(temp_name, file_name)
+
+        except:
+
+            os.remove(temp_name)
+
+            raise
+
+    def _end_frame(self, machine):
+        """Frame listener: sample the frame time and the access counts, and
+        export when the interval has elapsed"""
+
+        now = self._clock()
+
+        frame_time = now - self._frame_start
+
+        self._frame_start = now
+
+        self.frame_time_counts[bisect.bisect_left(FRAME_TIME_BUCKETS, frame_time)] += 1
+        self.frame_time_sum += frame_time
+
+        if self._counting is not None:
+            self._fold_accesses()
+
+        if (self.file_name is not None) and (now - self._last_export >= self.interval):
+
+            self._last_export = now
+
+            self.export()
+
+    def _fold_accesses(self):
+        """Add the per page access counts of the frame to the region type
+        totals"""
+
+        memsys = self._machine.memsys
+
+        reads = self._page_reads
+        writes = self._page_writes
+
+        for page in range(len(reads)):
+
+            if reads[page] or writes[page]:
+
+                name = region_type(memsys.page_region(page))
+
+                self.memory_reads[name] = self.memory_reads.get(name, 0) + reads[page]
+                self.memory_writes[name] = self.memory_writes.get(name, 0) + writes[page]
+
+                reads[page] = 0
+                writes[page] = 0
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def region_type(region):
+    """Type of a memory region in the access counts: rom, ram, device,
+    unmapped or the lower case class name of other regions"""
+
+    if region is None:
+        return 'unmapped'
+
+    for region_class, name in _REGION_TYPES:
+        if isinstance(region, region_class):
+            return name
+
+    return type(region).__name__.lower()
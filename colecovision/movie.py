@@ -0,0 +1,353 @@
+"""Controller input recording and replay for the Colecovision
+
+A movie holds the state of both controllers for every frame.  Only the
+frames where the input changes are stored: each record is the number of
+frames since the previous record (a variable length integer), a mask of
+the controllers that changed and, for each of them, the XOR of the new
+and previous 16-bit controller states.  A record with an empty mask ends
+the movie and carries the frames left after the last change.
+
+Recording writes records as the input changes, so arbitrarily long
+sessions are streamed to disk.  Replay applies the recorded input once per
+frame, at the frame boundary, so the controller ports are never polled.
+"""
+
+import binascii
+import logging
+import struct
+
+from colecovision.controller import RELEASED
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+MOVIE_MAGIC   = b'CVMV'
+MOVIE_VERSION = 1
+
+CONTROLLER_COUNT = 2
+
+_SHA1_SIZE = 20
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class MovieError(Exception):
+    """Invalid movie"""
+    pass
+
+
+class MovieWriter(object):
+    """Streams the controller states of each frame to a movie file"""
+
+    def __init__(self, file_name, bios_sha1=None, cartridge_sha1=None):
+        """Initialization
+
+        The SHA-1 (hex digest) of the ROM images the movie is recorded
+        with are stored in the movie so replays can check them.
+        """
+
+        self._file = open(file_name, 'wb')
+
+        self._file.write(MOVIE_MAGIC)
+        self._file.write(struct.pack('<H', MOVIE_VERSION))
+        self._file.write(_sha1_bytes(bios_sha1))
+        self._file.write(_sha1_bytes(cartridge_sha1))
+
+        self._previous = (RELEASED,) * CONTROLLER_COUNT
+
+        # frames written since the last record
+        self._pending = 0
+
+        self.frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_frame(self, states):
+        """Add the controller states of the next frame"""
+
+        if states != self._previous:
+
+            mask = 0
+            deltas = bytearray()
+
+            for i in range(CONTROLLER_COUNT):
+
+                delta = states[i] ^ self._previous[i]
+
+                if delta:
+                    mask |= (1 << i)
+                    deltas += struct.pack('<H', delta)
+
+            self._file.write(_varint(self._pending) + bytearray([mask]) + deltas)
+
+            self._previous = tuple(states)
+
+            self._pending = 0
+
+        self._pending += 1
+
+        self.frames += 1
+
+    def close(self):
+        """Write the end of the movie and close the file"""
+
+        if self._file is not None:
+
+            self._file.write(_varint(self._pending) + bytearray([0]))
+
+            self._file.close()
+
+            self._file = None
+
+
+class MovieReader(object):
+    """Reads the controller states of each frame from a movie file"""
+
+    def __init__(self, file_name):
+        """Initialization"""
+
+        with open(file_name, 'rb') as f:
+            data = f.read()
+
+        header_size = len(MOVIE_MAGIC) + 2 + (2 * _SHA1_SIZE)
+
+        if (len(data) < header_size) or (data[:len(MOVIE_MAGIC)] != MOVIE_MAGIC):
+            raise MovieError('Not a movie: {0}'.format(file_name))
+
+        version, = struct.unpack_from('<H', data, len(MOVIE_MAGIC))
+
+        if version != MOVIE_VERSION:
+            raise MovieError('Unsupported movie version {0}'.format(version))
+
+        position = len(MOVIE_MAGIC) + 2
+
+        self.bios_sha1 = _sha1_hex(data[position:position + _SHA1_SIZE])
+        position += _SHA1_SIZE
+
+        self.cartridge_sha1 = _sha1_hex(data[position:position + _SHA1_SIZE])
+        position += _SHA1_SIZE
+
+        self._data = data
+        self._start = position
+
+        # count the frames
+        self.frames = sum(count for count, states in self._records())
+
+    def __iter__(self):
+        """Generate the controller states of each frame"""
+
+        for count, states in self._records():
+            for i in range(count):
+                yield states
+
+    def _records(self):
+        """Generate the runs of frames: frame count and controller states"""
+
+        data = self._data
+        position = self._start
+
+        states = (RELEASED,) * CONTROLLER_COUNT
+
+        while True:
+
+            skip, position = _read_varint(data, position)
+
+            if position >= len(data):
+                raise MovieError('Truncated movie')
+
+            mask = bytearray(data[position:position + 1])[0]
+            position += 1
+
+            # the frames before this record keep the previous states
+            if skip:
+                yield (skip, states)
+
+            if not mask:
+                return
+
+            states = list(states)
+
+            for i in range(CONTROLLER_COUNT):
+
+                if mask & (1 << i):
+
+                    delta, = struct.unpack_from('<H', data, position)
+                    position += 2
+
+                    states[i] ^= delta
+
+            states = tuple(states)
+
+
+class InputRecorder(object):
+    """Records the controller input of a machine into a movie file"""
+
+    def __init__(self, machine, file_name):
+        """Initialization, recording starts with the next frame"""
+
+        cartridge_sha1 = None
+
+        if machine.cartridge is not None:
+            cartridge_sha1 = machine.cartridge.image.sha1
+
+        self._machine = machine
+
+        self._writer = MovieWriter(file_name, machine.bios.sha1, cartridge_sha1)
+
+        machine.add_frame_listener(self._frame_end)
+
+    def _frame_end(self, machine):
+        """Record the input the frame ran with"""
+        self._writer.write_frame(tuple(c.state for c in machine.controllers))
+
+    def close(self):
+        """Stop recording"""
+
+        if self._writer is not None:
+
+            self._machine.remove_frame_listener(self._frame_end)
+
+            self._writer.close()
+
+            self._writer = None
+
+    @property
+    def frames(self):
+        """Number of frames recorded"""
+        return self._writer.frames if self._writer else 0
+
+
+class InputPlayer(object):
+    """Feeds the controller input of a movie file into a machine.
+
+    The input of each frame is applied once, at the start of the frame.
+    Replay ends, and the player detaches itself from the machine, when the
+    movie has no more frames.
+    """
+
+    def __init__(self, machine, file_name, check_roms=True):
+        """Initialization, replay starts with the next frame"""
+
+        reader = MovieReader(file_name)
+
+        if check_roms:
+            _check_rom(reader.bios_sha1, machine.bios.sha1, 'BIOS')
+
+            if machine.cartridge is not None:
+                _check_rom(reader.cartridge_sha1, machine.cartridge.image.sha1,
+                           'cartridge')
+
+        self._machine = machine
+        self._frames = iter(reader)
+
+        self.frames = reader.frames
+
+        # frames of the movie that have not completed yet
+        self.remaining = reader.frames
+
+        if self.remaining:
+
+            self._apply()
+
+            machine.add_frame_listener(self._frame_end)
+
+    def _frame_end(self, machine):
+        """Apply the input of the next frame"""
+
+        self.remaining -= 1
+
+        if self.remaining:
+            self._apply()
+        else:
+            machine.remove_frame_listener(self._frame_end)
+
+    def _apply(self):
+        """Apply the input of the next frame to the controllers"""
+
+        states = next(self._frames)
+
+        for controller, state in zip(self._machine.controllers, states):
+            controller.state = state
+
+    @property
+    def done(self):
+        """Flag used to indicate that every frame of the movie has run"""
+        return self.remaining == 0
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def _varint(value):
+    """Encode an unsigned integer as a variable length integer"""
+
+    output = bytearray()
+
+    while value >= 0x80:
+        output.append((value & 0x7F) | 0x80)
+        value >>= 7
+
+    output.append(value)
+
+    return output
+
+
+def _read_varint(data, position):
+    """Decode a variable length integer, returns it and the position
+       after it"""
+
+    value = 0
+    shift = 0
+
+    while True:
+
+        if position >= len(data):
+            raise MovieError('Truncated movie')
+
+        byte = bytearray(data[position:position + 1])[0]
+        position += 1
+
+        value |= (byte & 0x7F) << shift
+        shift += 7
+
+        if not (byte & 0x80):
+            return value, position
+
+
+def _sha1_bytes(sha1):
+    """Binary form of a SHA-1 hex digest, zeros when there is none"""
+
+    if not sha1:
+        return b'\x00' * _SHA1_SIZE
+
+    return binascii.unhexlify(sha1)
+
+
+def _sha1_hex(data):
+    """Hex digest form of a binary SHA-1, None when it is all zeros"""
+
+    if data == b'\x00' * _SHA1_SIZE:
+        return None
+
+    return binascii.hexlify(data).decode('ascii')
+
+
+def _check_rom(recorded, actual, description):
+    """Warn if a movie was not recorded with the ROM it is replayed with"""
+
+    if recorded and (recorded != actual):
+        _logger.warning("Movie was recorded with a different %s", description)
@@ -0,0 +1,184 @@
+"""Real-time pacing of a Colecovision machine
+
+The pacer runs a machine one frame at a time and sleeps until each frame
+is due, so the machine runs at the NTSC frame rate without keeping a core
+busy.  When the machine falls behind, rendering (but not emulation) is
+skipped until it catches up.
+
+The pace can also follow the fill level of an audio buffer: when a
+callable returning the fill level (0.0 empty to 1.0 full) is given, the
+frame period is stretched while the buffer is fuller than its target and
+shortened while it is emptier, so audio neither underruns nor lags.
+"""
+
+import logging
+import time
+
+from colecovision.machine import FRAME_RATE
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+DEFAULT_MAX_SKIP = 4
+
+# sleeps are cut short by this much and the rest of the wait is done in
+# short sleeps, as sleeps tend to overshoot
+SLEEP_MARGIN = 0.002
+SLEEP_SPIN   = 0.0002
+
+# change of the frame period per unit of audio buffer fill error, and the
+# largest change
+AUDIO_GAIN      = 0.1
+AUDIO_MAX_SCALE = 0.05
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class Pacer(object):
+    """Runs a machine in real time.
+
+    At most max_skip frames in a row are run without rendering; a machine
+    further behind than that gives up catching up and continues from the
+    current time.
+    """
+
+    def __init__(self, machine, frame_rate=FRAME_RATE, max_skip=DEFAULT_MAX_SKIP,
+                 audio_fill=None, audio_target=0.5,
+                 clock=time.perf_counter, sleep=time.sleep):
+        """Initialization"""
+
+        self._machine = machine
+
+        self.period = 1.0 / frame_rate
+        self.max_skip = max_skip
+
+        self.audio_fill = audio_fill
+        self.audio_target = audio_target
+
+        self._clock = clock
+        self._sleep = sleep
+
+        # time the next frame is due, None until running
+        self._deadline = None
+
+        self._skipped = 0
+
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        """Reset the frame counts and slack"""
+
+        # frames run and frames whose rendering was skipped
+        self.frames = 0
+        self.dropped = 0
+
+        # total time left before the deadline of each frame (negative when
+        # late)
+        self._slack = 0.0
+
+    @property
+    def average_slack(self):
+        """Average time, in seconds, left before each frame was due"""
+        return (self._slack / self.frames) if self.frames else 0.0
+
+    def run(self, frames=None):
+        """Run the given number of frames, or until the machine is stopped.
+
+        Returns the number of frames completed.
+        """
+
+        completed = 0
+
+        while (frames is None) or (completed < frames):
+
+            if not self.run_frame():
+                break
+
+            completed += 1
+
+        return completed
+
+    def run_frame(self):
+        """Run a frame and wait until the next one is due.
+
+        Returns False if the machine was stopped.
+        """
+
+        now = self._clock()
+
+        if self._deadline is None:
+            self._deadline = now
+
+        # render unless behind, but never skip more than max_skip in a row
+        render = (now <= self._deadline) or (self._skipped >= self.max_skip)
+
+        self._machine.vdp.render_enabled = render
+
+        try:
+            completed = self._machine.run_frame()
+        finally:
+            self._machine.vdp.render_enabled = True
+
+        if not completed:
+            return False
+
+        if render:
+            self._skipped = 0
+        else:
+            self._skipped += 1
+            self.dropped += 1
+
+        self.frames += 1
+
+        self._deadline += self._frame_period()
+
+        slack = self._deadline - self._clock()
+
+        self._slack += slack
+
+        if slack > 0:
+
+            self._wait(self._deadline)
+
+        elif -slack > self.period * self.max_skip:
+
+            # too far behind to catch up
+            self._deadline = self._clock()
+
+        return True
+
+    def _frame_period(self):
+        """Period of the next frame, adjusted to the audio buffer fill"""
+
+        if self.audio_fill is None:
+            return self.period
+
+        error = min(1.0, max(0.0, self.audio_fill())) - self.audio_target
+
+        scale = min(AUDIO_MAX_SCALE, max(-AUDIO_MAX_SCALE, AUDIO_GAIN * error))
+
+        return self.period * (1.0 + scale)
+
+    def _wait(self, deadline):
+        """Sleep until the deadline"""
+
+        remaining = deadline - self._clock()
+
+        if remaining > SLEEP_MARGIN:
+            self._sleep(remaining - SLEEP_MARGIN)
+
+        remaining = deadline - self._clock()
+
+        while remaining > 0:
+            self._sleep(min(remaining, SLEEP_SPIN))
+            remaining = deadline - self._clock()
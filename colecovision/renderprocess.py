@@ -0,0 +1,278 @@
+"""Off-thread rendering of the VDP frames
+
+Rendering a frame in the emulation thread serialises CPU and video work.
+With a RenderProcess attached to a VDP, the vertical blank only copies the
+VRAM and the registers into a slot of a shared memory double buffer
+(multiprocessing.shared_memory) and a separate render process draws the
+frame while the CPU carries on with the next one:
+
+    renderer = RenderProcess(machine.vdp)
+    machine.run_frames(600)
+    renderer.close()
+
+The render process renders with the same VDP code, its tile row cache
+invalidated from the VRAM bytes that changed between the snapshots, so the
+frames are identical to those rendered in the emulation thread.  They are
+given to the frame sinks of the VDP in order, by the emulation thread, as
+they complete: a frame is delivered at a later vertical blank or at the
+latest by flush(), with what the sinks captured (FrameSinkInterface.capture)
+at its own vertical blank.  The emulation only waits for the render process
+when both slots are still being rendered.
+"""
+
+import collections
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+
+from colecovision.video import FRAME_SIZE, REGISTER_COUNT, VDP, VRAM_SIZE
+from colecovision.video import TILE_CACHE_WRITE_LIMIT, submit_frame
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+# Number of slots in the shared memory, a frame is copied into one while the
+# other is rendered
+SLOT_COUNT = 2
+
+# Slot layout: VRAM snapshot, register snapshot and the rendered frame
+_VRAM_OFFSET     = 0
+_REGISTER_OFFSET = _VRAM_OFFSET + VRAM_SIZE
+_FRAME_OFFSET    = _REGISTER_OFFSET + REGISTER_COUNT
+_SLOT_SIZE       = _FRAME_OFFSET + FRAME_SIZE
+
+# VRAM snapshots are compared in blocks of this many bytes, only the bytes
+# of the blocks that differ are compared one at a time
+_COMPARE_BLOCK_SIZE = 64
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class RenderError(Exception):
+    """The render process failed"""
+    pass
+
+
+class RenderProcess(object):
+    """Renders the frames of a VDP (colecovision.video) in another
+    process"""
+
+    def __init__(self, vdp, context=None):
+        """Initialization, the render process is started and attached to the
+        VDP.  context is the multiprocessing context (start method) of the
+        process, the default one when None."""
+
+        context = context or multiprocessing.get_context()
+
+        self._vdp = vdp
+
+        self._memory = shared_memory.SharedMemory(create=True,
+                                                  size=SLOT_COUNT * _SLOT_SIZE)
+
+        self._connection, child_connection = context.Pipe()
+
+        self._process = context.Process(target=_render_loop,
+                                        args=(child_connection, self._memory.name),
+                                        name='RenderProcess')
+        self._process.daemon = True
+        self._process.start()
+
+        child_connection.close()
+
+        # slots free to copy a frame into, and the slots being rendered
+        # with the (sink, captured) pairs of their frame, in frame order
+        self._free = collections.deque(range(SLOT_COUNT))
+        self._pending = collections.deque()
+
+        # frames submitted and delivered to the sinks
+        self.submitted = 0
+        self.delivered = 0
+
+        vdp.renderer = self
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'RenderProcess({0!r})'.format(self._vdp)
+
+    def submit(self, vdp, captures):
+        """Copy the VRAM and the registers of the VDP, at its vertical
+        blank, for the render process to render.  The frame is given to
+        the sinks of the (sink, captured) pairs of captures."""
+
+        self._deliver(wait=not self._free)
+
+        slot = self._free.popleft()
+
+        base = slot * _SLOT_SIZE
+
+        buffer = self._memory.buf
+
+        buffer[base + _VRAM_OFFSET:base + _REGISTER_OFFSET] = vdp.vram.read_block(0, VRAM_SIZE)
+        buffer[base + _REGISTER_OFFSET:base + _FRAME_OFFSET] = vdp.register
+
+        self._connection.send(slot)
+
+        self._pending.append((slot, captures))
+
+        self.submitted += 1
+
+    def flush(self):
+        """Wait for the frames being rendered and deliver them"""
+
+        while self._pending:
+            self._deliver(wait=True)
+
+    def close(self):
+        """Deliver the last frames, stop the render process and detach it
+        from the VDP"""
+
+        if self._process is None:
+            return
+
+        try:
+            self.flush()
+        finally:
+
+            if self._vdp.renderer is self:
+                self._vdp.renderer = None
+
+            try:
+                self._connection.send(None)
+            except OSError:
+                pass
+
+            self._process.join()
+
+            self._connection.close()
+
+            self._memory.close()
+            self._memory.unlink()
+
+            self._process = None
+
+    def _deliver(self, wait):
+        """Give the frames that are rendered to their sinks, in order.  With
+        wait, at least the oldest frame is waited for."""
+
+        while self._pending and (wait or self._connection.poll()):
+
+            wait = False
+
+            try:
+                slot, error = self._connection.recv()
+            except (EOFError, OSError):
+                raise RenderError('Render process ended')
+
+            expected, captures = self._pending.popleft()
+
+            assert(slot == expected)
+
+            # the frame is copied out before the slot is reused
+            base = slot * _SLOT_SIZE + _FRAME_OFFSET
+
+            framebuffer = bytes(self._memory.buf[base:base + FRAME_SIZE])
+
+            self._free.append(slot)
+
+            if error is not None:
+                raise RenderError(error)
+
+            submit_frame(framebuffer, captures)
+
+            self.delivered += 1
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def _changed_addresses(previous, vram):
+    """Addresses at which two VRAM snapshots differ, None when there is no
+    previous snapshot or more than the tile row cache tracks"""
+
+    if previous is None:
+        return None
+
+    changed = set()
+
+    for block in range(0, VRAM_SIZE, _COMPARE_BLOCK_SIZE):
+
+        end = block + _COMPARE_BLOCK_SIZE
+
+        if previous[block:end] != vram[block:end]:
+
+            changed.update(address for address in range(block, end)
+                           if previous[address] != vram[address])
+
+            if len(changed) > TILE_CACHE_WRITE_LIMIT:
+                return None
+
+    return changed
+
+
+def _render_loop(connection, memory_name):
+    """Render process: render the slots received until None is received,
+    answering (slot, error) for each"""
+
+    memory = shared_memory.SharedMemory(name=memory_name)
+
+    vdp = VDP()
+
+    previous = None
+
+    try:
+
+        while True:
+
+            try:
+                slot = connection.recv()
+            except EOFError:
+                break
+
+            if slot is None:
+                break
+
+            base = slot * _SLOT_SIZE
+
+            try:
+
+                vram = bytes(memory.buf[base + _VRAM_OFFSET:base + _REGISTER_OFFSET])
+
+                # the VRAM bytes written since the last frame, as the VDP
+                # of the emulation would have recorded them
+                written = _changed_addresses(previous, vram)
+
+                vdp.vram.write_block(0, vram)
+                vdp.vram.written = written
+
+                vdp.register[:] = memory.buf[base + _REGISTER_OFFSET:base + _FRAME_OFFSET]
+
+                memory.buf[base + _FRAME_OFFSET:base + _SLOT_SIZE] = vdp.render()
+
+                previous = vram
+
+                connection.send((slot, None))
+
+            except Exception as e:
+
+                _logger.exception("Rendering failed")
+
+                # the rows cached may not match any snapshot
+                previous = None
+
+                connection.send((slot, '{0}: {1}'.format(type(e).__name__, e)))
+
+    finally:
+
+        memory.close()
+
+        connection.close()
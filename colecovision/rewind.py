@@ -0,0 +1,240 @@
+"""Rewind buffer for the Colecovision
+
+The buffer captures the machine state at the end of every frame.  Every
+keyframe interval a full (packed) state is stored; the frames in between
+are stored as the XOR of their packed state with the packed state of the
+previous frame, with the runs of unchanged (zero) bytes removed.  Frames
+only change a few bytes of RAM, VRAM and the registers, so a delta is a
+small fraction of the size of a state.
+
+The frames are kept in groups that start with a keyframe.  When the
+buffer exceeds its memory budget the oldest group is dropped.
+"""
+
+import collections
+import logging
+import re
+import struct
+
+from colecovision import state
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+DEFAULT_KEYFRAME_INTERVAL = 60
+DEFAULT_MAX_BYTES         = 8 * 1024 * 1024
+
+# runs of changed bytes in the XOR of two states
+_CHANGED = re.compile(b'[^\x00]+')
+
+# offset and length of a run in a delta
+_RUN_HEADER = struct.Struct('<II')
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class _Group(object):
+    """Keyframe and the deltas of the frames that follow it"""
+
+    def __init__(self, frame, keyframe):
+        """Initialization"""
+
+        self.frame = frame
+        self.keyframe = keyframe
+        self.deltas = []
+
+        self.size = len(keyframe)
+
+
+class RewindBuffer(object):
+    """Ring of machine states, captured at the end of every frame"""
+
+    def __init__(self, machine, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        """Initialization, capture starts at the end of the next frame"""
+
+        if keyframe_interval < 1:
+            raise ValueError('Invalid keyframe interval {0}'.format(keyframe_interval))
+
+        self._machine = machine
+
+        self.keyframe_interval = keyframe_interval
+        self.max_bytes = max_bytes
+
+        self._groups = collections.deque()
+
+        # packed state of the last frame captured
+        self._previous = None
+
+        self._size = 0
+
+        machine.add_frame_listener(self._frame_end)
+
+    def __len__(self):
+        """Number of frames that can be restored"""
+        return sum(1 + len(group.deltas) for group in self._groups)
+
+    def close(self):
+        """Stop capturing frames"""
+        self._machine.remove_frame_listener(self._frame_end)
+
+    def clear(self):
+        """Remove every frame"""
+
+        self._groups.clear()
+
+        self._previous = None
+
+        self._size = 0
+
+    def capture(self):
+        """Capture the current state of the machine"""
+
+        current = state.pack(self._machine.save_state())
+
+        group = self._groups[-1] if self._groups else None
+
+        if ((group is None) or
+            (len(group.deltas) + 1 >= self.keyframe_interval) or
+            (len(current) != len(self._previous))):
+
+            group = _Group(self._machine.frame, current)
+
+            self._groups.append(group)
+
+            self._size += group.size
+
+        else:
+
+            delta = _delta(self._previous, current)
+
+            group.deltas.append(delta)
+            group.size += len(delta)
+
+            self._size += len(delta)
+
+        self._previous = current
+
+        # the newest group is always kept
+        while (self._size > self.max_bytes) and (len(self._groups) > 1):
+            self._size -= self._groups.popleft().size
+
+    def rewind(self, frames=1):
+        """Restore the state captured the given number of frames before the
+        last one captured (0 restores the last one).
+
+        The frames captured after the restored one are discarded.  Returns
+        False if there are not enough frames in the buffer.
+        """
+
+        if (frames < 0) or (frames >= len(self)):
+            return False
+
+        # drop the frames after the one restored, a group is dropped
+        # entirely when its keyframe is after it
+        while frames:
+
+            group = self._groups[-1]
+
+            if not group.deltas:
+
+                self._size -= self._groups.pop().size
+
+            else:
+
+                delta = group.deltas.pop()
+
+                group.size -= len(delta)
+
+                self._size -= len(delta)
+
+            frames -= 1
+
+        group = self._groups[-1]
+
+        current = group.keyframe
+
+        for delta in group.deltas:
+            current = _apply(current, delta)
+
+        self._machine.load_state(state.unpack(current))
+
+        self._previous = current
+
+        return True
+
+    @property
+    def oldest(self):
+        """Frame number of the oldest frame in the buffer, None if empty"""
+        return self._groups[0].frame if self._groups else None
+
+    @property
+    def newest(self):
+        """Frame number of the newest frame in the buffer, None if empty"""
+
+        if not self._groups:
+            return None
+
+        return self._groups[-1].frame + len(self._groups[-1].deltas)
+
+    @property
+    def size(self):
+        """Number of bytes of state held by the buffer"""
+        return self._size
+
+    def _frame_end(self, machine):
+        """Capture the state at the end of a frame"""
+        self.capture()
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def _delta(previous, current):
+    """Delta from one packed state to another of the same size: the
+    offset, length and XOR of each run of changed bytes"""
+
+    size = len(current)
+
+    changed = (int.from_bytes(previous, 'little') ^
+               int.from_bytes(current, 'little')).to_bytes(size, 'little')
+
+    output = bytearray()
+
+    for match in _CHANGED.finditer(changed):
+
+        run = match.group()
+
+        output += _RUN_HEADER.pack(match.start(), len(run))
+        output += run
+
+    return bytes(output)
+
+
+def _apply(previous, delta):
+    """Apply a delta to a packed state, returns the new packed state"""
+
+    patch = bytearray(len(previous))
+
+    position = 0
+
+    while position < len(delta):
+
+        offset, length = _RUN_HEADER.unpack_from(delta, position)
+        position += _RUN_HEADER.size
+
+        patch[offset:offset + length] = delta[position:position + length]
+        position += length
+
+    return (int.from_bytes(previous, 'little') ^
+            int.from_bytes(patch, 'little')).to_bytes(len(previous), 'little')
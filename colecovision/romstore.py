@@ -0,0 +1,307 @@
+"""Process-wide store of ROM images for the Colecovision
+
+ROM images are loaded once, de-duplicated by the SHA-1 of their contents
+and shared (read-only) by every memory region created from them.  The
+metadata needed to set up a machine is computed when an image is first
+loaded so that later lookups are a dictionary access.
+"""
+
+import collections
+import hashlib
+import logging
+import os
+
+from colecovision.header import CARTRIDGE_ADDRESS, CARTRIDGE_SLOT_SIZE
+from colecovision.header import CARTRIDGE_MAGIC, CARTRIDGE_MAGIC_SKIP
+from colecovision.header import CARTRIDGE_START_GAME
+from colecovision.memory import ROM_MemoryRegion
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Module Data
+#-----------------------------------------------------------------------------
+
+# store shared by the whole process, see default_store()
+_default_store = None
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class ROMImage(object):
+    """Read-only ROM image and its metadata"""
+
+    def __init__(self, data, name=None, sha1=None):
+        """Initialization"""
+
+        self._data = bytes(data)
+        self._name = name
+        self._sha1 = sha1 or hashlib.sha1(self._data).hexdigest()
+        self._size = len(self._data)
+
+        # cartridge header
+        self._magic = None
+        self._entry_point = None
+
+        if self._size >= (CARTRIDGE_START_GAME - CARTRIDGE_ADDRESS + 2):
+
+            data = bytearray(self._data[:CARTRIDGE_START_GAME - CARTRIDGE_ADDRESS + 2])
+
+            magic = (data[0] << 8) | data[1]
+
+            if magic in CARTRIDGE_MAGIC:
+
+                self._magic = magic
+
+                start = CARTRIDGE_START_GAME - CARTRIDGE_ADDRESS
+
+                self._entry_point = data[start] | (data[start + 1] << 8)
+
+        # number of copies of the image seen in the cartridge slot, images
+        # are mirrored in blocks of the next power of two of their size
+        block_size = 1
+
+        while block_size < self._size:
+            block_size <<= 1
+
+        self._mirroring = max(1, CARTRIDGE_SLOT_SIZE // block_size)
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'ROMImage(<{0} bytes>, name={1!r})'.format(self._size, self._name)
+
+    def region(self, file_name=None):
+        """Create a ROM memory region that shares the image contents"""
+        return ROM_MemoryRegion(file_name or self._name, self._data)
+
+    @property
+    def data(self):
+        """Read-only view of the image contents"""
+        return memoryview(self._data)
+
+    @property
+    def name(self):
+        """Name (file name) the image was first loaded from"""
+        return self._name
+
+    @property
+    def sha1(self):
+        """SHA-1 (hex digest) of the image contents"""
+        return self._sha1
+
+    @property
+    def size(self):
+        """Size of the image in bytes"""
+        return self._size
+
+    @property
+    def magic(self):
+        """Cartridge header magic number, None if the header is not valid"""
+        return self._magic
+
+    @property
+    def skip_title(self):
+        """Flag used to indicate that the BIOS title screen is skipped"""
+        return self._magic == CARTRIDGE_MAGIC_SKIP
+
+    @property
+    def entry_point(self):
+        """Address at which the game starts, None without a valid header"""
+        return self._entry_point
+
+    @property
+    def mirroring(self):
+        """Number of times the image repeats in the cartridge slot"""
+        return self._mirroring
+
+
+class ROMStore(object):
+    """Cache of ROM images keyed by the SHA-1 of their contents.
+
+    Images are evicted least recently used first once the total size of
+    the cached images exceeds max_bytes (no limit when None).  Evicting an
+    image only drops the store's reference, memory regions created from it
+    keep working.
+    """
+
+    def __init__(self, max_bytes=None):
+        """Initialization"""
+
+        self._max_bytes = max_bytes
+
+        # SHA-1 -> image, in least recently used order
+        self._images = collections.OrderedDict()
+
+        # absolute path -> (file status key, SHA-1)
+        self._paths = {}
+
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'ROMStore(max_bytes={0})'.format(self._max_bytes)
+
+    def __len__(self):
+        """Number of images in the store"""
+        return len(self._images)
+
+    def __contains__(self, sha1):
+        """Check if an image is in the store"""
+        return sha1 in self._images
+
+    def load(self, file_name):
+        """Get the image of a ROM file, reading it only if it is not
+           already in the store or the file has changed"""
+
+        path = os.path.abspath(file_name)
+
+        stat_info = os.stat(path)
+
+        status = (stat_info.st_size, stat_info.st_mtime_ns, stat_info.st_ino)
+
+        known = self._paths.get(path)
+
+        if (known is not None) and (known[0] == status):
+
+            image = self._images.get(known[1])
+
+            if image is not None:
+
+                self.hits += 1
+
+                self._images.move_to_end(image.sha1)
+
+                return image
+
+        with open(path, 'rb') as rom_file:
+            data = rom_file.read()
+
+        image = self.add(data, file_name)
+
+        self._paths[path] = (status, image.sha1)
+
+        return image
+
+    def add(self, data, name=None):
+        """Get the image with the given contents, adding it to the store
+           if there is no image with the same contents yet"""
+
+        data = bytes(data)
+
+        sha1 = hashlib.sha1(data).hexdigest()
+
+        image = self._images.get(sha1)
+
+        if image is not None:
+
+            self.hits += 1
+
+            self._images.move_to_end(sha1)
+
+            return image
+
+        self.misses += 1
+
+        if _logger.isEnabledFor(logging.INFO):
+            _logger.info("Loading ROM image %s (%d bytes)", name, len(data))
+
+        image = ROMImage(data, name, sha1)
+
+        self._images[sha1] = image
+
+        self._bytes += image.size
+
+        self._evict()
+
+        return image
+
+    def get(self, sha1):
+        """Get the image with the given SHA-1, None if not in the store"""
+
+        image = self._images.get(sha1)
+
+        if image is not None:
+            self._images.move_to_end(sha1)
+
+        return image
+
+    def region(self, file_name):
+        """Create a ROM memory region for a ROM file"""
+        return self.load(file_name).region(file_name)
+
+    def discard(self, sha1):
+        """Remove an image from the store"""
+
+        image = self._images.pop(sha1, None)
+
+        if image is not None:
+
+            self._bytes -= image.size
+
+            for path in [p for p, known in self._paths.items() if known[1] == sha1]:
+                del self._paths[path]
+
+    def clear(self):
+        """Remove every image from the store"""
+
+        self._images.clear()
+        self._paths.clear()
+        self._bytes = 0
+
+    @property
+    def max_bytes(self):
+        """Maximum total size of the images kept in the store"""
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._evict()
+
+    @property
+    def size(self):
+        """Total size of the images in the store, in bytes"""
+        return self._bytes
+
+    def _evict(self):
+        """Evict the least recently used images until within budget,
+           the most recently used image is always kept"""
+
+        if self._max_bytes is None:
+            return
+
+        while (self._bytes > self._max_bytes) and (len(self._images) > 1):
+
+            sha1 = next(iter(self._images))
+
+            _logger.debug("Evicting ROM image %s", sha1)
+
+            self.discard(sha1)
+
+            self.evictions += 1
+
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def default_store():
+    """Store shared by the whole process"""
+
+    global _default_store
+
+    if _default_store is None:
+        _default_store = ROMStore()
+
+    return _default_store
@@ -0,0 +1,153 @@
+"""Import and startup benchmark
+
+Batch jobs run many short-lived machines, for which importing the package
+and constructing the machine can cost more than the emulation itself.  The
+benchmark measures, in fresh interpreters:
+
+    import          importing colecovision.machine
+    construct       constructing a Machine (ROM loading, memory map, devices)
+    first step      executing the first instruction
+    total           launching the interpreter to the end of the first
+                    instruction (time-to-first-instruction)
+
+and, in the current interpreter, the cost of constructing a machine against
+cloning one from a template (Machine.clone()).  The times reported are the
+median of several runs:
+
+    python -m colecovision.startup bios.rom --cartridge game.rom
+"""
+
+import argparse
+import collections
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+DEFAULT_RUNS  = 5
+DEFAULT_COUNT = 100
+
+# Directory containing the colecovision package
+_PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter, prints the wall clock time at its start, after
+# the import, after the construction and after the first instruction
+_PROBE = '''
+import sys, time
+start = time.time()
+from colecovision.machine import Machine
+imported = time.time()
+machine = Machine(sys.argv[1], sys.argv[2] or None)
+constructed = time.time()
+machine.step()
+print(start, imported, constructed, time.time())
+'''
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+# Startup times of a fresh interpreter, in seconds
+StartupResult = collections.namedtuple('StartupResult',
+    'import_time construct_time first_step_time time_to_first_instruction')
+
+# Time to construct and to clone a machine, in seconds per machine
+ConstructionResult = collections.namedtuple('ConstructionResult',
+                                            'construct_time clone_time')
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def measure_startup(bios_file, cartridge_file=None, runs=DEFAULT_RUNS):
+    """Median startup times (StartupResult) of runs fresh interpreters"""
+
+    environment = dict(os.environ)
+
+    environment['PYTHONPATH'] = os.pathsep.join(
+        [_PACKAGE_PATH] + [p for p in [environment.get('PYTHONPATH')] if p])
+
+    results = []
+
+    for i in range(runs):
+
+        launched = time.time()
+
+        output = subprocess.check_output(
+            [sys.executable, '-c', _PROBE, bios_file, cartridge_file or ''],
+            env=environment, universal_newlines=True)
+
+        start, imported, constructed, stepped = (float(value) for value in output.split())
+
+        results.append(StartupResult(imported - start, constructed - imported,
+                                     stepped - constructed, stepped - launched))
+
+    return StartupResult(*(statistics.median(times) for times in zip(*results)))
+
+
+def measure_construction(bios_file, cartridge_file=None, count=DEFAULT_COUNT):
+    """Time (ConstructionResult) to construct and to clone a machine,
+    averaged over count machines"""
+
+    from colecovision.machine import Machine
+
+    template = Machine(bios_file, cartridge_file)
+
+    start = time.perf_counter()
+
+    for i in range(count):
+        Machine(bios_file, cartridge_file)
+
+    constructed = time.perf_counter()
+
+    for i in range(count):
+        template.clone()
+
+    cloned = time.perf_counter()
+
+    return ConstructionResult((constructed - start) / count, (cloned - constructed) / count)
+
+
+def main(args=None):
+    """Run the benchmark and print its results"""
+
+    parser = argparse.ArgumentParser(description='Measure import and startup times')
+
+    parser.add_argument('bios', help='BIOS ROM image')
+    parser.add_argument('--cartridge', help='cartridge ROM image')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS,
+                        help='fresh interpreters to start')
+    parser.add_argument('--count', type=int, default=DEFAULT_COUNT,
+                        help='machines to construct and clone')
+
+    args = parser.parse_args(args)
+
+    startup = measure_startup(args.bios, args.cartridge, args.runs)
+
+    construction = measure_construction(args.bios, args.cartridge, args.count)
+
+    for name, seconds in (('import', startup.import_time),
+                          ('construct', startup.construct_time),
+                          ('first step', startup.first_step_time),
+                          ('total', startup.time_to_first_instruction),
+                          ('construct (warm)', construction.construct_time),
+                          ('clone (warm)', construction.clone_time)):
+        print('{0:<18}{1:10.3f} ms'.format(name, seconds * 1000.0))
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
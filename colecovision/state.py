@@ -0,0 +1,175 @@
+"""Machine state serialization for the Colecovision
+
+A machine state is a dictionary whose keys are strings and whose values are
+integers, bytes or nested dictionaries of the same form.  States are packed
+into a compact, deterministic binary form so that identical states always
+produce identical bytes.
+"""
+
+import os
+import struct
+import tempfile
+
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+# the version is incremented whenever the format or the contents of the
+# machine state change, states of other versions are rejected
+STATE_MAGIC   = b'CVST'
+STATE_VERSION = 3
+
+_TYPE_INT   = 0
+_TYPE_BYTES = 1
+_TYPE_DICT  = 2
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class StateError(Exception):
+    """Invalid or incompatible machine state"""
+    pass
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def _pack_dict(state, output):
+    """Append the packed form of a state dictionary to output"""
+
+    output += struct.pack('<I', len(state))
+
+    for key in sorted(state):
+
+        name = key.encode('utf-8')
+
+        output += struct.pack('<B', len(name))
+        output += name
+
+        value = state[key]
+
+        if isinstance(value, dict):
+
+            output += struct.pack('<B', _TYPE_DICT)
+
+            _pack_dict(value, output)
+
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+
+            value = bytes(value)
+
+            output += struct.pack('<BI', _TYPE_BYTES, len(value))
+            output += value
+
+        else:
+
+            output += struct.pack('<Bq', _TYPE_INT, value)
+
+
+def _unpack_dict(data, position):
+    """Unpack a state dictionary, returns it and the position after it"""
+
+    state = {}
+
+    count, = struct.unpack_from('<I', data, position)
+    position += 4
+
+    for i in range(count):
+
+        length, = struct.unpack_from('<B', data, position)
+        position += 1
+
+        key = bytes(data[position:position + length]).decode('utf-8')
+        position += length
+
+        value_type, = struct.unpack_from('<B', data, position)
+        position += 1
+
+        if value_type == _TYPE_DICT:
+
+            value, position = _unpack_dict(data, position)
+
+        elif value_type == _TYPE_BYTES:
+
+            length, = struct.unpack_from('<I', data, position)
+            position += 4
+
+            value = bytes(data[position:position + length])
+            position += length
+
+        elif value_type == _TYPE_INT:
+
+            value, = struct.unpack_from('<q', data, position)
+            position += 8
+
+        else:
+            raise StateError('Unknown value type {0}'.format(value_type))
+
+        state[key] = value
+
+    return state, position
+
+
+def pack(state):
+    """Pack a machine state into bytes"""
+
+    output = bytearray(STATE_MAGIC)
+    output += struct.pack('<H', STATE_VERSION)
+
+    _pack_dict(state, output)
+
+    return bytes(output)
+
+
+def unpack(data):
+    """Unpack a machine state packed by pack()"""
+
+    if bytes(data[:len(STATE_MAGIC)]) != STATE_MAGIC:
+        raise StateError('Not a machine state')
+
+    version, = struct.unpack_from('<H', data, len(STATE_MAGIC))
+
+    if version != STATE_VERSION:
+        raise StateError('Unsupported machine state version {0}'.format(version))
+
+    try:
+        state, position = _unpack_dict(data, len(STATE_MAGIC) + 2)
+    except struct.error:
+        raise StateError('Truncated machine state')
+
+    return state
+
+
+def save(state, file_name):
+    """Save a machine state to a file.
+
+    The state is written to a temporary file that is then renamed, so a
+    partially written state is never seen by readers of file_name.
+    """
+
+    directory = os.path.dirname(os.path.abspath(file_name))
+
+    handle, temp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+    try:
+
+        with os.fdopen(handle, 'wb') as f:
+            f.write(pack(state))
+
+        os.replace(temp_name, file_name)
+
+    except:
+
+        os.remove(temp_name)
+
+        raise
+
+
+def load(file_name):
+    """Load a machine state from a file"""
+
+    with open(file_name, 'rb') as f:
+        return unpack(f.read())
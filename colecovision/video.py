@@ -0,0 +1,708 @@
+"""Video subsystem (TMS9918A video display processor) for the Colecovision"""
+
+import logging
+
+from colecovision.memory import RAM_MemoryRegion
+
+
+#-----------------------------------------------------------------------------
+# Logging Configuration
+#-----------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+#-----------------------------------------------------------------------------
+# Constants
+#-----------------------------------------------------------------------------
+
+VRAM_SIZE      = 0x4000
+REGISTER_COUNT = 8
+
+# display
+SCREEN_WIDTH  = 256
+SCREEN_HEIGHT = 192
+FRAME_SIZE    = SCREEN_WIDTH * SCREEN_HEIGHT
+
+# colours, the RGB values of the palette are in PALETTE
+COLOUR_TRANSPARENT = 0
+COLOUR_BLACK       = 1
+PALETTE = ((0x00, 0x00, 0x00), (0x00, 0x00, 0x00), (0x21, 0xC8, 0x42),
+           (0x5E, 0xDC, 0x78), (0x54, 0x55, 0xED), (0x7D, 0x76, 0xFC),
+           (0xD4, 0x52, 0x4D), (0x42, 0xEB, 0xF5), (0xFC, 0x55, 0x54),
+           (0xFF, 0x79, 0x78), (0xD4, 0xC1, 0x54), (0xE6, 0xCE, 0x80),
+           (0x21, 0xB0, 0x3B), (0xC9, 0x5B, 0xBA), (0xCC, 0xCC, 0xCC),
+           (0xFF, 0xFF, 0xFF))
+
+# status register flags
+STATUS_INTERRUPT       = 0x80   # frame (vertical blank) flag
+STATUS_FIFTH_SPRITE    = 0x40
+STATUS_COINCIDENCE     = 0x20
+STATUS_FIFTH_SPRITE_ID = 0x1F
+
+# register 0 flags
+REGISTER_0_MODE_2     = 0x02    # graphics II
+REGISTER_0_EXTERNAL   = 0x01
+
+# register 1 flags
+REGISTER_1_16K        = 0x80
+REGISTER_1_BLANK      = 0x40    # display enabled when set
+REGISTER_1_INTERRUPT  = 0x20    # interrupt enable
+REGISTER_1_MODE_1     = 0x10    # text
+REGISTER_1_MODE_3     = 0x08    # multicolour
+REGISTER_1_SIZE       = 0x02
+REGISTER_1_MAGNIFY    = 0x01
+
+# sprites
+SPRITE_COUNT          = 32
+SPRITES_PER_LINE      = 4
+SPRITE_END            = 0xD0    # vertical position ending the sprite list
+SPRITE_EARLY_CLOCK    = 0x80    # colour flag moving the sprite 32 pixels left
+
+# Expanded pattern rows of the tile modes are cached, keyed by pattern
+# name and line: (name << 3) | line, with up to 768 names in graphics II
+TILE_ROW_COUNT = 768 * 8
+
+# more VRAM writes than this between renders clear the whole row cache
+# rather than the rows written
+TILE_CACHE_WRITE_LIMIT = 0x800
+
+# tile modes
+_MODE_GRAPHICS_1 = 0
+_MODE_GRAPHICS_2 = 1
+_MODE_TEXT       = 2
+_MODE_MULTICOLOUR = 3
+
+# tile row lookups made by rendering a frame in each tile mode
+_TILE_LOOKUPS = {_MODE_GRAPHICS_1 : SCREEN_HEIGHT * 32,
+                 _MODE_GRAPHICS_2 : SCREEN_HEIGHT * 32,
+                 _MODE_TEXT       : SCREEN_HEIGHT * 40}
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+
+class _VideoRAM(RAM_MemoryRegion):
+    """VRAM, recording the addresses written since the expanded pattern
+    rows were last brought up to date"""
+
+    def __init__(self, size_bytes):
+        """Initialization"""
+
+        RAM_MemoryRegion.__init__(self, size_bytes)
+
+        # addresses written, None when all of the VRAM may have changed
+        self.written = None
+
+    def write(self, address, value):
+        """Write a value to memory"""
+
+        RAM_MemoryRegion.write(self, address, value)
+
+        if self.written is not None:
+            self.written.add(address)
+
+    def write_block(self, address, data):
+        """Write a sequence of values to memory, starting at address"""
+
+        RAM_MemoryRegion.write_block(self, address, data)
+
+        self.written = None
+
+
+class VDP(object):
+    """TMS9918A video display processor.
+
+    The CPU accesses the VDP through two ports: the data port reads and
+    writes VRAM at the current VRAM address, the control port sets the VRAM
+    address, writes the registers and reads the status register.
+    """
+
+    def __init__(self):
+        """Initialization"""
+
+        self.vram = _VideoRAM(VRAM_SIZE)
+
+        self.register = bytearray(REGISTER_COUNT)
+
+        self.status = 0
+
+        # called on each rising edge of the interrupt output
+        self.interrupt_handler = None
+
+        self._interrupt_output = False
+
+        # frame sinks, given each frame rendered at the vertical blank
+        # while rendering is enabled
+        self._sinks = []
+
+        self.render_enabled = True
+
+        # renders the frames of the sinks instead of the VDP when set, see
+        # colecovision.renderprocess
+        self.renderer = None
+
+        # VRAM address, read-ahead buffer and the first byte written to the
+        # control port (None when no byte is latched)
+        self._address = 0
+        self._buffer = 0
+        self._latch = None
+
+        # expanded pattern rows of the tile mode (see TILE_ROW_COUNT), and
+        # the mode and registers they were expanded with
+        self._tile_rows = [None] * TILE_ROW_COUNT
+        self._tile_context = None
+
+        # tile row lookups made by the renders, and the rows they had to
+        # expand (cache misses)
+        self.tile_lookups = 0
+        self.tile_misses = 0
+
+    def __repr__(self):
+        """Returns a string to re-create the object"""
+        return 'VDP()'
+
+    def reset(self):
+        """Resets the VDP"""
+
+        for i in range(REGISTER_COUNT):
+            self.register[i] = 0
+
+        self.status = 0
+        self._address = 0
+        self._buffer = 0
+        self._latch = None
+
+        self._interrupt_output = False
+
+    def write_control(self, value):
+        """Write a value to the control port"""
+
+        if self._latch is None:
+
+            self._latch = value
+
+            return
+
+        latch = self._latch
+
+        self._latch = None
+
+        if value & 0x80:
+
+            # register write
+            self.register[value & 0x07] = latch
+
+            # enabling the interrupt with the frame flag set raises it
+            self._update_interrupt()
+
+        else:
+
+            self._address = ((value & 0x3F) << 8) | latch
+
+            # read setup, pre-fetch the first value
+            if not (value & 0x40):
+                self._read_ahead()
+
+    def read_status(self):
+        """Read the status register, which clears its flags"""
+
+        value = self.status
+
+        self.status &= STATUS_FIFTH_SPRITE_ID
+
+        self._latch = None
+
+        self._interrupt_output = False
+
+        return value
+
+    def write_data(self, value):
+        """Write a value to VRAM at the current VRAM address"""
+
+        self._latch = None
+
+        self.vram.write(self._address, value)
+
+        self._buffer = value
+
+        self._address = (self._address + 1) & (VRAM_SIZE - 1)
+
+    def read_data(self):
+        """Read the value at the current VRAM address"""
+
+        self._latch = None
+
+        value = self._buffer
+
+        self._read_ahead()
+
+        return value
+
+    def vblank(self):
+        """Start of the vertical blank, sets the frame flag.
+
+        When frame sinks are attached and rendering is enabled the frame is
+        rendered and given to each of them, by the renderer when one is
+        set.  What each sink records with the frame is captured now, as the
+        renderer may deliver the frame at a later vertical blank.
+        """
+
+        self.status |= STATUS_INTERRUPT
+
+        self._update_interrupt()
+
+        if self._sinks and self.render_enabled:
+
+            captures = [(sink, sink.capture()) for sink in self._sinks]
+
+            if self.renderer is not None:
+
+                self.renderer.submit(self, captures)
+
+                return
+
+            submit_frame(self.render(), captures)
+
+    def add_sink(self, sink):
+        """Give every frame to sink.submit(framebuffer), see
+        colecovision.framesink"""
+        self._sinks.append(sink)
+
+    def remove_sink(self, sink):
+        """Stop giving frames to a sink"""
+        self._sinks.remove(sink)
+
+    def render(self):
+        """Render the display.
+
+        Returns the framebuffer: SCREEN_HEIGHT rows of SCREEN_WIDTH colour
+        indices (see PALETTE), as bytes.  Transparent pixels show the
+        backdrop colour.  Rendering does not change the state of the VDP.
+        """
+
+        register = self.register
+
+        backdrop = register[7] & 0x0F
+
+        framebuffer = bytearray([backdrop]) * FRAME_SIZE
+
+        if not (register[1] & REGISTER_1_BLANK):
+            return bytes(framebuffer)
+
+        vram = self.vram.read_block(0, VRAM_SIZE)
+
+        if register[1] & REGISTER_1_MODE_1:
+            mode = _MODE_TEXT
+        elif register[1] & REGISTER_1_MODE_3:
+            mode = _MODE_MULTICOLOUR
+        elif register[0] & REGISTER_0_MODE_2:
+            mode = _MODE_GRAPHICS_2
+        else:
+            mode = _MODE_GRAPHICS_1
+
+        if mode == _MODE_MULTICOLOUR:
+            _render_multicolour(vram, register, framebuffer)
+        else:
+
+            rows = self._update_tile_rows(mode)
+
+            missing = rows.count(None)
+
+            if mode == _MODE_TEXT:
+                _render_text(vram, register, framebuffer, rows)
+            elif mode == _MODE_GRAPHICS_2:
+                _render_graphics_2(vram, register, framebuffer, rows)
+            else:
+                _render_graphics_1(vram, register, framebuffer, rows)
+
+            # counted once per frame: the rows filled in were misses
+            self.tile_lookups += _TILE_LOOKUPS[mode]
+            self.tile_misses += missing - rows.count(None)
+
+        if mode != _MODE_TEXT:
+            _render_sprites(vram, register, framebuffer)
+
+        return bytes(framebuffer)
+
+    def _update_tile_rows(self, mode):
+        """Drop the expanded pattern rows whose pattern or colour bytes were
+        written since the last render, returns the rows"""
+
+        register = self.register
+
+        # the name table (register 2) does not change the rows
+        context = (mode, register[3], register[4], register[7])
+
+        written = self.vram.written
+
+        self.vram.written = set()
+
+        if ((context != self._tile_context) or (written is None) or
+            (len(written) > TILE_CACHE_WRITE_LIMIT)):
+
+            self._tile_context = context
+            self._tile_rows = [None] * TILE_ROW_COUNT
+
+            return self._tile_rows
+
+        rows = self._tile_rows
+
+        if mode == _MODE_GRAPHICS_2:
+
+            patterns = (register[4] & 0x04) << 11
+            colours = (register[3] & 0x80) << 6
+
+            if ((register[4] & 0x03) != 0x03) or ((register[3] & 0x7F) != 0x7F):
+
+                # tables mirrored by the masks: several names share bytes
+                for address in written:
+                    if ((0 <= address - patterns < TILE_ROW_COUNT) or
+                        (0 <= address - colours < TILE_ROW_COUNT)):
+                        self._tile_rows = [None] * TILE_ROW_COUNT
+                        return self._tile_rows
+
+                return rows
+
+            for address in written:
+
+                if 0 <= address - patterns < TILE_ROW_COUNT:
+                    rows[address - patterns] = None
+
+                if 0 <= address - colours < TILE_ROW_COUNT:
+                    rows[address - colours] = None
+
+        else:
+
+            patterns = (register[4] & 0x07) << 11
+            colours = register[3] << 6
+
+            for address in written:
+
+                if 0 <= address - patterns < 0x800:
+                    rows[address - patterns] = None
+
+                # a graphics I colour covers 8 names
+                if (mode == _MODE_GRAPHICS_1) and (0 <= address - colours < 32):
+                    first = (address - colours) << 6
+                    rows[first:first + 64] = [None] * 64
+
+        return rows
+
+    @property
+    def interrupt(self):
+        """State of the interrupt output (connected to the CPU NMI)"""
+        return bool((self.status & STATUS_INTERRUPT) and
+                    (self.register[1] & REGISTER_1_INTERRUPT))
+
+    def save_state(self):
+        """VDP state, as a dictionary"""
+
+        return {"vram"     : bytes(self.vram.read_block(0, VRAM_SIZE)),
+                "register" : bytes(self.register),
+                "status"   : self.status,
+                "address"  : self._address,
+                "buffer"   : self._buffer,
+                "latch"    : -1 if self._latch is None else self._latch}
+
+    def load_state(self, state):
+        """Restore a VDP state saved by save_state()"""
+
+        self.vram.write_block(0, state["vram"])
+
+        self.register[:] = state["register"]
+
+        self.status = state["status"]
+        self._address = state["address"]
+        self._buffer = state["buffer"]
+        self._latch = None if state["latch"] < 0 else state["latch"]
+
+        self._interrupt_output = self.interrupt
+
+    def _update_interrupt(self):
+        """Follow the interrupt output, calling the interrupt handler on a
+        rising edge"""
+
+        output = self.interrupt
+
+        if output and not self._interrupt_output and self.interrupt_handler:
+            self.interrupt_handler()
+
+        self._interrupt_output = output
+
+    def _read_ahead(self):
+        """Fill the read-ahead buffer and move to the next VRAM address"""
+
+        self._buffer = self.vram.read(self._address)
+
+        self._address = (self._address + 1) & (VRAM_SIZE - 1)
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+def submit_frame(framebuffer, captures):
+    """Give a frame to the sinks of (sink, captured) pairs, captured being
+    what sink.capture() returned at the vertical blank of the frame, passed
+    to the sink with the frame unless None"""
+
+    for sink, captured in captures:
+
+        if captured is None:
+            sink.submit(framebuffer)
+        else:
+            sink.submit(framebuffer, captured)
+
+
+def _pattern_bits():
+    """Bits of each pattern byte, a byte per bit from the leftmost"""
+    return tuple(bytes((pattern >> (7 - bit)) & 0x01 for bit in range(8))
+                 for pattern in range(256))
+
+
+def _colour_pairs():
+    """Translation tables of the bits of a pattern to the colours of each
+    colour byte: 0 to the background, 1 to the foreground"""
+    return tuple(bytes([colour & 0x0F, colour >> 4]) + bytes(254)
+                 for colour in range(256))
+
+
+def _opaque_colours():
+    """Colour bytes with the transparent colours replaced by the backdrop,
+    for each backdrop"""
+
+    tables = []
+
+    for backdrop in range(16):
+
+        nibble = [n or backdrop for n in range(16)]
+
+        tables.append(bytes((nibble[colour >> 4] << 4) | nibble[colour & 0x0F]
+                            for colour in range(256)))
+
+    return tuple(tables)
+
+# the expansion is split in two stages: pattern byte to bits, then bits to
+# colours, instead of a table of each pattern in each colour pair (512K)
+_PATTERN_BITS = _pattern_bits()
+_COLOUR_PAIRS = _colour_pairs()
+_OPAQUE       = _opaque_colours()
+
+
+def _expand(pattern, colour, opaque):
+    """The 8 pixels of a pattern byte in a colour byte, transparent pixels
+    replaced through the opaque table (an _OPAQUE entry)"""
+    return _PATTERN_BITS[pattern].translate(_COLOUR_PAIRS[opaque[colour]])
+
+
+def _render_graphics_1(vram, register, framebuffer, rows):
+    """Render graphics I mode: 32x24 patterns, one colour pair per group of
+    8 patterns"""
+
+    names = (register[2] & 0x0F) << 10
+    colours = register[3] << 6
+    patterns = (register[4] & 0x07) << 11
+
+    opaque = _OPAQUE[register[7] & 0x0F]
+
+    for y in range(SCREEN_HEIGHT):
+
+        row = names + ((y >> 3) << 5)
+        line = y & 7
+
+        position = y * SCREEN_WIDTH
+
+        for column in range(32):
+
+            key = (vram[row + column] << 3) | line
+
+            pixels = rows[key]
+
+            if pixels is None:
+                pixels = rows[key] = _expand(vram[patterns + key],
+                                             vram[colours + (key >> 6)], opaque)
+
+            framebuffer[position:position + 8] = pixels
+
+            position += 8
+
+
+def _render_graphics_2(vram, register, framebuffer, rows):
+    """Render graphics II mode: 32x24 patterns, a pattern and colour table
+    for each third of the screen and a colour pair per pattern line"""
+
+    names = (register[2] & 0x0F) << 10
+    colours = (register[3] & 0x80) << 6
+    colour_mask = ((register[3] & 0x7F) << 3) | 0x07
+    patterns = (register[4] & 0x04) << 11
+    pattern_mask = ((register[4] & 0x03) << 8) | 0xFF
+
+    opaque = _OPAQUE[register[7] & 0x0F]
+
+    for y in range(SCREEN_HEIGHT):
+
+        row = names + ((y >> 3) << 5)
+        third = (y >> 6) << 8
+        line = y & 7
+
+        position = y * SCREEN_WIDTH
+
+        for column in range(32):
+
+            name = third | vram[row + column]
+
+            key = (name << 3) | line
+
+            pixels = rows[key]
+
+            if pixels is None:
+                pixels = rows[key] = _expand(
+                    vram[patterns + ((name & pattern_mask) << 3) + line],
+                    vram[colours + ((name & colour_mask) << 3) + line], opaque)
+
+            framebuffer[position:position + 8] = pixels
+
+            position += 8
+
+
+def _render_text(vram, register, framebuffer, rows):
+    """Render text mode: 40x24 patterns, 6 pixels wide, in the colours of
+    register 7, with an 8 pixel border"""
+
+    names = (register[2] & 0x0F) << 10
+    patterns = (register[4] & 0x07) << 11
+
+    colour = register[7]
+
+    opaque = _OPAQUE[register[7] & 0x0F]
+
+    for y in range(SCREEN_HEIGHT):
+
+        row = names + ((y >> 3) * 40)
+        line = y & 7
+
+        position = (y * SCREEN_WIDTH) + 8
+
+        for column in range(40):
+
+            key = (vram[row + column] << 3) | line
+
+            pixels = rows[key]
+
+            if pixels is None:
+                pixels = rows[key] = _expand(vram[patterns + key], colour, opaque)[:6]
+
+            framebuffer[position:position + 6] = pixels
+
+            position += 6
+
+
+def _render_multicolour(vram, register, framebuffer):
+    """Render multicolour mode: 64x48 blocks of 4x4 pixels, the colours of
+    a pattern are in the pattern table"""
+
+    names = (register[2] & 0x0F) << 10
+    patterns = (register[4] & 0x07) << 11
+
+    opaque = _OPAQUE[register[7] & 0x0F]
+
+    for y in range(SCREEN_HEIGHT):
+
+        row = names + ((y >> 3) << 5)
+        line = ((y >> 3) & 3) << 1 | ((y >> 2) & 1)
+
+        position = y * SCREEN_WIDTH
+
+        for column in range(32):
+
+            colour = vram[patterns + (vram[row + column] << 3) + line]
+
+            framebuffer[position:position + 8] = _expand(0xF0, colour, opaque)
+
+            position += 8
+
+
+def _render_sprites(vram, register, framebuffer):
+    """Render the sprites, lower numbered sprites have priority and only
+    the first SPRITES_PER_LINE sprites of a line are shown"""
+
+    attributes = (register[5] & 0x7F) << 7
+    patterns = (register[6] & 0x07) << 11
+
+    large = bool(register[1] & REGISTER_1_SIZE)
+    magnify = 2 if (register[1] & REGISTER_1_MAGNIFY) else 1
+
+    size = (16 if large else 8) * magnify
+
+    # visible sprites: (y, x, pattern address, colour)
+    sprites = []
+
+    for number in range(SPRITE_COUNT):
+
+        address = attributes + (number << 2)
+
+        y = vram[address]
+
+        if y == SPRITE_END:
+            break
+
+        # the sprite is shown from the line after y, lines above 0xE0 are
+        # above the top of the screen
+        y = (y + 1) & 0xFF
+
+        if y > 0xE0:
+            y -= 0x100
+
+        x = vram[address + 1]
+        pattern = vram[address + 2]
+        colour = vram[address + 3]
+
+        if colour & SPRITE_EARLY_CLOCK:
+            x -= 32
+
+        if large:
+            pattern &= 0xFC
+
+        sprites.append((y, x, patterns + (pattern << 3), colour & 0x0F))
+
+    for y in range(SCREEN_HEIGHT):
+
+        shown = 0
+
+        # pixels already drawn by a sprite of a higher priority
+        drawn = set()
+
+        for top, left, pattern, colour in sprites:
+
+            line = y - top
+
+            if (line < 0) or (line >= size):
+                continue
+
+            shown += 1
+
+            if shown > SPRITES_PER_LINE:
+                break
+
+            if colour == COLOUR_TRANSPARENT:
+                continue
+
+            line //= magnify
+
+            bits = vram[pattern + line] << 8
+
+            if large:
+                bits |= vram[pattern + 16 + line]
+
+            for pixel in range(size):
+
+                x = left + pixel
+
+                if (x < 0) or (x >= SCREEN_WIDTH) or (x in drawn):
+                    continue
+
+                if bits & (0x8000 >> (pixel // magnify)):
+
+                    framebuffer[(y * SCREEN_WIDTH) + x] = colour
+
+                    drawn.add(x)
@@ -0,0 +1,69 @@
+"""Test machine shared by the unit tests
+
+The machine runs a BIOS made of LD B,B instructions.  The BIOS, and any
+other file a test needs, is written to a temporary directory that is
+removed when the fixture is closed.
+"""
+
+import os
+import tempfile
+from colecovision import machine
+from colecovision.machine import Machine
+from colecovision.memory import RAM_MemoryRegion
+
+
+class MachineFixture(object):
+    """Temporary directory holding the test BIOS, and the machines built
+    from it"""
+
+    def __init__(self):
+        """Initialization, the BIOS file is written"""
+
+        self._directory = tempfile.TemporaryDirectory()
+
+        self.bios_file = self.write('bios.rom', b'\x40' * machine.BIOS_SIZE)
+
+    def path(self, name):
+        """Path of a file in the temporary directory"""
+        return os.path.join(self._directory.name, name)
+
+    def write(self, name, data):
+        """Write a file in the temporary directory, returns its path"""
+
+        file_name = self.path(name)
+
+        with open(file_name, 'wb') as f:
+            f.write(data)
+
+        return file_name
+
+    def create(self, cartridge_file=None, expansion=False, free_running=False):
+        """Machine running the test BIOS.
+
+        With expansion, 16 KB of RAM made of LD A,A instructions follows
+        the BIOS so a frame can run without leaving mapped memory.  With
+        free_running, the cartridge slot and RAM are also made of LD A,A
+        instructions so the machine can run for any number of frames.
+        """
+
+        test_machine = Machine(self.bios_file, cartridge_file)
+
+        if expansion or free_running:
+
+            region = RAM_MemoryRegion(0x4000)
+            region.write_block(0, b'\x7f' * 0x4000)
+            test_machine.memsys.map_region(region, 0x2000)
+
+        if free_running:
+
+            region = RAM_MemoryRegion(0x8000)
+            region.write_block(0, b'\x7f' * 0x8000)
+            test_machine.memsys.map_region(region, 0x8000)
+
+            test_machine.ram.write_block(0, b'\x7f' * machine.RAM_SIZE)
+
+        return test_machine
+
+    def close(self):
+        """Remove the temporary directory"""
+        self._directory.cleanup()
@@ -0,0 +1,152 @@
+"""Unit tests for the cartridge mappers"""
+
+import unittest
+from colecovision import cartridge
+from colecovision.cartridge import MapperType, MegaCartMapper, StandardMapper
+from colecovision.memory import MemorySystem
+from colecovision.romstore import ROMImage
+
+
+def banked_rom(bank_count, bank_size=cartridge.MEGACART_BANK_SIZE):
+    """ROM image where every byte of a bank holds the bank number"""
+
+    data = bytearray()
+
+    for bank in range(bank_count):
+        data.extend(bytearray([bank]) * bank_size)
+
+    header = len(data) - bank_size
+
+    data[header:header + 2] = bytearray([0xAA, 0x55])
+
+    return ROMImage(data)
+
+
+class TestMapperDetection(unittest.TestCase):
+
+    def test_standard(self):
+        """verify images that fit the slot use the standard mapper"""
+
+        image = ROMImage(bytearray([0xAA, 0x55]) + bytearray(0x5FFE))
+
+        self.assertEqual(cartridge.detect(image), MapperType.STANDARD)
+        self.assertIsInstance(cartridge.create(image), StandardMapper)
+
+    def test_megacart(self):
+        """verify images larger than the slot use the MegaCart mapper"""
+
+        image = banked_rom(8)
+
+        self.assertEqual(cartridge.detect(image), MapperType.MEGACART)
+        self.assertIsInstance(cartridge.create(image), MegaCartMapper)
+
+
+class TestMegaCart(unittest.TestCase):
+
+    def setUp(self):
+
+        self.memsys = MemorySystem()
+
+        self.mapper = cartridge.create(banked_rom(8))
+
+        self.mapper.insert(self.memsys)
+
+    def test_fixed_bank(self):
+        """verify the last bank is fixed at the start of the slot"""
+
+        self.assertEqual(self.memsys.read(0x8000), 0xAA)
+        self.assertEqual(self.memsys.read(0x8002), 7)
+        self.assertEqual(self.memsys.read(0xBFFF), 7)
+
+    def test_bank_switch(self):
+        """verify reading a trigger address switches the window bank"""
+
+        self.assertEqual(self.memsys.read(0xC000), 0)
+
+        self.memsys.read(0xFFC3)
+
+        self.assertEqual(self.mapper.bank, 3)
+        self.assertEqual(self.memsys.read(0xC000), 3)
+        self.assertEqual(self.memsys.read(0xFFBF), 3)
+        self.assertEqual(self.memsys.read(0xBFFF), 7)
+
+        # bank numbers wrap at the number of banks in the ROM
+        self.memsys.fetch(0xFFC9)
+
+        self.assertEqual(self.memsys.read(0xE000), 1)
+
+    def test_only_window_remapped(self):
+        """verify a bank switch only touches the pages of the window"""
+
+        before = list(self.memsys._page)
+
+        self.memsys.read(0xFFC5)
+
+        changed = [page for page in range(self.memsys.page_count)
+                   if self.memsys._page[page] is not before[page]]
+
+        self.assertEqual(changed, list(range(self.memsys.page(0xC000),
+                                             self.memsys.page_count)))
+
+    def test_remove(self):
+        """verify the cartridge can be removed"""
+
+        self.mapper.remove()
+
+        with self.assertRaises(RuntimeError):
+            self.memsys.read(0x8000)
+
+        with self.assertRaises(RuntimeError):
+            self.memsys.read(0xC000)
+
+    def test_clone(self):
+        """verify a clone of the mapper switches the banks of the cloned
+        memory system only"""
+
+        self.memsys.read(0xFFC2)
+
+        memsys = self.memsys.clone()
+
+        mapper = self.mapper.clone(memsys)
+
+        self.assertEqual(mapper.bank, 2)
+        self.assertEqual(memsys.read(0xC000), 2)
+
+        memsys.read(0xFFC5)
+
+        self.assertEqual(memsys.read(0xC000), 5)
+        self.assertEqual(self.memsys.read(0xC000), 2)
+        self.assertEqual(self.mapper.bank, 2)
+
+
+class TestStandardCartridge(unittest.TestCase):
+
+    def test_mirroring(self):
+        """verify an 8 KB cartridge is mirrored across the slot"""
+
+        data = bytearray(range(256)) * 32
+
+        memsys = MemorySystem()
+
+        cartridge.create(ROMImage(data)).insert(memsys)
+
+        for mirror in range(0x8000, 0x10000, 0x2000):
+            self.assertEqual(memsys.read(mirror + 0x1234), 0x34)
+
+    def test_open_bus(self):
+        """verify a cartridge whose length is not a power of two reads as an
+        open bus past its end"""
+
+        data = bytearray(range(256)) * 0x21
+
+        memsys = MemorySystem()
+
+        cartridge.create(ROMImage(data)).insert(memsys)
+
+        # the 8448 bytes are mirrored every 16 KB
+        for mirror in (0x8000, 0xC000):
+            self.assertEqual(memsys.read(mirror + 0x20FE), 0xfe)
+            self.assertEqual(memsys.fetch(mirror + 0x2100), 0xff)
+            self.assertEqual(memsys.read(mirror + 0x3FFF), 0xff)
+
+        self.assertEqual(memsys.read_block(0xA0FE, 4), bytearray([0xfe, 0xff, 0xff, 0xff]))
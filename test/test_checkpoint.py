@@ -0,0 +1,77 @@
+"""Unit tests for the frame hash checkpoints"""
+
+import unittest
+from colecovision import checkpoint
+from colecovision.checkpoint import CheckpointRecorder, Checkpoint
+from machine_fixture import MachineFixture
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+
+        self.fixture = MachineFixture()
+
+        self.log_files = [self.fixture.path('test_1.chk'),
+                          self.fixture.path('test_2.chk')]
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def record(self, file_name, frames, change=None):
+        """Record a run, writing a RAM byte at the start of frame change"""
+
+        test_machine = self.fixture.create(expansion=True)
+
+        recorder = CheckpointRecorder(test_machine, file_name)
+
+        for frame in range(frames):
+
+            if frame == change:
+                test_machine.ram.write(0x10, 0x42)
+
+            test_machine.cpu.register["PC"].value = 0
+
+            test_machine.run_frame()
+
+        recorder.close()
+
+        return recorder.frames
+
+    def test_identical(self):
+        """verify identical runs have identical logs"""
+
+        self.assertEqual(self.record(self.log_files[0], 3), 3)
+        self.record(self.log_files[1], 3)
+
+        reference = checkpoint.read_log(self.log_files[0])
+
+        self.assertEqual([c.frame for c in reference], [1, 2, 3])
+        self.assertEqual(checkpoint.first_divergence(
+            reference, checkpoint.read_log(self.log_files[1])), None)
+
+        self.assertEqual(checkpoint.main(self.log_files), 0)
+
+    def test_divergence(self):
+        """verify the first divergent frame is found"""
+
+        self.record(self.log_files[0], 3)
+        self.record(self.log_files[1], 3, change=1)
+
+        expected, actual = checkpoint.first_divergence(
+            checkpoint.read_log(self.log_files[0]),
+            checkpoint.read_log(self.log_files[1]))
+
+        self.assertEqual(expected.frame, 2)
+        self.assertEqual(expected.frame_hash, actual.frame_hash)
+        self.assertNotEqual(expected.ram_hash, actual.ram_hash)
+
+        self.assertEqual(checkpoint.main(self.log_files), 1)
+
+    def test_shorter_run(self):
+        """verify a run that ends early diverges at its end"""
+
+        reference = [Checkpoint(1, 1, 1), Checkpoint(2, 2, 2)]
+
+        self.assertEqual(checkpoint.first_divergence(reference, reference[:1]),
+                         (reference[1], None))
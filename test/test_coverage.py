@@ -0,0 +1,151 @@
+"""Unit tests for the code and data coverage"""
+
+import io
+import os
+import unittest
+from contextlib import redirect_stdout
+from colecovision import coverage
+from colecovision.coverage import Coverage, CoverageError
+from colecovision.cpu.z80 import Z80
+from colecovision.memory import MemorySystem, RAM_MemoryRegion
+
+
+class TestCoverage(unittest.TestCase):
+
+    FILES = ('test_coverage_1.cov', 'test_coverage_2.cov',
+             'test_coverage_merged.cov', 'test_coverage.rom')
+
+    # LD A,(8000H); LD B,A; OR (HL); JP 0000H
+    PROGRAM = [0x3A, 0x00, 0x80, 0x47, 0xB6, 0xC3, 0x00, 0x00]
+
+    def setUp(self):
+
+        self.memsys = MemorySystem()
+
+        self.ram = RAM_MemoryRegion(0x10000)
+
+        self.ram.write_block(0, bytearray(self.PROGRAM))
+
+        self.memsys.map_region(self.ram, 0)
+
+        self.cpu = Z80(self.memsys)
+
+        self.cpu.register["HL"].value = 0x9000
+
+    def tearDown(self):
+
+        for file_name in self.FILES:
+            if os.path.exists(file_name):
+                os.remove(file_name)
+
+    def test_record(self):
+        """verify executed instructions and data reads are recorded, and
+        operand fetches are not"""
+
+        recorded = Coverage()
+
+        recorded.attach(self.cpu)
+
+        for i in range(4):
+            self.cpu.step()
+
+        self.assertEqual(recorded.executed_addresses(), [0x0000, 0x0003, 0x0004, 0x0005])
+
+        self.assertEqual(recorded.summary(), {'executed' : 4, 'read' : 2, 'written' : 0})
+        self.assertEqual(recorded.read[0x8000], 1)
+        self.assertEqual(recorded.read[0x9000], 1)
+
+        recorded.detach()
+
+        self.cpu.step()
+
+        self.assertEqual(recorded.summary()['executed'], 4)
+        self.assertIs(self.cpu.data_memory, self.memsys)
+
+    def test_stack_writes(self):
+        """verify an interrupt push is recorded as a write"""
+
+        recorded = Coverage()
+
+        recorded.attach(self.cpu)
+
+        self.cpu.register["SP"].value = 0xF000
+
+        self.cpu.nmi()
+        self.cpu.step()
+
+        self.assertEqual(recorded.written[0xEFFE], 1)
+        self.assertEqual(recorded.written[0xEFFF], 1)
+
+    def test_merge_files(self):
+        """verify coverage files round trip and merge"""
+
+        first = Coverage()
+        first.executed[0x10] = 1
+        first.written[0x7000] = 1
+
+        second = Coverage()
+        second.executed[0x20] = 1
+        second.read[0x7000] = 1
+
+        first.save(self.FILES[0])
+        second.save(self.FILES[1])
+
+        merged = coverage.merge_files(self.FILES[:2])
+
+        self.assertEqual(merged.executed_addresses(), [0x10, 0x20])
+        self.assertEqual(merged.summary(0x7000, 0x7001),
+                         {'executed' : 0, 'read' : 1, 'written' : 1})
+
+    def test_invalid_file(self):
+        """verify an exception is raised loading a file that is not a
+        coverage file"""
+
+        with open(self.FILES[0], 'wb') as f:
+            f.write(b'CVMV\x01\x00')
+
+        with self.assertRaises(CoverageError):
+            Coverage.load(self.FILES[0])
+
+    def test_listing(self):
+        """verify the listing disassembles executed code and flags it"""
+
+        recorded = Coverage()
+
+        recorded.attach(self.cpu)
+
+        for i in range(4):
+            self.cpu.step()
+
+        # bytes after the JP are never reached
+        data = bytearray(self.PROGRAM) + bytearray(8)
+
+        lines = list(coverage.listing(recorded, data, 0))
+
+        self.assertTrue(lines[0].startswith('X..  0000'))
+        self.assertIn('LD A,($8000)', lines[0])
+        self.assertTrue(lines[-1].startswith('...'))
+
+    def test_main(self):
+        """verify the command line merges and reports"""
+
+        recorded = Coverage()
+        recorded.executed[0x8000] = 1
+        recorded.save(self.FILES[0])
+
+        with open(self.FILES[3], 'wb') as f:
+            f.write(b'\x00' * 0x10)
+
+        output = io.StringIO()
+
+        with redirect_stdout(output):
+            status = coverage.main([self.FILES[0], '--merge', self.FILES[2],
+                                    '--rom', self.FILES[3], '--origin', '0x8000'])
+
+        self.assertEqual(status, 0)
+        self.assertIn('1 instructions executed', output.getvalue())
+        self.assertEqual(Coverage.load(self.FILES[2]).executed[0x8000], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
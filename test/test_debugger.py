@@ -0,0 +1,123 @@
+"""Unit tests for breakpoints and watchpoints"""
+
+import unittest
+from colecovision.cpu.z80 import Z80
+from colecovision.debugger import Debugger, WatchAccess
+from colecovision.memory import MemorySystem, RAM_MemoryRegion
+
+
+class TestDebugger(unittest.TestCase):
+
+    def setUp(self):
+
+        self.memsys = MemorySystem()
+
+        self.memsys.map_region(RAM_MemoryRegion(0x8000), 0x0000)
+
+        self.debugger = Debugger(self.memsys)
+
+        self.triggered = []
+
+    def callback(self, access, address, value):
+        self.triggered.append((access, address, value))
+
+    def test_breakpoint(self):
+        """verify breakpoints trigger on fetches only"""
+
+        self.debugger.set_breakpoint(0x0100, self.callback)
+
+        self.memsys.read(0x0100)
+        self.memsys.fetch(0x0101)
+        self.memsys.fetch(0x0100)
+
+        self.assertEqual(self.triggered, [(WatchAccess.FETCH, 0x0100, 0xff)])
+        self.assertEqual(self.debugger.breakpoints, [0x0100])
+
+    def test_watchpoint(self):
+        """verify read and write watches trigger"""
+
+        self.debugger.set_watchpoint(0x2000, self.callback, read=False)
+        self.debugger.set_watchpoint(0x2001, self.callback)
+
+        self.memsys.write(0x2000, 0x11)
+        self.memsys.read(0x2000)
+        self.memsys.write(0x2001, 0x22)
+        self.memsys.read(0x2001)
+        self.memsys.write(0x2002, 0x33)
+
+        self.assertEqual(self.triggered, [(WatchAccess.WRITE, 0x2000, 0x11),
+                                          (WatchAccess.WRITE, 0x2001, 0x22),
+                                          (WatchAccess.READ, 0x2001, 0x22)])
+        self.assertEqual(self.debugger.watchpoints, [0x2000, 0x2001])
+
+    def test_inspection(self):
+        """verify reading memory for inspection triggers no watch"""
+
+        self.debugger.set_watchpoint(0x2000, self.callback)
+
+        self.memsys.write_block(0x1FFE, bytearray([1, 2, 3, 4]))
+
+        self.triggered = []
+
+        self.assertEqual(self.debugger.peek(0x2000), 3)
+        self.assertEqual(self.debugger.read_block(0x1FFE, 4), bytearray([1, 2, 3, 4]))
+        self.assertEqual(self.memsys.peek_block(0x2000, 2), bytearray([3, 4]))
+
+        self.assertEqual(self.triggered, [])
+
+    def test_prefetch(self):
+        """verify decoding an instruction near a watched address does not
+        trigger the watch, operand bytes do not trigger read watches"""
+
+        cpu = Z80(self.memsys)
+
+        # LD A,A; LD A,A; JP 0000H
+        self.memsys.write_block(0x0100, bytearray([0x7F, 0x7F, 0xC3, 0x00, 0x00]))
+
+        cpu.register['PC'].value = 0x0100
+
+        self.debugger.set_watchpoint(0x0101, self.callback, write=False)
+        self.debugger.set_watchpoint(0x0102, self.callback, write=False)
+        self.debugger.set_watchpoint(0x0103, self.callback, write=False)
+
+        cpu.step()
+
+        self.assertEqual(self.triggered, [])
+
+        cpu.step()
+        cpu.step()
+
+        self.assertEqual(self.triggered, [])
+        self.assertEqual(cpu.register['PC'].value, 0x0000)
+
+    def test_clear(self):
+        """verify cleared watches no longer trigger"""
+
+        self.debugger.set_watchpoint(0x3000, self.callback)
+        self.debugger.set_breakpoint(0x3001, self.callback)
+
+        self.debugger.clear_watchpoint(0x3000)
+
+        self.memsys.write(0x3000, 0x44)
+        self.memsys.fetch(0x3001)
+
+        self.debugger.clear_all()
+
+        self.memsys.fetch(0x3001)
+
+        self.assertEqual(self.triggered, [(WatchAccess.FETCH, 0x3001, 0xff)])
+        self.assertEqual(self.debugger.breakpoints, [])
+
+    def test_unwatched_pages_not_hooked(self):
+        """verify only the page containing the watch is instrumented"""
+
+        self.debugger.set_watchpoint(0x4000, self.callback)
+
+        watched = self.memsys.page(0x4000)
+
+        for page in range(self.memsys.page_count):
+            entry = self.memsys._page[page]
+            if entry is None:
+                continue
+            hooked = type(entry[0]).__name__ == '_HookedRegion'
+            self.assertEqual(hooked, page == watched)
@@ -0,0 +1,117 @@
+"""Unit tests for the remote debug server"""
+
+import json
+import socket
+import threading
+import unittest
+from colecovision.debugger import Debugger
+from colecovision.debugserver import DebugServer
+from machine_fixture import MachineFixture
+
+
+class TestDebugServer(unittest.TestCase):
+
+    def setUp(self):
+
+        self.fixture = MachineFixture()
+
+        self.machine = self.fixture.create(free_running=True)
+
+        self.server = DebugServer(self.machine)
+
+        self.client = socket.create_connection(self.server.address, timeout=10)
+        self.responses = self.client.makefile('rb')
+
+    def tearDown(self):
+
+        self.responses.close()
+        self.client.close()
+
+        self.server.close()
+
+        self.fixture.close()
+
+    def request(self, command, **kwargs):
+        """Send a request, return the response"""
+
+        kwargs['command'] = command
+
+        self.client.sendall(json.dumps(kwargs).encode('utf-8') + b'\n')
+
+        return json.loads(self.responses.readline().decode('utf-8'))
+
+    def test_commands(self):
+        """verify the commands are executed between slices"""
+
+        self.machine.ram.write(0x10, 0x5A)
+
+        watched = []
+
+        debugger = Debugger(self.machine.memsys)
+
+        debugger.set_watchpoint(0x6010, lambda *access: watched.append(access))
+
+        # the emulation thread, paused from the start
+        self.server.paused = True
+
+        emulation = threading.Thread(target=self.server.run)
+        emulation.start()
+
+        try:
+
+            response = self.request('read', address=0x6010, length=2)
+
+            self.assertTrue(response['ok'])
+            self.assertEqual(response['data'][:2], '5a')
+            self.assertEqual(watched, [])
+
+            self.assertTrue(self.request('write', address=0x6020, data='7f')['ok'])
+            self.assertEqual(self.machine.ram.read(0x20), 0x7F)
+
+            response = self.request('step', count=3)
+
+            self.assertEqual(response['registers']['PC'], 3)
+
+            response = self.request('status')
+
+            self.assertTrue(response['paused'])
+            self.assertEqual(response['instructions'], 3)
+
+            counters = self.request('counters')['counters']
+
+            self.assertEqual(counters['machine']['instructions'], 3)
+
+            self.assertFalse(self.request('resume')['paused'])
+
+            self.assertIn('cycles_per_second', self.request('stats'))
+
+            self.assertTrue(self.request('pause')['paused'])
+
+            response = self.request('bogus')
+
+            self.assertFalse(response['ok'])
+            self.assertIn('bogus', response['error'])
+
+        finally:
+
+            self.server.close()
+
+            emulation.join()
+
+    def test_poll(self):
+        """verify commands wait for the emulation thread"""
+
+        results = []
+
+        def client():
+            results.append(self.request('registers'))
+
+        thread = threading.Thread(target=client)
+        thread.start()
+
+        executed = self.server.poll(timeout=10)
+
+        thread.join()
+
+        self.assertEqual(executed, 1)
+        self.assertEqual(results[0]['registers']['PC'], 0)
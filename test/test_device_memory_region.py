@@ -0,0 +1,156 @@
+"""Unit tests for device memory regions"""
+
+import unittest
+from colecovision.memory import DeviceMemoryRegion, MemoryHookInterface
+from colecovision.memory import MemorySystem, RAM_MemoryRegion, PAGE_SIZE
+
+
+class Device(object):
+    """Device recording its accesses, reads return the low byte of the
+    address plus the number of writes"""
+
+    def __init__(self):
+        """Initialization"""
+
+        self.accesses = []
+        self.writes = 0
+
+    def read(self, address):
+        self.accesses.append(('read', address))
+        return (address + self.writes) & 0xFF
+
+    def write(self, address, value):
+        self.accesses.append(('write', address, value))
+        self.writes += 1
+
+
+class Hook(MemoryHookInterface):
+    """Hook recording the addresses read"""
+
+    def __init__(self):
+        self.reads = []
+
+    def fetch_hook(self, address, value):
+        pass
+
+    def read_hook(self, address, value):
+        self.reads.append(address)
+
+    def write_hook(self, address, value):
+        pass
+
+
+class TestDeviceMemoryRegion(unittest.TestCase):
+
+    def setUp(self):
+
+        self.device = Device()
+
+        self.region = DeviceMemoryRegion(PAGE_SIZE, self.device.read, self.device.write)
+
+        self.ram = RAM_MemoryRegion(0x2000)
+
+        self.memsys = MemorySystem()
+
+        self.memsys.map_region(self.ram, 0x0000)
+        self.memsys.map_region(self.region, 0x2000)
+
+    def test_callbacks(self):
+        """verify accesses to the device pages call the callbacks with
+        region addresses, other pages do not"""
+
+        self.assertEqual(self.memsys.read(0x2010), 0x10)
+
+        self.memsys.write(0x2011, 0x42)
+
+        self.memsys.write(0x0010, 0x42)
+        self.assertEqual(self.memsys.read(0x0010), 0x42)
+
+        self.assertEqual(self.device.accesses, [('read', 0x10), ('write', 0x11, 0x42)])
+
+    def test_read_block(self):
+        """verify a block read across RAM and device pages reads the device
+        a value at a time"""
+
+        self.ram.write_block(0x1FFE, bytearray([0xA1, 0xA2]))
+
+        data = self.memsys.read_block(0x1FFE, 4)
+
+        self.assertEqual(data, bytearray([0xA1, 0xA2, 0x00, 0x01]))
+        self.assertEqual(self.device.accesses, [('read', 0), ('read', 1)])
+
+    def test_write_block(self):
+        """verify a block write calls the write callback in address order"""
+
+        self.memsys.write_block(0x1FFF, bytearray([1, 2, 3]))
+
+        self.assertEqual(self.ram.read(0x1FFF), 1)
+        self.assertEqual(self.device.accesses, [('write', 0, 2), ('write', 1, 3)])
+
+    def test_mirror(self):
+        """verify a device smaller than a page is mirrored across it"""
+
+        small = DeviceMemoryRegion(0x10, self.device.read)
+
+        self.memsys.map_region(small, 0x2400, PAGE_SIZE)
+
+        self.assertEqual(self.memsys.read(0x2412), 0x02)
+        self.assertEqual(self.memsys.read_block(0x241E, 4), bytearray([0x0E, 0x0F, 0x00, 0x01]))
+
+    def test_hooked(self):
+        """verify hooks on a device page see the values of the device"""
+
+        hook = Hook()
+
+        self.memsys.add_page_hook(self.memsys.page(0x2000), hook)
+
+        self.assertEqual(self.memsys.read_block(0x2004, 2), bytearray([4, 5]))
+
+        self.assertEqual(hook.reads, [0x2004, 0x2005])
+        self.assertEqual(len(self.device.accesses), 2)
+
+    def test_no_callbacks(self):
+        """verify a device without callbacks reads 0xFF and ignores
+        writes"""
+
+        region = DeviceMemoryRegion(4)
+
+        region.write(0, 0x12)
+
+        self.assertEqual(region.read(0), 0xFF)
+        self.assertEqual(region.read_block(0, 4), bytearray([0xFF] * 4))
+
+    def test_peek(self):
+        """verify peeks call the peek callback, not the read callback, and
+        read as an undriven bus without one"""
+
+        region = DeviceMemoryRegion(4, self.device.read, self.device.write,
+                                    lambda address: 0x40 + address)
+
+        self.memsys.map_region(region, 0x2400)
+
+        self.assertEqual(self.memsys.peek(0x2401), 0x41)
+        self.assertEqual(self.memsys.peek_block(0x2402, 2), bytearray([0x42, 0x43]))
+        self.assertEqual(self.memsys.peek(0x2010), 0xFF)
+
+        self.assertEqual(self.device.accesses, [])
+
+        self.assertEqual(repr(region),
+                         'DeviceMemoryRegion(4, {0!r}, {1!r}, {2!r})'.format(
+                             self.device.read, self.device.write,
+                             region._peek_callback))
+
+    def test_invalid_address(self):
+        """verify an exception is raised accessing outside the region"""
+
+        with self.assertRaises(IndexError):
+            self.region.read(PAGE_SIZE)
+
+        with self.assertRaises(IndexError):
+            self.region.write_block(PAGE_SIZE - 1, bytearray(2))
+
+        self.assertEqual(self.device.accesses, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
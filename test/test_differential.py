@@ -0,0 +1,118 @@
+"""Unit tests for differential testing of Z80 engines"""
+
+import unittest
+from colecovision.cpu.z80 import Z80
+from colecovision.differential import DifferentialRunner, random_inputs
+from machine_fixture import MachineFixture
+
+
+class _BrokenZ80(Z80):
+    """Z80 engine that gets an instruction wrong"""
+
+    # instruction that is wrong and the wrong result: a register name or
+    # a memory address
+    BROKEN_INSTRUCTION = 1234
+    BROKEN_RESULT = "D"
+
+    def step(self):
+
+        cycles = Z80.step(self)
+
+        if self.instructions == self.BROKEN_INSTRUCTION + 1:
+
+            if isinstance(self.BROKEN_RESULT, str):
+                self.register[self.BROKEN_RESULT].value ^= 0x01
+            else:
+                self.memsys.write(self.BROKEN_RESULT, 0x5A)
+
+        return cycles
+
+
+class _BrokenMemoryZ80(_BrokenZ80):
+
+    BROKEN_INSTRUCTION = 77
+    BROKEN_RESULT = 0x6123
+
+
+class TestDifferentialRunner(unittest.TestCase):
+
+    def setUp(self):
+
+        self.fixture = MachineFixture()
+
+        self.runner = None
+
+    def tearDown(self):
+
+        if self.runner is not None:
+            self.runner.close()
+
+        self.fixture.close()
+
+    def create_runner(self, engine):
+
+        reference = self.fixture.create()
+
+        candidate = self.fixture.create()
+        candidate.cpu = engine(candidate.memsys, candidate.io)
+
+        self.runner = DifferentialRunner(reference, candidate, interval=500,
+                                         inputs=random_inputs(1))
+
+        return self.runner
+
+    def test_identical(self):
+        """verify identical engines do not diverge"""
+
+        runner = self.create_runner(Z80)
+
+        self.assertEqual(runner.run(3000), None)
+        self.assertEqual(runner.instructions, 3000)
+
+    def test_register_divergence(self):
+        """verify the first instruction with a wrong register is found"""
+
+        runner = self.create_runner(_BrokenZ80)
+
+        divergence = runner.run(3000)
+
+        self.assertEqual(divergence.instructions, 1234)
+        self.assertEqual(divergence.pc, 1234)
+        self.assertEqual(divergence.differences, ['D 0x0 != 0x1'])
+        self.assertIn('LD B,B', str(divergence))
+
+    def test_memory_divergence(self):
+        """verify a wrong memory write is found"""
+
+        runner = self.create_runner(_BrokenMemoryZ80)
+
+        divergence = runner.run(3000)
+
+        self.assertEqual(divergence.instructions, 77)
+        self.assertEqual(divergence.differences, ['memory page 0x6000'])
+
+    def test_hooked_pages(self):
+        """verify only the writable pages are hooked"""
+
+        runner = self.create_runner(Z80)
+
+        memsys = runner.reference.memsys
+
+        hooked = [page for page in range(memsys.page_count)
+                  if memsys._page_hooks[page]]
+
+        self.assertEqual(hooked, [page for page in range(memsys.page_count)
+                                  if memsys.page_region(page) is runner.reference.ram])
+
+        runner.close()
+        self.runner = None
+
+        self.assertFalse(any(memsys._page_hooks))
+
+    def test_random_inputs(self):
+        """verify random inputs are repeatable"""
+
+        inputs = random_inputs(5)
+
+        self.assertEqual(inputs(10), random_inputs(5)(10))
+        self.assertGreater(len(set(inputs(frame) for frame in range(20))), 1)
@@ -0,0 +1,135 @@
+"""Unit tests for the Z80 disassembler"""
+
+import hashlib
+import os
+import time
+import unittest
+from colecovision.cpu import disasm
+from colecovision.cpu.disasm import Flow
+
+
+ROM_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'rom')
+
+
+class TestDecode(unittest.TestCase):
+
+    def decode(self, data, address=0x0100):
+        return disasm.decode(bytearray(data), 0, address)
+
+    def test_main_op_codes(self):
+        """verify un-prefixed op codes"""
+
+        self.assertEqual(self.decode([0x00]), (1, 'NOP', Flow.NEXT, None))
+        self.assertEqual(self.decode([0x78]), (1, 'LD A,B', Flow.NEXT, None))
+        self.assertEqual(self.decode([0x3E, 0x12]), (2, 'LD A,$12', Flow.NEXT, None))
+        self.assertEqual(self.decode([0x21, 0x34, 0x12]), (3, 'LD HL,$1234', Flow.NEXT, None))
+        self.assertEqual(self.decode([0x76]), (1, 'HALT', Flow.NEXT, None))
+
+    def test_branches(self):
+        """verify branch flow and targets"""
+
+        self.assertEqual(self.decode([0xC3, 0x00, 0x80]), (3, 'JP $8000', Flow.JUMP, 0x8000))
+        self.assertEqual(self.decode([0xCD, 0x00, 0x80]), (3, 'CALL $8000', Flow.BRANCH, 0x8000))
+        self.assertEqual(self.decode([0x20, 0xFE]), (2, 'JR NZ,$0100', Flow.BRANCH, 0x0100))
+        self.assertEqual(self.decode([0xC9]), (1, 'RET', Flow.STOP, None))
+        self.assertEqual(self.decode([0xFF]), (1, 'RST $38', Flow.BRANCH, 0x38))
+
+    def test_prefixed_op_codes(self):
+        """verify CB, ED, DD, FD and DDCB prefixed op codes"""
+
+        self.assertEqual(self.decode([0xCB, 0x7E])[1], 'BIT 7,(HL)')
+        self.assertEqual(self.decode([0xED, 0xB0])[1], 'LDIR')
+        self.assertEqual(self.decode([0xED, 0x56])[1], 'IM 1')
+        self.assertEqual(self.decode([0xDD, 0x36, 0x05, 0x12])[1], 'LD (IX+$05),$12')
+        self.assertEqual(self.decode([0xFD, 0x66, 0xFE])[1], 'LD H,(IY-$02)')
+        self.assertEqual(self.decode([0xDD, 0x26, 0x03])[1], 'LD IXH,$03')
+        self.assertEqual(self.decode([0xFD, 0xCB, 0x01, 0xC6])[1], 'SET 0,(IY+$01)')
+        self.assertEqual(self.decode([0xDD, 0x00]), (1, 'DB $DD', Flow.NEXT, None))
+
+    def test_truncated(self):
+        """verify instructions cut off by the end of the data"""
+
+        self.assertEqual(self.decode([0xC3, 0x00]), None)
+
+
+class TestDisassemble(unittest.TestCase):
+
+    def setUp(self):
+        disasm.clear_cache()
+
+    def test_linear(self):
+        """verify every byte is covered by a linear disassembly"""
+
+        data = bytearray([0x3E, 0x01, 0xC3, 0x00, 0x00, 0x21, 0x00])
+
+        lines = list(disasm.disassemble(memoryview(data), 0x4000))
+
+        self.assertEqual([line.address for line in lines], [0x4000, 0x4002, 0x4005])
+        self.assertEqual(lines[1].text, 'JP $0000')
+        self.assertEqual(lines[2].text, 'DB $21,$00')
+        self.assertEqual(str(lines[0]), '4000  3E 01        LD A,$01')
+
+    def test_recursive(self):
+        """verify only reachable code is disassembled as instructions"""
+
+        data = bytearray([0x18, 0x02,         # JR $0004
+                          0x3E, 0x01,         # not reached
+                          0xCD, 0x08, 0x00,   # CALL $0008
+                          0x76,               # HALT
+                          0xC9])              # RET
+
+        lines = list(disasm.disassemble(data, 0, recursive=True, entry=[0]))
+
+        self.assertEqual([line.text for line in lines],
+                         ['JR $0004', 'DB $3E,$01', 'CALL $0008', 'HALT', 'RET'])
+
+    def test_cache(self):
+        """verify repeated disassembly of the same image is cached"""
+
+        data = bytes(bytearray([0x00, 0xC9]))
+
+        first = list(disasm.disassemble(data, 0, recursive=True, entry=[0]))
+        second = list(disasm.disassemble(bytearray(data), 0, recursive=True, entry=[0]))
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(disasm._cache), 1)
+
+    def test_cache_size(self):
+        """verify the cache keeps the most recently used disassemblies"""
+
+        images = [bytes([0x3E, i, 0xC9]) for i in range(disasm.CACHE_SIZE + 1)]
+
+        for data in images:
+            list(disasm.disassemble(data))
+
+        self.assertEqual(len(disasm._cache), disasm.CACHE_SIZE)
+
+        # the first image was evicted, the second one is used again
+        list(disasm.disassemble(images[1]))
+        list(disasm.disassemble(images[0]))
+
+        self.assertEqual(len(disasm._cache), disasm.CACHE_SIZE)
+        self.assertEqual([key[0] for key in list(disasm._cache)[-2:]],
+                         [hashlib.sha1(images[i]).hexdigest() for i in (1, 0)])
+
+    def test_cartridge_entry_points(self):
+        """verify the entry points are read from the cartridge header"""
+
+        with open(os.path.join(ROM_DIRECTORY, 'zaxxon.rom'), 'rb') as f:
+            data = f.read()
+
+        entry = disasm.entry_points(data, disasm.CARTRIDGE_ADDRESS)
+
+        self.assertEqual(entry[0], data[0x0A] | (data[0x0B] << 8))
+        self.assertEqual(entry[1:], list(disasm.CARTRIDGE_JUMP_TABLE))
+
+    def test_speed(self):
+        """verify a 32 KB cartridge disassembles in well under a second"""
+
+        data = bytearray(os.urandom(0x8000))
+
+        start = time.time()
+
+        list(disasm.disassemble(data, disasm.CARTRIDGE_ADDRESS))
+
+        self.assertLess(time.time() - start, 0.5)
@@ -0,0 +1,86 @@
+"""Unit tests for the Z80 instruction exerciser harness"""
+
+import unittest
+from colecovision.cpu import exerciser
+from colecovision.cpu.exerciser import Exerciser
+
+
+ZEXDOC_OUTPUT = ("Z80doc instruction exerciser\r\n"
+                 "<adc,sbc> hl,<bc,de,hl,sp>....  OK\r\n"
+                 "add hl,<bc,de,hl,sp>..........  ERROR **** crc expected:d48815a4 found:12345678\r\n"
+                 "ld <b,c,d,e,h,l,(hl),a>,<b,c,d,e,h,l,(hl),a>....  OK\r\n"
+                 "Tests complete\r\n")
+
+
+class TestExerciser(unittest.TestCase):
+
+    def test_parse_output(self):
+        """verify the test results are found in the output"""
+
+        tests = exerciser.parse_output(ZEXDOC_OUTPUT)
+
+        self.assertEqual([test.name for test in tests],
+                         ['<adc,sbc> hl,<bc,de,hl,sp>', 'add hl,<bc,de,hl,sp>',
+                          'ld <b,c,d,e,h,l,(hl),a>,<b,c,d,e,h,l,(hl),a>'])
+
+        self.assertEqual([test.passed for test in tests], [True, False, True])
+        self.assertEqual((tests[1].expected, tests[1].found), (0xD48815A4, 0x12345678))
+
+    def test_bdos(self):
+        """verify the BDOS console output functions and the warm boot"""
+
+        harness = Exerciser(b'\x40' * 4)
+
+        register = harness.cpu.register
+
+        harness.ram.write_block(0x0200, bytearray(b'  OK\r\n$'))
+
+        # print the string twice: the first call returns to the BDOS, the
+        # second to the warm boot
+        harness.ram.write_block(0x02FC, bytearray([0x05, 0x00, 0x00, 0x00]))
+
+        register["SP"].value = 0x02FC
+        register["PC"].value = exerciser.CPM_BDOS
+        register["C"].value = exerciser.BDOS_PRINT_STRING
+        register["DE"].value = 0x0200
+
+        result = harness.run()
+
+        self.assertEqual(result.error, None)
+        self.assertEqual(result.output, '  OK\r\n  OK\r\n')
+        self.assertEqual(result.instructions, 0)
+
+    def test_console_output(self):
+        """verify the BDOS console output of a character"""
+
+        harness = Exerciser(b'\x40' * 4)
+
+        register = harness.cpu.register
+
+        register["SP"].value = 0x02FE
+        register["PC"].value = exerciser.CPM_BDOS
+        register["C"].value = exerciser.BDOS_CONSOLE_OUTPUT
+        register["E"].value = ord('Z')
+
+        harness.ram.write_block(0x02FE, bytearray([0x00, 0x00]))
+
+        self.assertEqual(harness.run().output, 'Z')
+
+    def test_program(self):
+        """verify a program runs from the start of the TPA until the
+        first unknown instruction"""
+
+        result = Exerciser(b'\x41\x4A\x00').run()
+
+        self.assertEqual(result.instructions, 2)
+        self.assertIn('0x0102', result.error)
+        self.assertFalse(result.passed)
+
+    def test_instruction_limit(self):
+        """verify a run stops at the instruction limit"""
+
+        # more than a slice of LD B,B instructions
+        result = Exerciser(b'\x40' * 0x8000).run(max_instructions=10)
+
+        self.assertGreaterEqual(result.instructions, 10)
+        self.assertEqual(result.error, 'Instruction limit reached')
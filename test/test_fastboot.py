@@ -0,0 +1,92 @@
+"""Unit tests for fast boot"""
+
+import os
+import unittest
+from colecovision import fastboot
+from colecovision import state
+from machine_fixture import MachineFixture
+
+
+class TestFastBoot(unittest.TestCase):
+
+    # the game "starts" at 0x0100, inside the BIOS made of LD B,B
+    ENTRY_POINT = 0x0100
+
+    def setUp(self):
+
+        self.fixture = MachineFixture()
+
+        header = bytearray(0x2000)
+        header[0:2] = b'\xAA\x55'
+        header[0x0A] = self.ENTRY_POINT & 0xFF
+        header[0x0B] = self.ENTRY_POINT >> 8
+
+        self.cartridge_file = self.fixture.write('cartridge.rom', bytes(header))
+
+        self.cache_dir = self.fixture.path('cache')
+
+        os.mkdir(self.cache_dir)
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def test_run_bios(self):
+        """verify the BIOS runs until the game starts"""
+
+        machine = self.fixture.create(self.cartridge_file)
+
+        self.assertTrue(fastboot.run_bios(machine))
+
+        # stopped before the first instruction of the game
+        self.assertEqual(machine.cpu.register['PC'].value, self.ENTRY_POINT)
+        self.assertEqual(machine.cpu.instructions, self.ENTRY_POINT)
+        self.assertEqual(machine.frame, 0)
+
+    def test_cached_boot(self):
+        """verify the second boot restores an identical state"""
+
+        first = self.fixture.create(self.cartridge_file)
+
+        self.assertFalse(fastboot.boot(first, self.cache_dir))
+
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        second = self.fixture.create(self.cartridge_file)
+
+        self.assertTrue(fastboot.boot(second, self.cache_dir))
+
+        self.assertEqual(state.pack(second.save_state()),
+                         state.pack(first.save_state()))
+
+    def test_not_started(self):
+        """verify the state is not cached when the game did not start"""
+
+        machine = self.fixture.create(self.cartridge_file)
+
+        self.assertFalse(fastboot.boot(machine, self.cache_dir, max_frames=0))
+
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_key_depends_on_cartridge(self):
+        """verify the cache key changes with the cartridge"""
+
+        with_cartridge = self.fixture.create(self.cartridge_file)
+        without_cartridge = self.fixture.create()
+
+        self.assertNotEqual(fastboot.cache_key(with_cartridge),
+                            fastboot.cache_key(without_cartridge))
+
+    def test_corrupt_cache(self):
+        """verify a corrupt cached state is replaced"""
+
+        machine = self.fixture.create(self.cartridge_file)
+
+        file_name = os.path.join(self.cache_dir,
+                                 fastboot.cache_key(machine) + fastboot.STATE_SUFFIX)
+
+        with open(file_name, 'wb') as f:
+            f.write(b'garbage')
+
+        self.assertFalse(fastboot.boot(machine, self.cache_dir))
+
+        state.load(file_name)
@@ -0,0 +1,131 @@
+"""Unit tests for the frame sinks"""
+
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import unittest
+import zlib
+from colecovision import framesink
+from colecovision.framesink import AsyncFrameSink, DropPolicy
+from colecovision.framesink import FrameSinkInterface, PNGSink, Y4MSink
+from colecovision.video import FRAME_SIZE, SCREEN_WIDTH, SCREEN_HEIGHT, VDP
+
+
+class _BlockedSink(FrameSinkInterface):
+    """Sink that keeps the frames and waits for an event before each one"""
+
+    def __init__(self):
+        self.frames = []
+        self.event = threading.Event()
+
+    def submit(self, framebuffer):
+        self.event.wait()
+        self.frames.append(framebuffer)
+
+
+class TestFrameSink(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_png(self):
+        """verify the PNG image holds the frame"""
+
+        framebuffer = bytes(bytearray(i & 0x0F for i in range(FRAME_SIZE)))
+
+        data = framesink.encode_png(framebuffer)
+
+        self.assertEqual(data[:8], framesink.PNG_SIGNATURE)
+
+        width, height = struct.unpack_from('>II', data, 16)
+
+        self.assertEqual((width, height), (SCREEN_WIDTH, SCREEN_HEIGHT))
+
+        # the image data follows the header and palette chunks
+        position = 8 + (12 + 13) + (12 + 48)
+
+        length, = struct.unpack_from('>I', data, position)
+
+        self.assertEqual(data[position + 4:position + 8], b'IDAT')
+
+        rows = zlib.decompress(data[position + 8:position + 8 + length])
+
+        self.assertEqual(rows[1:SCREEN_WIDTH + 1], framebuffer[:SCREEN_WIDTH])
+
+    def test_vdp_sink(self):
+        """verify the VDP hands its frames to the sinks"""
+
+        vdp = VDP()
+
+        sink = PNGSink(self.directory)
+
+        vdp.add_sink(sink)
+
+        vdp.vblank()
+        vdp.vblank()
+
+        vdp.remove_sink(sink)
+
+        vdp.vblank()
+
+        self.assertEqual(sink.frames, 2)
+        self.assertTrue(os.path.exists(sink.file_name(1)))
+
+    def test_y4m(self):
+        """verify the size of a YUV4MPEG2 stream"""
+
+        file_name = os.path.join(self.directory, 'video.y4m')
+
+        sink = Y4MSink(file_name)
+
+        sink.submit(bytes(FRAME_SIZE))
+        sink.submit(bytes(FRAME_SIZE))
+
+        sink.close()
+
+        with open(file_name, 'rb') as f:
+            header = f.readline()
+            data = f.read()
+
+        self.assertTrue(header.startswith(b'YUV4MPEG2 W256 H192'))
+        self.assertEqual(len(data), 2 * (6 + FRAME_SIZE + (FRAME_SIZE // 2)))
+
+    def test_drop_newest(self):
+        """verify frames are dropped, not queued, when the queue is full"""
+
+        blocked = _BlockedSink()
+
+        sink = AsyncFrameSink(blocked, queue_size=2)
+
+        for i in range(10):
+            sink.submit(bytes([i]))
+
+        blocked.event.set()
+
+        sink.close()
+
+        self.assertEqual(sink.submitted, 10)
+        self.assertEqual(sink.written + sink.dropped, 10)
+        self.assertGreaterEqual(sink.dropped, 7)
+        self.assertEqual(blocked.frames[0], bytes([0]))
+
+    def test_drop_oldest(self):
+        """verify the newest frames are kept"""
+
+        blocked = _BlockedSink()
+
+        sink = AsyncFrameSink(blocked, queue_size=2, policy=DropPolicy.OLDEST)
+
+        for i in range(10):
+            sink.submit(bytes([i]))
+
+        blocked.event.set()
+
+        sink.close()
+
+        self.assertEqual(blocked.frames[-2:], [bytes([8]), bytes([9])])
@@ -0,0 +1,187 @@
+"""Unit tests for the GDB remote serial protocol stub"""
+
+import socket
+import threading
+import unittest
+from colecovision.gdbstub import GDBStub
+from machine_fixture import MachineFixture
+
+
+class TestGDBStub(unittest.TestCase):
+
+    def setUp(self):
+
+        self.fixture = MachineFixture()
+
+        self.machine = self.fixture.create(free_running=True)
+
+        self.stub = GDBStub(self.machine)
+
+        self.server = threading.Thread(target=self.stub.serve)
+        self.server.start()
+
+        self.client = socket.create_connection(self.stub.address, timeout=10)
+        self.input = b''
+
+    def tearDown(self):
+
+        self.client.close()
+
+        self.server.join()
+
+        self.stub.close()
+
+        self.fixture.close()
+
+    def send(self, data):
+        """Send a packet, without waiting for the response"""
+
+        data = data.encode('ascii')
+
+        checksum = sum(bytearray(data)) & 0xFF
+
+        self.client.sendall(b'$' + data + '#{0:02x}'.format(checksum).encode('ascii'))
+
+    def receive(self):
+        """Receive a packet, skipping the acknowledgements"""
+
+        while b'#' not in self.input or \
+              len(self.input) < self.input.index(b'#') + 3:
+            self.input += self.client.recv(4096)
+
+        start = self.input.index(b'$')
+        end = self.input.index(b'#')
+
+        data = self.input[start + 1:end]
+
+        self.input = self.input[end + 3:]
+
+        self.client.sendall(b'+')
+
+        return data.decode('ascii')
+
+    def request(self, data):
+        """Send a packet, return the response"""
+
+        self.send(data)
+
+        return self.receive()
+
+    def registers(self):
+        """Register values, as 16-bit integers"""
+
+        data = self.request('g')
+
+        self.assertEqual(len(data), 13 * 4)
+
+        return [int(data[i + 2:i + 4] + data[i:i + 2], 16)
+                for i in range(0, len(data), 4)]
+
+    def test_registers(self):
+        """verify registers are read and written in gdb order"""
+
+        self.machine.cpu.register["A"].value = 0x12
+        self.machine.cpu.register["F"].value = 0x34
+        self.machine.cpu.register["SP"].value = 0x7FF0
+
+        registers = self.registers()
+
+        self.assertEqual(registers[0], 0x1234)
+        self.assertEqual(registers[4], 0x7FF0)
+        self.assertEqual(registers[5], 0x0000)
+
+        # set BC to 0x5678
+        data = self.request('g')
+
+        self.assertEqual(self.request('G' + data[:4] + '7856' + data[8:]), 'OK')
+
+        self.assertEqual(self.machine.cpu.register["BC"].value, 0x5678)
+
+        self.assertEqual(self.request('D'), 'OK')
+
+    def test_memory(self):
+        """verify memory packets"""
+
+        self.assertEqual(self.request('M6000,3:123456'), 'OK')
+        self.assertEqual(self.machine.ram.read_block(0, 3), bytearray(b'\x12\x34\x56'))
+
+        self.assertEqual(self.request('m6001,2'), '3456')
+
+        self.assertEqual(self.request('D'), 'OK')
+
+    def test_breakpoint(self):
+        """verify execution stops before the instruction at a breakpoint"""
+
+        self.assertEqual(self.request('Z0,10,1'), 'OK')
+
+        self.assertEqual(self.request('c'), 'S05')
+        self.assertEqual(self.registers()[5], 0x10)
+        self.assertEqual(self.machine.cpu.instructions, 0x10)
+
+        # step off the breakpoint
+        self.assertEqual(self.request('s'), 'S05')
+        self.assertEqual(self.registers()[5], 0x11)
+
+        # run again from the breakpoint
+        self.assertEqual(self.request('s10'), 'S05')
+        self.assertEqual(self.registers()[5], 0x11)
+
+        self.assertEqual(self.request('z0,10,1'), 'OK')
+
+        self.assertEqual(self.request('D'), 'OK')
+
+    def test_watchpoint(self):
+        """verify watchpoints stop after the access and are reported by
+        type, and reading memory does not trigger them"""
+
+        # LD A,(7000H) at 0x2000
+        self.machine.memsys.write_block(0x2000, b'\x3a\x00\x70')
+
+        self.assertEqual(self.request('Z4,7000,1'), 'OK')
+
+        self.assertEqual(self.request('m7000,4'), '7f7f7f7f')
+
+        self.assertEqual(self.request('c2000'), 'T05awatch:7000;')
+        self.assertEqual(self.registers()[5], 0x2003)
+
+        self.assertEqual(self.request('z4,7000,1'), 'OK')
+
+        self.assertEqual(self.request('Z3,7000,1'), 'OK')
+
+        self.assertEqual(self.request('s2000'), 'T05rwatch:7000;')
+
+        self.assertEqual(self.request('z3,7000,1'), 'OK')
+
+        self.assertEqual(self.request('D'), 'OK')
+
+    def test_malformed(self):
+        """verify malformed packets are answered with an error and the
+        stub keeps serving"""
+
+        for packet in ('m1000', 'Zx,1', 'pzz', 'P0=zz', 'M6000,1:zz', 'c12g'):
+            self.assertEqual(self.request(packet), 'E01')
+
+        # a checksum that is not hex is refused
+        self.client.sendall(b'$?#zz')
+
+        while not self.input.startswith(b'-'):
+            self.input += self.client.recv(4096)
+
+        self.input = self.input[1:]
+
+        self.assertEqual(self.request('?'), 'S05')
+
+        self.assertEqual(self.request('D'), 'OK')
+
+    def test_interrupt(self):
+        """verify a running target stops on an interrupt"""
+
+        self.send('c')
+
+        self.client.sendall(b'\x03')
+
+        self.assertEqual(self.receive(), 'S02')
+
+        self.assertEqual(self.request('?'), 'S02')
+
+        self.send('k')
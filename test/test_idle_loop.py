@@ -0,0 +1,324 @@
+"""Unit tests for the idle loop detection and the instructions of polling
+loops"""
+
+import unittest
+from colecovision import machine
+from colecovision.cpu import condition
+from colecovision.cpu.z80 import Z80, STATE_REGISTERS
+from colecovision.machine import Machine
+from colecovision.memory import MemorySystem, RAM_MemoryRegion
+from colecovision.video import VDP
+from machine_fixture import MachineFixture
+
+
+class FakeIO(object):
+    """I/O system returning fixed port values, counting the reads"""
+
+    def __init__(self, values):
+        """Initialization"""
+
+        self.values = values
+        self.reads = 0
+
+    def read(self, port):
+        self.reads += 1
+        return self.values.get(port, 0xFF)
+
+    def write(self, port, value):
+        pass
+
+    def idempotent_read(self, port):
+        # the data port of the VDP (0xBE) advances its address
+        return port != 0xBE
+
+
+class TestIdleLoop(unittest.TestCase):
+    """Idle loop detection"""
+
+    # LD A,(6000H); OR A; JR Z,0000H
+    RAM_FLAG_LOOP = [0x3A, 0x00, 0x60, 0xB7, 0x28, 0xFA]
+
+    # IN A,(BFH); AND 80H; JR Z,0000H
+    STATUS_LOOP = [0xDB, 0xBF, 0xE6, 0x80, 0x28, 0xFA]
+
+    def create(self, program, io=None):
+        """CPU running a program at 0x0000, followed by LD B,B"""
+
+        memsys = MemorySystem()
+
+        ram = RAM_MemoryRegion(0x10000)
+
+        ram.write_block(0, b'\x40' * 0x10000)
+        ram.write_block(0, bytearray(program))
+        ram.write(0x6000, 0x00)
+
+        memsys.map_region(ram, 0)
+
+        cpu = Z80(memsys, io)
+
+        cpu.ram = ram
+
+        return cpu
+
+    def assertSameState(self, first, second):
+        """Verify that two CPUs are in the same state"""
+
+        for name in STATE_REGISTERS:
+            self.assertEqual(first.register[name].value, second.register[name].value, name)
+
+        self.assertEqual(first.cycles, second.cycles)
+        self.assertEqual(first.instructions, second.instructions)
+
+    def test_ram_flag(self):
+        """verify a loop polling a RAM flag is skipped with exact cycle and
+        instruction accounting"""
+
+        reference = self.create(self.RAM_FLAG_LOOP)
+        detecting = self.create(self.RAM_FLAG_LOOP)
+
+        detecting.idle_detection = True
+
+        for budget in (1000, 777, 10001):
+            self.assertEqual(detecting.run(budget), reference.run(budget))
+            self.assertSameState(detecting, reference)
+
+        self.assertGreater(detecting.idle_cycles, 0)
+        self.assertEqual(reference.idle_cycles, 0)
+
+        # the flag set between runs ends the loop
+        for cpu in (reference, detecting):
+            cpu.ram.write(0x6000, 0x01)
+            cpu.run(100)
+
+        self.assertSameState(detecting, reference)
+        self.assertGreater(detecting.register["PC"].value, 0x0006)
+
+    def test_status_port(self):
+        """verify a loop polling a status port is skipped"""
+
+        io = FakeIO({0xBF : 0x1F})
+
+        cpu = self.create(self.STATUS_LOOP, io)
+
+        cpu.idle_detection = True
+
+        cpu.run(10000)
+
+        self.assertGreater(cpu.idle_cycles, 9000)
+        self.assertLess(io.reads, 5)
+
+    def test_vdp_status(self):
+        """verify a loop reading the VDP status is only skipped once the
+        first read has cleared the frame flag and the control latch"""
+
+        # IN A,(BFH); JR 0000H
+        program = [0xDB, 0xBF, 0x18, 0xFC]
+
+        vdps = (VDP(), VDP())
+
+        reference = self.create(program, machine.IOSystem(vdps[0], []))
+        detecting = self.create(program, machine.IOSystem(vdps[1], []))
+
+        detecting.idle_detection = True
+
+        for budget in (1000, 10001):
+
+            for vdp in vdps:
+                vdp.vblank()
+                vdp.write_control(0x00)
+
+            for cpu in (reference, detecting):
+                cpu.run(budget)
+
+            self.assertSameState(detecting, reference)
+            self.assertEqual(vdps[1].save_state(), vdps[0].save_state())
+
+        self.assertGreater(detecting.idle_cycles, 9000)
+
+    def test_side_effects(self):
+        """verify a loop reading a port with side effects is not skipped"""
+
+        io = FakeIO({0xBE : 0x00})
+
+        # IN A,(BEH); AND 80H; JR Z,0000H
+        cpu = self.create([0xDB, 0xBE, 0xE6, 0x80, 0x28, 0xFA], io)
+
+        cpu.idle_detection = True
+
+        cpu.run(1000)
+
+        self.assertEqual(cpu.idle_cycles, 0)
+        self.assertGreater(io.reads, 30)
+
+    def test_changing_loop(self):
+        """verify a loop changing a register is not skipped"""
+
+        # LD B,A; LD A,C; LD C,B; JR 0000H (swaps A and C)
+        cpu = self.create([0x47, 0x79, 0x48, 0x18, 0xFB])
+
+        cpu.register["A"].value = 1
+
+        cpu.idle_detection = True
+
+        cpu.run(1000)
+
+        self.assertEqual(cpu.idle_cycles, 0)
+
+    def test_interrupt(self):
+        """verify an interrupt leaves a skipped loop"""
+
+        cpu = self.create(self.RAM_FLAG_LOOP)
+
+        cpu.register["SP"].value = 0xF000
+
+        cpu.idle_detection = True
+
+        cpu.run(1000)
+
+        cpu.nmi()
+
+        cpu.run(11)
+
+        self.assertEqual(cpu.register["PC"].value, 0x0066)
+
+
+class TestPollingInstructions(unittest.TestCase):
+    """Jumps, logic instructions and port input"""
+
+    def setUp(self):
+
+        self.memsys = MemorySystem()
+
+        self.ram = RAM_MemoryRegion(0x10000)
+
+        self.memsys.map_region(self.ram, 0)
+
+        self.cpu = Z80(self.memsys, FakeIO({0x10 : 0x5A}))
+
+    def execute(self, program):
+        """Execute the first instruction of a program, returns its cycles"""
+
+        self.ram.write_block(0, bytearray(program))
+
+        self.cpu.register["PC"].value = 0
+
+        return self.cpu.step()
+
+    def test_jump(self):
+        """verify JP and the conditional jumps"""
+
+        self.assertEqual(self.execute([0xC3, 0x34, 0x12]), 10)
+        self.assertEqual(self.cpu.register["PC"].value, 0x1234)
+
+        # JP M with the sign flag clear
+        self.cpu.register["F"].value = 0
+        self.execute([0xFA, 0x34, 0x12])
+        self.assertEqual(self.cpu.register["PC"].value, 0x0003)
+
+        # JP PE with the parity flag set
+        self.cpu.register["F"].value = condition.PARITY_OVERFLOW
+        self.execute([0xEA, 0x34, 0x12])
+        self.assertEqual(self.cpu.register["PC"].value, 0x1234)
+
+    def test_jump_relative(self):
+        """verify JR and its cycle counts"""
+
+        self.assertEqual(self.execute([0x18, 0x10]), 12)
+        self.assertEqual(self.cpu.register["PC"].value, 0x0012)
+
+        # JR NZ with the zero flag set
+        self.cpu.register["F"].value = condition.ZERO
+        self.assertEqual(self.execute([0x20, 0x10]), 7)
+        self.assertEqual(self.cpu.register["PC"].value, 0x0002)
+
+        # JR C backwards
+        self.cpu.register["F"].value = condition.CARY
+        self.execute([0x38, 0xFE])
+        self.assertEqual(self.cpu.register["PC"].value, 0x0000)
+
+    def test_compare(self):
+        """verify the CP flags"""
+
+        self.cpu.register["A"].value = 0x10
+
+        self.execute([0xFE, 0x20])
+
+        flags = self.cpu.register["F"].value
+
+        self.assertEqual(self.cpu.register["A"].value, 0x10)
+        self.assertTrue(flags & condition.CARY)
+        self.assertTrue(flags & condition.SIGN)
+        self.assertTrue(flags & condition.SUBTRACT)
+        self.assertFalse(flags & condition.ZERO)
+
+        self.execute([0xFE, 0x10])
+
+        self.assertTrue(self.cpu.register["F"].value & condition.ZERO)
+
+    def test_logic(self):
+        """verify AND, XOR and OR"""
+
+        self.cpu.register["A"].value = 0x0F
+        self.cpu.register["B"].value = 0x3C
+
+        self.assertEqual(self.execute([0xA0]), 4)
+        self.assertEqual(self.cpu.register["A"].value, 0x0C)
+        self.assertTrue(self.cpu.register["F"].value & condition.HALF_CARY)
+        self.assertTrue(self.cpu.register["F"].value & condition.PARITY_OVERFLOW)
+
+        self.execute([0xEE, 0x0C])
+        self.assertEqual(self.cpu.register["A"].value, 0x00)
+        self.assertTrue(self.cpu.register["F"].value & condition.ZERO)
+
+        # OR (HL)
+        self.cpu.register["HL"].value = 0x8000
+        self.ram.write(0x8000, 0x81)
+
+        self.assertEqual(self.execute([0xB6]), 7)
+        self.assertEqual(self.cpu.register["A"].value, 0x81)
+        self.assertTrue(self.cpu.register["F"].value & condition.SIGN)
+
+    def test_input(self):
+        """verify IN A,(n) and LD A,(nn)"""
+
+        self.assertEqual(self.execute([0xDB, 0x10]), 11)
+        self.assertEqual(self.cpu.register["A"].value, 0x5A)
+
+        self.ram.write(0x4321, 0xA5)
+
+        self.assertEqual(self.execute([0x3A, 0x21, 0x43]), 13)
+        self.assertEqual(self.cpu.register["A"].value, 0xA5)
+
+
+class TestMachineIdle(unittest.TestCase):
+    """Skipped cycles reported by the machine"""
+
+    def setUp(self):
+
+        self.fixture = MachineFixture()
+
+        # JR $
+        self.machine = Machine(self.fixture.write('idle_bios.rom',
+            b'\x18\xFE' + b'\x40' * (machine.BIOS_SIZE - 2)))
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def test_skipped_cycles(self):
+        """verify the cycles skipped in each frame are reported"""
+
+        self.machine.run_frame()
+
+        self.assertEqual(self.machine.skipped_cycles, 0)
+
+        self.machine.cpu.idle_detection = True
+
+        self.machine.run_frames(2)
+
+        self.assertGreater(self.machine.skipped_cycles, machine.CYCLES_PER_FRAME - 100)
+        self.assertLessEqual(self.machine.skipped_cycles, machine.CYCLES_PER_FRAME)
+        self.assertEqual(self.machine.cpu.register["PC"].value, 0x0000)
+
+
+if __name__ == '__main__':
+    unittest.main()
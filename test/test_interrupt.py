@@ -0,0 +1,249 @@
+"""Unit tests for the Z80 interrupts and HALT"""
+
+import unittest
+from colecovision import state
+from colecovision.cpu import z80
+from colecovision.cpu.z80 import Z80
+from colecovision.memory import MemorySystem, RAM_MemoryRegion
+from colecovision.video import REGISTER_1_INTERRUPT
+from machine_fixture import MachineFixture
+
+
+class TestInterrupt(unittest.TestCase):
+    """Interrupts of the CPU"""
+
+    def setUp(self):
+
+        self.memsys = MemorySystem()
+
+        self.ram = RAM_MemoryRegion(0x10000)
+
+        # LD B,B everywhere
+        self.ram.write_block(0, b'\x40' * 0x10000)
+
+        self.memsys.map_region(self.ram, 0)
+
+        self.cpu = Z80(self.memsys)
+
+        self.cpu.register["SP"].value = 0xF000
+
+    def load(self, address, program):
+        """Write a program to memory"""
+        self.ram.write_block(address, bytearray(program))
+
+    def pushed(self):
+        """Address on the top of the stack"""
+
+        sp = self.cpu.register["SP"].value
+
+        return self.ram.read(sp) | (self.ram.read(sp + 1) << 8)
+
+    def test_ei_delay(self):
+        """verify the interrupt is accepted after the instruction following
+        EI"""
+
+        # IM 1, EI, LD B,B
+        self.load(0, [0xED, 0x56, 0xFB])
+
+        self.cpu.set_interrupt_line(True)
+
+        self.cpu.step()
+        self.cpu.step()
+
+        self.assertTrue(self.cpu.iff1)
+
+        self.cpu.step()
+
+        self.assertEqual(self.cpu.register["PC"].value, 0x0004)
+
+        self.assertEqual(self.cpu.step(), z80.IM1_CYCLES)
+
+        self.assertEqual(self.cpu.register["PC"].value, z80.IM1_ADDRESS)
+        self.assertEqual(self.pushed(), 0x0004)
+        self.assertFalse(self.cpu.iff1)
+
+    def test_disabled(self):
+        """verify the maskable interrupt waits while interrupts are
+        disabled"""
+
+        self.cpu.set_interrupt_line(True)
+
+        self.cpu.step()
+
+        self.assertEqual(self.cpu.register["PC"].value, 0x0001)
+
+    def test_nmi(self):
+        """verify the NMI jumps to 0x0066 keeping IFF1 in IFF2, and RETN
+        restores it"""
+
+        # EI, LD B,B
+        self.load(0, [0xFB])
+
+        # RETN
+        self.load(z80.NMI_ADDRESS, [0xED, 0x45])
+
+        self.cpu.step()
+        self.cpu.step()
+
+        self.cpu.nmi()
+
+        self.assertEqual(self.cpu.step(), z80.NMI_CYCLES)
+
+        self.assertEqual(self.cpu.register["PC"].value, z80.NMI_ADDRESS)
+        self.assertEqual(self.pushed(), 0x0002)
+        self.assertFalse(self.cpu.iff1)
+        self.assertTrue(self.cpu.iff2)
+
+        self.cpu.step()
+
+        self.assertEqual(self.cpu.register["PC"].value, 0x0002)
+        self.assertEqual(self.cpu.register["SP"].value, 0xF000)
+        self.assertTrue(self.cpu.iff1)
+
+    def test_mode_2(self):
+        """verify the IM 2 vector table lookup"""
+
+        # IM 2, EI, LD B,B
+        self.load(0, [0xED, 0x5E, 0xFB])
+
+        self.cpu.register["I"].value = 0x80
+
+        self.load(0x8010, [0x34, 0x12])
+
+        self.cpu.set_interrupt_line(True, 0x10)
+
+        for i in range(3):
+            self.cpu.step()
+
+        self.assertEqual(self.cpu.step(), z80.IM2_CYCLES)
+
+        self.assertEqual(self.cpu.register["PC"].value, 0x1234)
+
+    def test_mode_0(self):
+        """verify IM 0 executes the RST on the data bus"""
+
+        # EI, LD B,B
+        self.load(0, [0xFB])
+
+        self.cpu.set_interrupt_line(True, 0xD7)
+
+        for i in range(2):
+            self.cpu.step()
+
+        self.assertEqual(self.cpu.step(), z80.IM0_CYCLES)
+
+        self.assertEqual(self.cpu.register["PC"].value, 0x0010)
+
+    def test_halt_run(self):
+        """verify run() skips to its end while halted, and an interrupt
+        resumes after the HALT"""
+
+        # HALT
+        self.load(0, [0x76])
+
+        executed = self.cpu.run(1000)
+
+        self.assertGreaterEqual(executed, 1000)
+        self.assertTrue(self.cpu.halted)
+        self.assertEqual(self.cpu.instructions, 1)
+        self.assertEqual(self.cpu.halt_cycles, executed - 4)
+
+        self.cpu.nmi()
+
+        self.cpu.step()
+
+        self.assertFalse(self.cpu.halted)
+        self.assertEqual(self.pushed(), 0x0001)
+
+    def test_halt_step(self):
+        """verify single steps while halted take a NOP's cycles"""
+
+        self.load(0, [0x76])
+
+        self.cpu.step()
+
+        self.assertEqual(self.cpu.step(), z80.HALT_CYCLES)
+        self.assertEqual(self.cpu.register["PC"].value, 0x0001)
+
+    def test_state(self):
+        """verify the interrupt state is saved and restored"""
+
+        # IM 1, EI, HALT
+        self.load(0, [0xED, 0x56, 0xFB, 0x76])
+
+        for i in range(3):
+            self.cpu.step()
+
+        saved = state.unpack(state.pack(self.cpu.save_state()))
+
+        other = Z80(self.memsys)
+
+        other.load_state(saved)
+
+        self.assertTrue(other.halted)
+        self.assertTrue(other.iff1)
+        self.assertEqual(other.interrupt_mode, 1)
+
+        other.set_interrupt_line(True)
+
+        other.step()
+
+        self.assertEqual(other.register["PC"].value, z80.IM1_ADDRESS)
+
+
+class TestVDPInterrupt(unittest.TestCase):
+    """VDP interrupt output wired to the NMI"""
+
+    def setUp(self):
+
+        self.fixture = MachineFixture()
+
+        self.machine = self.fixture.create(expansion=True)
+
+        self.machine.cpu.register["SP"].value = 0x7000
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def test_vblank_nmi(self):
+        """verify the frame interrupt reaches the CPU once per frame while
+        enabled"""
+
+        self.machine.run_frame()
+
+        self.assertNotEqual(self.machine.cpu.register["PC"].value, z80.NMI_ADDRESS)
+
+        self.machine.vdp.register[1] |= REGISTER_1_INTERRUPT
+        self.machine.vdp.read_status()
+
+        self.machine.cpu.register["PC"].value = 0
+        self.machine.run_frame()
+
+        self.machine.step()
+
+        self.assertEqual(self.machine.cpu.register["PC"].value, z80.NMI_ADDRESS)
+
+        # no new edge until the status is read
+        self.machine.cpu.register["PC"].value = 0
+        self.machine.run_frame()
+        self.machine.step()
+
+        self.assertNotEqual(self.machine.cpu.register["PC"].value, z80.NMI_ADDRESS)
+
+    def test_enable_raises(self):
+        """verify enabling the interrupt with the frame flag set raises the
+        NMI"""
+
+        self.machine.run_frame()
+
+        # register 1 write through the control port
+        self.machine.vdp.write_control(REGISTER_1_INTERRUPT)
+        self.machine.vdp.write_control(0x81)
+
+        self.machine.step()
+
+        self.assertEqual(self.machine.cpu.register["PC"].value, z80.NMI_ADDRESS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -115,10 +115,9 @@ class TestRegisterToRegisterDecode(TestLoadInstruction):
         
         bad_register_id = 6
         
+        # only the destination: with both registers 6 the opcode is HALT
         load_instruction = load_instruction | (bad_register_id << 3)
         
-        load_instruction = load_instruction | bad_register_id
-        
         self.ram.write(0, load_instruction)
         
         self.assertEqual(self.ram.read(0), load_instruction)
@@ -0,0 +1,144 @@
+"""Unit tests for the Colecovision machine"""
+
+import unittest
+from colecovision import machine
+from colecovision import state
+from colecovision.debugger import Debugger
+from colecovision.machine import Machine
+from machine_fixture import MachineFixture
+
+
+class TestMachine(unittest.TestCase):
+
+    def setUp(self):
+
+        self.fixture = MachineFixture()
+
+        self.machine = self.fixture.create(expansion=True)
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def test_memory_map(self):
+        """verify the BIOS and mirrored RAM are mapped"""
+
+        self.assertEqual(self.machine.memsys.read(0x0000), 0x40)
+
+        self.machine.memsys.write(0x6000, 0x12)
+
+        self.assertEqual(self.machine.memsys.read(0x7C00), 0x12)
+
+    def test_run_frame(self):
+        """verify a frame runs for a frame's worth of cycles"""
+
+        self.assertTrue(self.machine.run_frame())
+
+        self.assertEqual(self.machine.frame, 1)
+        self.assertGreaterEqual(self.machine.cpu.cycles, machine.CYCLES_PER_FRAME)
+        self.assertEqual(self.machine.vdp.status & 0x80, 0x80)
+
+    def test_abort(self):
+        """verify a CPU abort from a memory hook ends the frames early,
+        before the instruction fetched"""
+
+        debugger = Debugger(self.machine.memsys)
+
+        # reached in the middle of the first frame, after the BIOS
+        debugger.set_breakpoint(0x2100, lambda *access: self.machine.cpu.abort())
+
+        self.assertEqual(self.machine.run_frames(3), 0)
+        self.assertEqual(self.machine.frame, 0)
+        self.assertEqual(self.machine.cpu.register['PC'].value, 0x2100)
+        self.assertEqual(self.machine.cpu.instructions, 0x2100)
+
+        debugger.clear_all()
+
+        self.assertEqual(self.machine.run_frames(1), 1)
+        self.assertEqual(self.machine.frame, 1)
+
+    def test_vdp_ports(self):
+        """verify the VDP is reached through the I/O ports"""
+
+        io = self.machine.io
+
+        # write 0x5A to VRAM 0x1234, then read it back
+        io.write(0xBF, 0x34)
+        io.write(0xBF, 0x52)
+        io.write(0xBE, 0x5A)
+
+        io.write(0xBF, 0x34)
+        io.write(0xBF, 0x12)
+
+        self.assertEqual(io.read(0xBE), 0x5A)
+
+        # write register 1
+        io.write(0xBF, 0xE0)
+        io.write(0xBF, 0x81)
+
+        self.assertEqual(self.machine.vdp.register[1], 0xE0)
+
+    def test_state_round_trip(self):
+        """verify a restored state is identical to the saved one"""
+
+        self.machine.cpu.run(1000)
+        self.machine.memsys.write(0x6010, 0x34)
+        self.machine.io.write(0xBE, 0x56)
+
+        saved = state.pack(self.machine.save_state())
+
+        other = Machine(self.fixture.bios_file)
+
+        other.load_state(state.unpack(saved))
+
+        self.assertEqual(state.pack(other.save_state()), saved)
+        self.assertEqual(other.memsys.read(0x6010), 0x34)
+        self.assertEqual(other.cpu.register['PC'].value,
+                         self.machine.cpu.register['PC'].value)
+
+
+class TestClone(unittest.TestCase):
+
+    def setUp(self):
+
+        self.fixture = MachineFixture()
+
+        # LD A,(6000H) followed by LD B,B instructions
+        self.bios_file = self.fixture.write('clone_bios.rom',
+            b'\x3A\x00\x60' + b'\x40' * (machine.BIOS_SIZE - 3))
+
+        self.template = Machine(self.bios_file)
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def test_clone(self):
+        """verify a clone shares the BIOS, has its own RAM and devices and
+        runs like a newly constructed machine"""
+
+        self.template.memsys.write(0x6000, 0x42)
+        self.template.step()
+
+        clone = self.template.clone()
+
+        self.assertIs(clone.bios, self.template.bios)
+        self.assertIsNot(clone.ram, self.template.ram)
+        self.assertIsNot(clone.vdp, self.template.vdp)
+
+        self.assertEqual(clone.cpu.register['PC'].value, 0)
+        self.assertEqual(clone.memsys.read(0x7C00), 0xff)
+
+        clone.step()
+
+        self.assertEqual(clone.cpu.register['A'].value, 0xff)
+        self.assertEqual(self.template.cpu.register['A'].value, 0x42)
+
+        # the same state as a newly constructed machine
+        constructed = Machine(self.bios_file)
+        constructed.step()
+
+        self.assertEqual(state.pack(clone.save_state()),
+                         state.pack(constructed.save_state()))
+
+        clone.memsys.write(0x6001, 0x12)
+
+        self.assertEqual(self.template.memsys.read(0x6001), 0xff)
@@ -0,0 +1,193 @@
+"""Unit tests for the memory system"""
+
+import unittest
+from colecovision.memory import MemorySystem, RAM_MemoryRegion
+from colecovision.memory import MemoryHookInterface, PAGE_SIZE
+
+
+class RecordingHook(MemoryHookInterface):
+    """Hook that records every access it sees"""
+
+    def __init__(self):
+        self.accesses = []
+
+    def fetch_hook(self, address, value):
+        self.accesses.append(('fetch', address, value))
+
+    def read_hook(self, address, value):
+        self.accesses.append(('read', address, value))
+
+    def write_hook(self, address, value):
+        self.accesses.append(('write', address, value))
+
+
+class TestMemorySystem(unittest.TestCase):
+
+    def setUp(self):
+
+        self.memsys = MemorySystem()
+
+        self.low_ram = RAM_MemoryRegion(0x2000)
+        self.high_ram = RAM_MemoryRegion(0x0400)
+
+        self.memsys.map_region(self.low_ram, 0x0000)
+        self.memsys.map_region(self.high_ram, 0x6000)
+
+    def test_read_write(self):
+        """verify accesses are routed to the region mapped at the address"""
+
+        self.memsys.write(0x1234, 0x56)
+        self.memsys.write(0x6010, 0x78)
+
+        self.assertEqual(self.low_ram.read(0x1234), 0x56)
+        self.assertEqual(self.high_ram.read(0x0010), 0x78)
+
+        self.assertEqual(self.memsys.read(0x1234), 0x56)
+        self.assertEqual(self.memsys.fetch(0x6010), 0x78)
+
+    def test_unmapped_address(self):
+        """verify accesses to un-mapped addresses fail"""
+
+        with self.assertRaises(RuntimeError):
+            self.memsys.read(0x4000)
+
+        with self.assertRaises(RuntimeError):
+            self.memsys.write(0x6400, 0)
+
+    def test_unmap_region(self):
+        """verify a region is no longer accessible once un-mapped"""
+
+        self.memsys.unmap_region(self.high_ram)
+
+        with self.assertRaises(RuntimeError):
+            self.memsys.read(0x6000)
+
+        self.assertEqual(self.memsys.read(0x0000), 0xff)
+
+    def test_page_hook(self):
+        """verify hooks only see the accesses made to their page"""
+
+        hook = RecordingHook()
+
+        page = self.memsys.page(0x1000)
+
+        self.memsys.add_page_hook(page, hook)
+
+        self.memsys.write(0x1001, 0x12)
+        self.memsys.read(0x1001)
+        self.memsys.fetch(0x1002)
+        self.memsys.write(0x1000 + PAGE_SIZE, 0x34)
+        self.memsys.read(0x6000)
+
+        self.assertEqual(hook.accesses, [('write', 0x1001, 0x12),
+                                         ('read', 0x1001, 0x12),
+                                         ('fetch', 0x1002, 0xff)])
+
+        self.memsys.remove_page_hook(page, hook)
+
+        self.memsys.read(0x1001)
+
+        self.assertEqual(len(hook.accesses), 3)
+
+    def test_clone(self):
+        """verify a clone has the same mappings, with regions replaced and
+        without the hooks"""
+
+        hook = RecordingHook()
+
+        self.memsys.add_page_hook(0, hook)
+
+        self.memsys.write(0x0010, 0x11)
+        self.memsys.write(0x6010, 0x22)
+
+        replacement = RAM_MemoryRegion(0x0400)
+
+        clone = self.memsys.clone({self.high_ram : replacement})
+
+        self.assertEqual(clone.read(0x0010), 0x11)
+        self.assertEqual(clone.read(0x6010), 0xff)
+
+        clone.write(0x6010, 0x33)
+
+        self.assertEqual(replacement.read(0x0010), 0x33)
+        self.assertEqual(self.high_ram.read(0x0010), 0x22)
+
+        self.assertEqual(len(hook.accesses), 1)
+
+        # the clone can be re-mapped on its own
+        clone.unmap_region(replacement)
+
+        with self.assertRaises(RuntimeError):
+            clone.read(0x6010)
+
+        self.assertEqual(self.memsys.read(0x6010), 0x22)
+
+
+class TestMirroring(unittest.TestCase):
+
+    def setUp(self):
+
+        self.memsys = MemorySystem()
+
+    def test_ram_mirror(self):
+        """verify a 1 KB RAM mirrored across 0x6000-0x7FFF"""
+
+        ram = RAM_MemoryRegion(0x0400)
+
+        self.memsys.map_region(ram, 0x6000, 0x2000)
+
+        self.memsys.write(0x6010, 0x12)
+        self.memsys.write(0x7FFF, 0x34)
+
+        for mirror in range(0x6000, 0x8000, 0x0400):
+            self.assertEqual(self.memsys.read(mirror + 0x010), 0x12)
+            self.assertEqual(self.memsys.read(mirror + 0x3FF), 0x34)
+
+        with self.assertRaises(RuntimeError):
+            self.memsys.read(0x8000)
+
+    def test_small_region_mirror(self):
+        """verify regions smaller than a page are mirrored by masking"""
+
+        ram = RAM_MemoryRegion(0x0100)
+
+        self.memsys.map_region(ram, 0x0000, 0x0800)
+
+        self.memsys.write(0x0001, 0x56)
+
+        self.assertEqual(self.memsys.read(0x0101), 0x56)
+        self.assertEqual(self.memsys.read(0x0701), 0x56)
+
+    def test_rom_mirror_hole(self):
+        """verify mirrors wrap at the next power of two of the region size"""
+
+        ram = RAM_MemoryRegion(0x0C00)
+
+        self.memsys.map_region(ram, 0x8000, 0x2000)
+
+        self.memsys.write(0x8800, 0x78)
+
+        self.assertEqual(self.memsys.read(0x9800), 0x78)
+
+        # the holes read as an open bus and ignore writes
+        self.memsys.write(0x8C00, 0x12)
+
+        self.assertEqual(self.memsys.read(0x8C00), 0xff)
+        self.assertEqual(self.memsys.read(0x9FFF), 0xff)
+        self.assertEqual(self.memsys.peek_block(0x8BFF, 2), bytearray([0xff, 0xff]))
+        self.assertEqual(self.memsys.page_region(self.memsys.page(0x9C00)), ram)
+
+    def test_unmirrored_bounds(self):
+        """verify regions mapped without mirroring do not wrap"""
+
+        ram = RAM_MemoryRegion(0x0010)
+
+        self.memsys.map_region(ram, 0x0000)
+
+        self.memsys.write(0x000F, 0x9a)
+
+        self.assertEqual(self.memsys.read(0x000F), 0x9a)
+        self.assertEqual(self.memsys.read(0x0010), 0xff)
+
+        with self.assertRaises(RuntimeError):
+            self.memsys.read(0x0400)
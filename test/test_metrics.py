@@ -0,0 +1,158 @@
+"""Unit tests for the performance metrics"""
+
+import json
+import os
+import unittest
+from colecovision import machine, metrics
+from colecovision.machine import Machine
+from colecovision.memory import DeviceMemoryRegion, RAM_MemoryRegion
+from colecovision.metrics import Metrics
+from machine_fixture import MachineFixture
+
+
+class FakeClock(object):
+    """Clock advancing by a fixed step at each call"""
+
+    def __init__(self, step):
+        self.time = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.time += self.step
+        return self.time
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+
+        self.fixture = MachineFixture()
+
+        # LD A,(6000H); LD A,(2000H); JP 0000H
+        bios_file = self.fixture.write('metrics_bios.rom',
+            bytes([0x3A, 0x00, 0x60, 0x3A, 0x00, 0x20, 0xC3, 0x00, 0x00]) +
+            b'\x40' * (machine.BIOS_SIZE - 9))
+
+        self.machine = Machine(bios_file)
+
+        self.files = (self.fixture.path('metrics.prom'),
+                      self.fixture.path('metrics.json'))
+
+        self.machine.memsys.map_region(DeviceMemoryRegion(0x400), 0x2000)
+
+        self.clock = FakeClock(0.004)
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def test_snapshot(self):
+        """verify the speed, frame times and skipped cycles"""
+
+        measured = Metrics(self.machine, clock=self.clock)
+
+        self.machine.run_frames(3)
+
+        snapshot = measured.snapshot()
+
+        self.assertEqual(snapshot['frames'], 3)
+        self.assertEqual(snapshot['cycles'], self.machine.cpu.cycles)
+        self.assertGreater(snapshot['instructions_per_second'], 0)
+        self.assertEqual(snapshot['skipped_cycles'], {'idle' : 0, 'halt' : 0})
+
+        # one clock call per frame: every frame took 4 ms
+        frame_time = snapshot['frame_time_seconds']
+
+        self.assertEqual(frame_time['count'], 3)
+        self.assertEqual(frame_time['buckets']['0.002'], 0)
+        self.assertEqual(frame_time['buckets']['0.005'], 3)
+        self.assertEqual(frame_time['buckets']['+Inf'], 3)
+
+        self.assertEqual(snapshot['memory_accesses'], {'read' : {}, 'write' : {}})
+
+    def test_memory_accesses(self):
+        """verify data accesses are counted per region type, and counting
+        stops when closed"""
+
+        measured = Metrics(self.machine, memory_accesses=True, clock=self.clock)
+
+        self.machine.run_frame()
+
+        reads = measured.snapshot()['memory_accesses']['read']
+
+        self.assertEqual(set(reads), {'ram', 'device'})
+        self.assertAlmostEqual(reads['ram'], reads['device'], delta=1)
+
+        measured.close()
+
+        self.assertIs(self.machine.cpu.data_memory, self.machine.memsys)
+
+        self.machine.run_frame()
+
+        self.assertEqual(measured.snapshot()['memory_accesses']['read'], reads)
+
+    def test_tile_cache(self):
+        """verify the hit rate of the tile row cache"""
+
+        measured = Metrics(self.machine, clock=self.clock)
+
+        self.assertEqual(measured.snapshot()['tile_cache']['hit_rate'], 0.0)
+
+        self.machine.vdp.vram.write_block(0, bytearray(0x4000))
+        self.machine.vdp.register[1] = 0x40
+
+        self.machine.vdp.render()
+        self.machine.vdp.render()
+
+        tile_cache = measured.snapshot()['tile_cache']
+
+        # a single row (name 0, line 0 to 7) is expanded
+        self.assertEqual(tile_cache['misses'], 8)
+        self.assertGreater(tile_cache['hit_rate'], 0.99)
+
+    def test_export(self):
+        """verify the periodic Prometheus export and the JSON export"""
+
+        measured = Metrics(self.machine, self.files[0], interval=0.01,
+                           clock=self.clock)
+
+        self.machine.run_frames(2)
+
+        self.assertFalse(os.path.exists(self.files[0]))
+
+        self.machine.run_frame()
+
+        with open(self.files[0]) as f:
+            text = f.read()
+
+        self.assertIn('# TYPE colecovision_frame_time_seconds histogram', text)
+        self.assertIn('colecovision_frames_total 3\n', text)
+        self.assertIn('colecovision_frame_time_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn('colecovision_skipped_cycles_total{reason="idle"} 0\n', text)
+
+        measured.export(self.files[1], metrics.FORMAT_JSON)
+
+        with open(self.files[1]) as f:
+            exported = json.load(f)
+
+        self.assertEqual(exported['frames'], 3)
+
+        measured.close()
+
+        self.assertEqual(self.machine._frame_listeners, [])
+
+    def test_invalid_format(self):
+        """verify an exception is raised for an unknown export format"""
+
+        with self.assertRaises(ValueError):
+            Metrics(self.machine, export_format='xml')
+
+    def test_region_type(self):
+        """verify the region type names"""
+
+        self.assertEqual(metrics.region_type(RAM_MemoryRegion(16)), 'ram')
+        self.assertEqual(metrics.region_type(self.machine.vdp.vram), 'ram')
+        self.assertEqual(metrics.region_type(None), 'unmapped')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+"""Unit tests for controller input recording and replay"""
+
+import os
+import unittest
+from colecovision import controller
+from colecovision.movie import MovieWriter, MovieReader, MovieError
+from colecovision.movie import InputRecorder, InputPlayer
+from machine_fixture import MachineFixture
+
+
+class TestMovieFormat(unittest.TestCase):
+
+    MOVIE_FILE = 'movie_test.mov'
+
+    def tearDown(self):
+        if os.path.exists(self.MOVIE_FILE):
+            os.remove(self.MOVIE_FILE)
+
+    def test_round_trip(self):
+        """verify the frames read back are the frames written"""
+
+        released = controller.RELEASED
+
+        frames = ([(released, released)] * 300 +
+                  [(released | controller.UP, released)] * 10 +
+                  [(released, released | controller.FIRE_LEFT)] * 5 +
+                  [(released, released)] * 1000)
+
+        with MovieWriter(self.MOVIE_FILE, 'ab' * 20) as writer:
+            for states in frames:
+                writer.write_frame(states)
+
+        reader = MovieReader(self.MOVIE_FILE)
+
+        self.assertEqual(reader.frames, len(frames))
+        self.assertEqual(list(reader), frames)
+        self.assertEqual(reader.bios_sha1, 'ab' * 20)
+        self.assertEqual(reader.cartridge_sha1, None)
+
+        # only the changes are stored
+        self.assertLess(os.path.getsize(self.MOVIE_FILE), 80)
+
+    def test_not_a_movie(self):
+        """verify other files are rejected"""
+
+        with open(self.MOVIE_FILE, 'wb') as f:
+            f.write(b'not a movie at all, really not' * 4)
+
+        with self.assertRaises(MovieError):
+            MovieReader(self.MOVIE_FILE)
+
+
+class TestRecordReplay(unittest.TestCase):
+
+    def setUp(self):
+
+        self.fixture = MachineFixture()
+
+        self.movie_file = self.fixture.path('test.mov')
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def create_machine(self):
+        return self.fixture.create(free_running=True)
+
+    def test_record_replay(self):
+        """verify replay feeds the recorded input frame by frame"""
+
+        machine = self.create_machine()
+
+        recorder = InputRecorder(machine, self.movie_file)
+
+        pad = machine.controllers[0]
+
+        recorded = []
+
+        for frame in range(4):
+
+            if frame == 1:
+                pad.press(controller.RIGHT)
+            if frame == 2:
+                pad.press_key('5')
+
+            recorded.append(pad.state)
+
+            machine.run_frame()
+
+        recorder.close()
+
+        self.assertEqual(recorder.frames, 0)
+
+        machine = self.create_machine()
+
+        seen = []
+
+        machine.add_frame_listener(lambda m: seen.append(m.controllers[0].state))
+
+        player = InputPlayer(machine, self.movie_file)
+
+        self.assertEqual(player.frames, 4)
+
+        machine.run_frames(4)
+
+        self.assertTrue(player.done)
+        self.assertEqual(seen, recorded)
+
+        # joystick mode read of the first controller: right pressed
+        machine.io.write(0xC0, 0)
+
+        self.assertEqual(machine.io.read(0xFC), 0x7F & ~controller.RIGHT)
+
+        # keypad mode read: key 5
+        machine.io.write(0x80, 0)
+
+        self.assertEqual(machine.io.read(0xFC), 0x70 | controller.KEYPAD['5'])
+
+    def test_replay_end(self):
+        """verify the listeners after the player see the frame at which
+        replay ends"""
+
+        machine = self.create_machine()
+
+        recorder = InputRecorder(machine, self.movie_file)
+
+        machine.run_frames(2)
+
+        recorder.close()
+
+        machine = self.create_machine()
+
+        player = InputPlayer(machine, self.movie_file)
+
+        seen = []
+
+        machine.add_frame_listener(lambda m: seen.append(m.frame))
+
+        machine.run_frames(4)
+
+        self.assertTrue(player.done)
+        self.assertEqual(seen, [1, 2, 3, 4])
@@ -0,0 +1,96 @@
+"""Unit tests for real-time pacing"""
+
+import unittest
+from colecovision.pacing import Pacer
+from colecovision.video import VDP
+
+
+class _Clock(object):
+    """Simulated time"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class _Machine(object):
+    """Machine whose frames take a given time to run"""
+
+    def __init__(self, clock, frame_times):
+        self.vdp = VDP()
+        self.clock = clock
+        self.frame_times = list(frame_times)
+        self.rendered = []
+
+    def run_frame(self):
+
+        if not self.frame_times:
+            return False
+
+        self.rendered.append(self.vdp.render_enabled)
+        self.clock.now += self.frame_times.pop(0)
+
+        return True
+
+
+class TestPacer(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = _Clock()
+
+    def create(self, frame_times, **kwargs):
+
+        machine = _Machine(self.clock, frame_times)
+
+        pacer = Pacer(machine, frame_rate=100.0, clock=self.clock,
+                      sleep=self.clock.sleep, **kwargs)
+
+        return machine, pacer
+
+    def test_real_time(self):
+        """verify frames are paced at the frame rate"""
+
+        machine, pacer = self.create([0.002] * 10)
+
+        self.assertEqual(pacer.run(), 10)
+
+        self.assertAlmostEqual(self.clock.now, 0.1)
+        self.assertEqual(pacer.dropped, 0)
+        self.assertAlmostEqual(pacer.average_slack, 0.008)
+        self.assertTrue(all(machine.rendered))
+
+    def test_frame_skip(self):
+        """verify rendering is skipped to catch up"""
+
+        machine, pacer = self.create([0.035] + [0.002] * 6)
+
+        pacer.run()
+
+        self.assertEqual(machine.rendered,
+                         [True, False, False, False, False, True, True])
+        self.assertEqual(pacer.dropped, 4)
+        self.assertTrue(machine.vdp.render_enabled)
+
+    def test_max_skip(self):
+        """verify rendering is not skipped more than max_skip in a row"""
+
+        machine, pacer = self.create([0.013] * 6, max_skip=2)
+
+        pacer.run(6)
+
+        self.assertEqual(machine.rendered,
+                         [True, False, False, True, False, False])
+
+    def test_audio_sync(self):
+        """verify a full audio buffer slows the frames down"""
+
+        machine, pacer = self.create([0.0] * 10, audio_fill=lambda: 1.0)
+
+        pacer.run()
+
+        self.assertAlmostEqual(self.clock.now, 0.105)
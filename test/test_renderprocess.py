@@ -0,0 +1,196 @@
+"""Unit tests for the off-thread rendering of the VDP frames"""
+
+import random
+import unittest
+from colecovision import checkpoint
+from colecovision import video
+from colecovision.checkpoint import CheckpointRecorder
+from colecovision.framesink import FrameSinkInterface
+from colecovision.renderprocess import RenderError, RenderProcess
+from colecovision.video import VDP
+from machine_fixture import MachineFixture
+
+
+class ListSink(FrameSinkInterface):
+    """Sink keeping every frame"""
+
+    def __init__(self):
+        self.frames = []
+
+    def submit(self, framebuffer):
+        self.frames.append(framebuffer)
+
+
+class TestRenderProcess(unittest.TestCase):
+
+    def setUp(self):
+
+        self.generator = random.Random(11)
+
+        # the same writes go to a VDP rendering in the thread and to one
+        # rendering in the render process
+        self.vdps = (VDP(), VDP())
+        self.sinks = (ListSink(), ListSink())
+
+        for vdp, sink in zip(self.vdps, self.sinks):
+            vdp.add_sink(sink)
+
+        self.renderer = RenderProcess(self.vdps[1])
+
+        vram = bytearray(self.generator.randrange(256) for i in range(video.VRAM_SIZE))
+
+        self.write_vram(0, vram)
+
+    def tearDown(self):
+        self.renderer.close()
+
+    def set_registers(self, *values):
+        """Write the registers of both VDPs through the control port"""
+
+        for vdp in self.vdps:
+            for number, value in enumerate(values):
+                vdp.write_control(value)
+                vdp.write_control(0x80 | number)
+
+    def write_vram(self, address, data):
+        """Write the VRAM of both VDPs through the data port"""
+
+        for vdp in self.vdps:
+
+            vdp.write_control(address & 0xFF)
+            vdp.write_control(0x40 | (address >> 8))
+
+            for value in data:
+                vdp.write_data(value)
+
+    def vblank(self, frames=1):
+        """Run the vertical blanks of frames frames, writing a few random
+        bytes of VRAM before each"""
+
+        for i in range(frames):
+
+            for j in range(self.generator.randrange(20)):
+                self.write_vram(self.generator.randrange(video.VRAM_SIZE),
+                                [self.generator.randrange(256)])
+
+            for vdp in self.vdps:
+                vdp.vblank()
+
+    def test_identical(self):
+        """verify the frames rendered off-thread are the frames rendered in
+        the thread, in order, across modes"""
+
+        # graphics I
+        self.set_registers(0x00, 0xC0, 0x06, 0x80, 0x00, 0x36, 0x07, 0x01)
+        self.vblank(5)
+
+        # graphics II, with a large VRAM update in between
+        self.set_registers(0x02, 0xC0, 0x06, 0xFF, 0x03, 0x36, 0x07, 0x04)
+        self.vblank(3)
+        self.write_vram(0x0000, bytearray(self.generator.randrange(256) for i in range(0x1000)))
+        self.vblank(3)
+
+        # text
+        self.set_registers(0x00, 0xD0, 0x02, 0x00, 0x00, 0x00, 0x00, 0xF4)
+        self.vblank(3)
+
+        self.renderer.flush()
+
+        self.assertEqual(len(self.sinks[1].frames), 14)
+        self.assertEqual(self.sinks[1].frames, self.sinks[0].frames)
+        self.assertEqual(self.renderer.delivered, self.renderer.submitted)
+
+    def test_delivery(self):
+        """verify at most two frames are waiting, and close delivers them
+        and detaches the renderer"""
+
+        self.set_registers(0x00, 0xC0, 0x06, 0x80, 0x00, 0x36, 0x07, 0x01)
+
+        self.vblank(4)
+
+        self.assertGreaterEqual(self.renderer.delivered, 2)
+
+        self.renderer.close()
+
+        self.assertEqual(self.sinks[1].frames, self.sinks[0].frames)
+        self.assertIsNone(self.vdps[1].renderer)
+
+        # rendering is back in the thread
+        self.vblank()
+
+        self.assertEqual(self.sinks[1].frames, self.sinks[0].frames)
+
+    def test_no_sinks(self):
+        """verify nothing is rendered without sinks"""
+
+        self.vdps[1].remove_sink(self.sinks[1])
+
+        self.vblank(2)
+
+        self.assertEqual(self.renderer.submitted, 0)
+
+    def test_render_error(self):
+        """verify a failure of the render process is reported"""
+
+        self.renderer._connection.send(2)
+
+        self.renderer._pending.append((2, ()))
+
+        with self.assertRaises(RenderError):
+            self.renderer.flush()
+
+        # the render process carries on
+        self.renderer._free.remove(2)
+
+        self.vblank()
+        self.renderer.flush()
+
+        self.assertEqual(self.sinks[1].frames, self.sinks[0].frames)
+
+
+class TestCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.fixture = MachineFixture()
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def record(self, file_name, render_process):
+        """Record the checkpoints of a few frames, writing the frame number
+        to RAM in each"""
+
+        test_machine = self.fixture.create(expansion=True)
+
+        recorder = CheckpointRecorder(test_machine, file_name)
+
+        renderer = RenderProcess(test_machine.vdp) if render_process else None
+
+        for frame in range(4):
+
+            test_machine.ram.write(0x10, frame)
+
+            test_machine.cpu.register["PC"].value = 0
+
+            test_machine.run_frame()
+
+        if renderer is not None:
+            renderer.close()
+
+        recorder.close()
+
+        return checkpoint.read_log(file_name)
+
+    def test_checkpoints(self):
+        """verify sinks record the machine state of the vertical blank of
+        the frame, not of the vertical blank it is delivered at"""
+
+        reference = self.record(self.fixture.path('thread.chk'), False)
+
+        self.assertEqual([c.frame for c in reference], [1, 2, 3, 4])
+
+        self.assertEqual(self.record(self.fixture.path('process.chk'), True), reference)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Unit tests for the rewind buffer"""
+
+import unittest
+from colecovision.rewind import RewindBuffer
+from machine_fixture import MachineFixture
+
+
+class TestRewindBuffer(unittest.TestCase):
+
+    def setUp(self):
+
+        self.fixture = MachineFixture()
+
+        self.machine = self.fixture.create(expansion=True)
+
+        # initial value of the RAM and VRAM
+        self.ram_fill = self.machine.ram.read(0)
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def run_frames(self, count):
+        """Run frames, changing a RAM and a VRAM byte in each one"""
+
+        for i in range(count):
+
+            frame = self.machine.frame
+
+            self.machine.ram.write(frame & 0x3FF, frame & 0xFF)
+            self.machine.vdp.vram.write(0x1000 + frame, frame & 0xFF)
+
+            # keep the CPU in the BIOS
+            self.machine.cpu.register["PC"].value = 0
+
+            self.machine.run_frame()
+
+    def test_rewind(self):
+        """verify rewinding restores the state of an earlier frame"""
+
+        rewind = RewindBuffer(self.machine, keyframe_interval=8)
+
+        self.run_frames(20)
+
+        self.assertEqual(len(rewind), 20)
+        self.assertEqual((rewind.oldest, rewind.newest), (1, 20))
+
+        for frame in (20, 13, 8):
+            self.assertTrue(rewind.rewind(rewind.newest - frame))
+            self.assertEqual(self.machine.frame, frame)
+
+        self.assertEqual(len(rewind), 8)
+
+        # frame 8 did not write the bytes of frame 8 yet
+        self.assertEqual(self.machine.ram.read(7), 7)
+        self.assertEqual(self.machine.ram.read(8), self.ram_fill)
+        self.assertEqual(self.machine.vdp.vram.read(0x1007), 7)
+        self.assertEqual(self.machine.vdp.vram.read(0x1008), self.ram_fill)
+
+        # running again continues from the restored frame
+        self.run_frames(2)
+
+        self.assertEqual((rewind.oldest, rewind.newest), (1, 10))
+
+        self.assertFalse(rewind.rewind(10))
+
+        rewind.close()
+
+    def test_deltas(self):
+        """verify the frames between keyframes are stored as deltas"""
+
+        rewind = RewindBuffer(self.machine, keyframe_interval=60)
+
+        self.run_frames(2)
+
+        keyframe_size = rewind.size
+
+        self.run_frames(10)
+
+        self.assertLess(rewind.size - keyframe_size, keyframe_size // 10)
+
+    def test_budget(self):
+        """verify the oldest frames are dropped to stay within the budget"""
+
+        rewind = RewindBuffer(self.machine, keyframe_interval=4)
+
+        self.run_frames(1)
+
+        rewind.max_bytes = int(rewind.size * 2.5)
+
+        self.run_frames(20)
+
+        self.assertLessEqual(rewind.size, rewind.max_bytes)
+        self.assertEqual(rewind.newest, 21)
+        self.assertEqual(rewind.oldest, 17)
+
+        self.assertTrue(rewind.rewind(4))
+        self.assertEqual(self.machine.frame, 17)
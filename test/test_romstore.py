@@ -0,0 +1,108 @@
+"""Unit tests for the ROM image store"""
+
+import os
+import random
+import struct
+import unittest
+from colecovision.romstore import ROMStore, ROMImage
+
+
+class TestROMStore(unittest.TestCase):
+
+    def setUp(self):
+        self.files = []
+
+    def tearDown(self):
+        for name in self.files:
+            os.remove(name)
+
+    def create_rom_file(self, name, contents):
+
+        with open(name, 'wb') as f:
+            f.write(bytes(bytearray(contents)))
+
+        self.files.append(name)
+
+    def cartridge(self, length, magic=(0xAA, 0x55), start=0x8123):
+
+        contents = [random.randint(0, 255) for x in range(length)]
+
+        contents[0:2] = magic
+        contents[0x0A:0x0C] = struct.unpack('BB', struct.pack('<H', start))
+
+        return contents
+
+    def test_metadata(self):
+        """verify the metadata read from the cartridge header"""
+
+        image = ROMImage(bytearray(self.cartridge(0x2000)))
+
+        self.assertEqual(image.size, 0x2000)
+        self.assertEqual(image.magic, 0xAA55)
+        self.assertFalse(image.skip_title)
+        self.assertEqual(image.entry_point, 0x8123)
+        self.assertEqual(image.mirroring, 4)
+
+        image = ROMImage(bytearray(self.cartridge(0x6000, magic=(0x55, 0xAA))))
+
+        self.assertTrue(image.skip_title)
+        self.assertEqual(image.mirroring, 1)
+
+        image = ROMImage(bytearray(self.cartridge(0x2000, magic=(0x00, 0x00))))
+
+        self.assertEqual(image.magic, None)
+        self.assertEqual(image.entry_point, None)
+
+    def test_dedupe(self):
+        """verify files with the same contents share one image"""
+
+        contents = self.cartridge(0x1000)
+
+        self.create_rom_file('romstore_a.rom', contents)
+        self.create_rom_file('romstore_b.rom', contents)
+
+        store = ROMStore()
+
+        image_a = store.load('romstore_a.rom')
+        image_b = store.load('romstore_b.rom')
+
+        self.assertIs(image_a, image_b)
+        self.assertEqual(len(store), 1)
+
+        region_a = store.region('romstore_a.rom')
+        region_b = store.region('romstore_b.rom')
+
+        self.assertEqual(region_b.file_name, 'romstore_b.rom')
+        self.assertEqual(region_a.read(0x0A), 0x23)
+        self.assertEqual(bytes(region_a.data), bytes(region_b.data))
+
+    def test_lookup_is_cached(self):
+        """verify an unchanged file is only read once"""
+
+        self.create_rom_file('romstore_a.rom', self.cartridge(0x1000))
+
+        store = ROMStore()
+
+        store.load('romstore_a.rom')
+        store.load('romstore_a.rom')
+
+        self.assertEqual(store.misses, 1)
+        self.assertEqual(store.hits, 1)
+
+    def test_eviction(self):
+        """verify least recently used images are evicted first"""
+
+        store = ROMStore(max_bytes=0x2000)
+
+        first = store.add(bytearray(self.cartridge(0x1000)))
+        second = store.add(bytearray(self.cartridge(0x1000)))
+
+        store.get(first.sha1)
+
+        third = store.add(bytearray(self.cartridge(0x1000)))
+
+        self.assertIn(first.sha1, store)
+        self.assertNotIn(second.sha1, store)
+        self.assertIn(third.sha1, store)
+        self.assertEqual(store.evictions, 1)
+        self.assertEqual(store.size, 0x2000)
@@ -0,0 +1,60 @@
+"""Unit tests for the import and startup benchmark"""
+
+import io
+import subprocess
+import sys
+import unittest
+from contextlib import redirect_stdout
+from colecovision import startup
+from machine_fixture import MachineFixture
+
+
+class TestStartup(unittest.TestCase):
+
+    def setUp(self):
+        self.fixture = MachineFixture()
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def test_measure_startup(self):
+        """verify the startup times of a fresh interpreter add up"""
+
+        result = startup.measure_startup(self.fixture.bios_file, runs=1)
+
+        self.assertGreater(result.import_time, 0)
+        self.assertGreater(result.construct_time, 0)
+        self.assertGreaterEqual(result.time_to_first_instruction,
+                                result.import_time + result.construct_time)
+
+    def test_main(self):
+        """verify the command line reports every time"""
+
+        output = io.StringIO()
+
+        with redirect_stdout(output):
+            status = startup.main([self.fixture.bios_file, '--runs', '1', '--count', '2'])
+
+        self.assertEqual(status, 0)
+        self.assertIn('total', output.getvalue())
+        self.assertIn('clone (warm)', output.getvalue())
+
+    def test_machine_imports(self):
+        """verify importing the machine does not import the optional
+        subsystems"""
+
+        probe = ('import sys, colecovision.machine\n'
+                 'print(" ".join(name for name in ("colecovision.debugserver",\n'
+                 '                                 "colecovision.gdbstub",\n'
+                 '                                 "colecovision.framesink",\n'
+                 '                                 "colecovision.coverage")\n'
+                 '               if name in sys.modules))\n')
+
+        output = subprocess.check_output([sys.executable, '-c', probe],
+                                         cwd=startup._PACKAGE_PATH,
+                                         universal_newlines=True)
+
+        self.assertEqual(output.split(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+"""Unit tests for the video display processor"""
+
+import random
+import unittest
+from colecovision import video
+from colecovision.video import VDP, SCREEN_WIDTH
+
+
+class TestRender(unittest.TestCase):
+
+    def setUp(self):
+
+        self.vdp = VDP()
+
+    def set_registers(self, *values):
+        """Write the registers through the control port"""
+
+        for number, value in enumerate(values):
+            self.vdp.write_control(value)
+            self.vdp.write_control(0x80 | number)
+
+    def pixel(self, framebuffer, x, y):
+        return bytearray(framebuffer)[(y * SCREEN_WIDTH) + x]
+
+    def test_blank(self):
+        """verify a blanked display shows the backdrop"""
+
+        self.set_registers(0x00, 0x80, 0, 0, 0, 0, 0, 0x04)
+
+        framebuffer = self.vdp.render()
+
+        self.assertEqual(len(framebuffer), video.FRAME_SIZE)
+        self.assertEqual(set(bytearray(framebuffer)), set([4]))
+
+    def test_graphics_1(self):
+        """verify graphics I patterns and colours"""
+
+        # names at 0x1800, colours at 0x2000, patterns at 0x0000
+        self.set_registers(0x00, 0xC0, 0x06, 0x80, 0x00, 0x36, 0x07, 0x01)
+
+        vram = self.vdp.vram
+
+        for address in range(0x1800, 0x1B00):
+            vram.write(address, 0)
+
+        # pattern 1: a vertical bar in the first column
+        vram.write_block(0x0000, bytearray(8))
+        vram.write_block(0x0008, bytearray([0x80] * 8))
+
+        # patterns 0-7: white on transparent
+        vram.write(0x2000, 0xF0)
+
+        # second row, third column
+        vram.write(0x1800 + 32 + 2, 1)
+
+        # no sprites
+        vram.write(0x1B00, video.SPRITE_END)
+
+        framebuffer = self.vdp.render()
+
+        self.assertEqual(self.pixel(framebuffer, 16, 8), 15)
+        self.assertEqual(self.pixel(framebuffer, 16, 15), 15)
+        self.assertEqual(self.pixel(framebuffer, 17, 8), 1)
+        self.assertEqual(self.pixel(framebuffer, 16, 16), 1)
+
+    def test_sprites(self):
+        """verify sprite position, priority and the per line limit"""
+
+        self.set_registers(0x00, 0xC0, 0x06, 0x80, 0x00, 0x36, 0x07, 0x01)
+
+        vram = self.vdp.vram
+
+        # blank name table and patterns, transparent colours
+        vram.write_block(0x0000, bytearray(0x800))
+        vram.write_block(0x1800, bytearray(0x300))
+        vram.write_block(0x2000, bytearray(0x20))
+
+        # sprite pattern 0: solid
+        vram.write_block(0x3800, bytearray([0xFF] * 8))
+
+        # five sprites on line 10 (y + 1), red over green
+        attributes = bytearray()
+
+        for number, x in enumerate((100, 104, 0, 40, 60)):
+            attributes += bytearray([9, x, 0, 8 if number == 0 else 2])
+
+        attributes.append(video.SPRITE_END)
+
+        vram.write_block(0x1B00, attributes)
+
+        framebuffer = self.vdp.render()
+
+        self.assertEqual(self.pixel(framebuffer, 100, 10), 8)
+        self.assertEqual(self.pixel(framebuffer, 104, 10), 8)
+        self.assertEqual(self.pixel(framebuffer, 108, 10), 2)
+        self.assertEqual(self.pixel(framebuffer, 100, 9), 1)
+        self.assertEqual(self.pixel(framebuffer, 108, 17), 2)
+        self.assertEqual(self.pixel(framebuffer, 100, 18), 1)
+
+        # the fifth sprite of the line is not shown
+        self.assertEqual(self.pixel(framebuffer, 40, 10), 2)
+        self.assertEqual(self.pixel(framebuffer, 60, 10), 1)
+
+
+class TestTileCache(unittest.TestCase):
+    """Expanded pattern rows cached between renders"""
+
+    def setUp(self):
+
+        self.vdp = VDP()
+
+        generator = random.Random(7)
+
+        self.vdp.vram.write_block(0, bytearray(generator.randrange(256)
+                                               for i in range(video.VRAM_SIZE)))
+
+        self.generator = generator
+
+    def set_registers(self, *values):
+        """Write the registers through the control port"""
+
+        for number, value in enumerate(values):
+            self.vdp.write_control(value)
+            self.vdp.write_control(0x80 | number)
+
+    def write_vram(self, address, data):
+        """Write VRAM through the data port"""
+
+        self.vdp.write_control(address & 0xFF)
+        self.vdp.write_control(0x40 | (address >> 8))
+
+        for value in data:
+            self.vdp.write_data(value)
+
+    def assertFresh(self):
+        """Verify the VDP renders what a VDP without cached rows renders"""
+
+        fresh = VDP()
+
+        fresh.load_state(self.vdp.save_state())
+
+        self.assertEqual(self.vdp.render(), fresh.render())
+
+    def test_statistics(self):
+        """verify the lookups and misses of each render are counted"""
+
+        # graphics I, display enabled, name table at 0x0000
+        self.set_registers(0x00, 0x40, 0x00, 0x80, 0x01, 0x00, 0x00, 0x01)
+
+        self.vdp.render()
+
+        self.assertEqual(self.vdp.tile_lookups, video.SCREEN_HEIGHT * 32)
+
+        misses = self.vdp.tile_misses
+
+        self.assertGreater(misses, 0)
+
+        self.vdp.render()
+
+        self.assertEqual(self.vdp.tile_lookups, 2 * video.SCREEN_HEIGHT * 32)
+        self.assertEqual(self.vdp.tile_misses, misses)
+
+    def test_graphics_2(self):
+        """verify pattern and colour writes update the cached rows"""
+
+        # names at 0x3800, colours at 0x2000, patterns at 0x0000
+        self.set_registers(0x02, 0xC0, 0x0E, 0xFF, 0x03, 0x76, 0x03, 0x04)
+
+        self.write_vram(0x3F00, [video.SPRITE_END])
+
+        self.vdp.render()
+
+        self.write_vram(0x0000, [0xAA, 0x55])
+        self.write_vram(0x2000 + 0x0800 + 3, [0x00, 0x31])
+        self.write_vram(0x3800 + 10, [0x00, 0x00])
+
+        self.assertFresh()
+
+        # backdrop change
+        self.set_registers(0x02, 0xC0, 0x0E, 0xFF, 0x03, 0x76, 0x03, 0x0A)
+
+        self.assertFresh()
+
+    def test_graphics_1(self):
+        """verify a colour write updates the rows of its 8 patterns"""
+
+        self.set_registers(0x00, 0xC0, 0x06, 0x80, 0x00, 0x36, 0x07, 0x01)
+
+        self.write_vram(0x1B00, [video.SPRITE_END])
+
+        self.vdp.render()
+
+        self.write_vram(0x2005, [0x00])
+        self.write_vram(0x0100, [0xFF, 0x0F])
+
+        self.assertFresh()
+
+    def test_mode_change(self):
+        """verify the rows are expanded again when the mode changes"""
+
+        self.set_registers(0x00, 0xD0, 0x06, 0x80, 0x00, 0x36, 0x07, 0xF4)
+
+        self.vdp.render()
+
+        self.set_registers(0x02, 0xC0, 0x06, 0xFF, 0x03, 0x36, 0x07, 0xF4)
+
+        self.write_vram(0x1B00, [video.SPRITE_END])
+
+        self.assertFresh()
+
+    def test_many_writes(self):
+        """verify more writes than the cache follows clear it"""
+
+        self.set_registers(0x02, 0xC0, 0x0E, 0xFF, 0x03, 0x76, 0x03, 0x04)
+
+        self.vdp.render()
+
+        self.write_vram(0x0000, [self.generator.randrange(256)
+                                 for i in range(video.TILE_CACHE_WRITE_LIMIT + 1)])
+
+        self.assertFresh()